@@ -11,7 +11,7 @@ import numpy as np
 
 from ..autodiff import GradManager
 from ..functional import full_like
-from ..functional.math import _check_non_finite
+from ..functional.math import _check_non_finite, _multi_tensor_mul
 from ..tensor import Tensor
 
 
@@ -128,27 +128,32 @@ class GradScaler:
             grad_tensors: Tensors needed to unscale grads. Should be all tensors
                 that are affected by ``target`` tensor in GradManager's backward.
         """
-        # use float64 for better precision
-        inv_scale = Tensor(1.0 / self.scale_factor)
-        for tensor in grad_tensors:
-            if tensor is None or getattr(tensor, "grad", None) is None:
-                continue
-            # to support tracing, _check_gradients should be applied to every grad.
-            if self._check_gradients(tensor.grad):
-                self._found_non_finite = True
-            tensor.grad *= inv_scale
+        tensors = [
+            tensor
+            for tensor in grad_tensors
+            if tensor is not None and getattr(tensor, "grad", None) is not None
+        ]
+        if len(tensors) == 0:
+            return self
+        grads = [tensor.grad for tensor in tensors]
+        # all the grads are checked at once, and the result is read only once
+        if self._check_gradients(grads):
+            self._found_non_finite = True
 
         if self._found_non_finite:
-            for tensor in grad_tensors:
-                if tensor is None or getattr(tensor, "grad", None) is None:
-                    continue
+            for tensor in tensors:
                 tensor.grad = None
+        else:
+            # use float64 for better precision
+            inv_scale = Tensor(1.0 / self.scale_factor)
+            for tensor, grad in zip(tensors, _multi_tensor_mul(grads, inv_scale)):
+                tensor.grad._reset(grad)
         return self
 
-    def _check_gradients(self, grad):
+    def _check_gradients(self, grads):
         if self.growth_interval == 0:
             return False
-        return _check_non_finite(grad)
+        return _check_non_finite(grads)
 
     def update(self, new_scale: float = None):
         r"""Update the scale factor according to whether encountered overflow grad.
@@ -7,4 +7,5 @@
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 from ..core.autodiff.grad import Function
+from .checkpoint import checkpoint
 from .grad_manager import GradManager
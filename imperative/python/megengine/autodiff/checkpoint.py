@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# MegEngine is Licensed under the Apache License, Version 2.0 (the "License")
+#
+# Copyright (c) 2014-2021 Megvii Inc. All rights reserved.
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+from typing import Callable
+
+from ..core.autodiff.grad import Function, Grad
+from ..random.rng import _forked_default_rng, _random_seed_generator
+from ..tensor import Tensor
+from . import grad_manager
+
+
+class _Checkpoint(Function):
+    def __init__(self, fn, params, buffers):
+        super().__init__()
+        self.fn = fn
+        self.params = params
+        self.buffers = buffers
+        # random numbers, e.g. of dropout, are drawn again in recomputation
+        self.seed = _random_seed_generator().__next__()
+
+    def forward(self, *args):
+        self.inputs = args[: len(args) - len(self.params)]
+        with _forked_default_rng(self.seed):
+            outputs = self.fn(*self.inputs)
+        if isinstance(outputs, list):
+            outputs = tuple(outputs)
+        return outputs
+
+    def backward(self, *output_grads):
+        inputs = [x.detach() for x in self.inputs]
+        wrts = inputs + self.params
+        grads = {}
+
+        def make_callback(key):
+            def callback(grad):
+                grads[key] = grad
+
+            return callback
+
+        # buffers like running mean of BatchNorm are restored after recomputation,
+        # so that they are only updated once
+        buffers = [(buf, buf.detach()) for buf in self.buffers]
+        grad = Grad()
+        grad._priority = grad_manager._global_priority
+        grad_manager._global_priority -= 1
+        try:
+            for i, x in enumerate(wrts):
+                grad.wrt(x, callback=make_callback(i))
+            with grad:
+                with _forked_default_rng(self.seed):
+                    outputs = self.fn(*inputs)
+                if isinstance(outputs, Tensor):
+                    outputs = (outputs,)
+                ys, dys = [], []
+                for y, dy in zip(outputs, output_grads):
+                    if dy is not None:
+                        ys.append(y)
+                        dys.append(dy)
+                grad(ys, dys)
+        finally:
+            grad_manager._global_priority += 1
+            for buf, value in buffers:
+                buf._reset(value)
+        self.inputs = None
+        return tuple(grads.get(i) for i in range(len(wrts)))
+
+
+def checkpoint(fn: Callable, *inputs: Tensor):
+    r"""Call ``fn`` with ``inputs`` without keeping its intermediate results for
+    backward, and recompute them in :meth:`~.GradManager.backward`.
+
+    This trades computation for memory: only ``inputs`` are kept for backward
+    instead of all the intermediate results of ``fn``, which is called once more
+    in backward. Random numbers of the default RNG, e.g. used by dropout, are the
+    same in recomputation, and buffers of a module, like the running mean of
+    BatchNorm, are only updated once.
+
+    Examples:
+
+        .. code-block::
+
+            gm = GradManager().attach(model.parameters())
+            with gm:
+                x = checkpoint(model.block1, x)
+                x = checkpoint(model.block2, x)
+                loss = model.head(x)
+                gm.backward(loss)
+
+    Args:
+        fn: a :class:`~.Module` or function to call. If it is a function, tensors
+            that need gradients, including parameters, should be passed as
+            ``inputs`` instead of being captured by it.
+        inputs: tensors passed to ``fn``.
+
+    Returns:
+        outputs of ``fn``, which should be a tensor or a tuple of tensors.
+    """
+    from ..module import Module
+
+    params, buffers = [], []
+    if isinstance(fn, Module):
+        params = list(fn.parameters())
+        buffers = list(fn.buffers())
+    return _Checkpoint(fn, params, buffers)(*inputs, *params)
@@ -119,15 +119,63 @@ class GradManager:
 
         gm = GradManager()
         gm.attach(model.parameters(), callback=dist.make_allreduce_cb("MEAN"))
+
+    To train with a batch larger than the device memory allows, split it into
+    ``accumulation_steps`` micro-batches. Gradients of the micro-batches are summed
+    in place and only written to the .grad attributes after the last one, averaged
+    if ``average`` is True:
+
+    .. code-block::
+
+        gm = GradManager(accumulation_steps=4)
+        gm.attach(model.parameters())
+
+        for data in dataset:
+            with gm:
+                loss = model(data)
+                gm.backward(loss)
+            if gm.accumulation_done:
+                opt.step().clear_grad()
+
+    Args:
+        accumulation_steps: number of :meth:`backward` calls whose gradients are
+            accumulated before being written to .grad attributes. Default: 1
+        average: whether to divide the accumulated gradients by
+            ``accumulation_steps``. Default: True
     """
 
-    def __init__(self):
+    def __init__(self, accumulation_steps: int = 1, average: bool = True):
+        if accumulation_steps < 1:
+            raise ValueError(
+                "accumulation_steps should be positive, got {}".format(
+                    accumulation_steps
+                )
+            )
         self._attach_specs = {}  # id(Tensor) -> AttachSpec
         self._recording = False
         self._grad = None
         self._after_backward_callback = []
         self._gradients = {}
         self._priority = None
+        self._accumulation_steps = accumulation_steps
+        self._accumulation_scale = 1.0 / accumulation_steps if average else 1.0
+        self._micro_step = 0
+        self._accumulated = {}  # id(Tensor) -> Tensor
+        # scalars of in-place accumulation, not created without accumulation so
+        # that constructing a GradManager does not initialize the device
+        self._one = self._zero = self._scale = None
+        if accumulation_steps > 1:
+            self._one = Tensor(1.0, dtype="float32")
+            self._zero = Tensor(0.0, dtype="float32")
+            self._scale = Tensor(self._accumulation_scale, dtype="float32")
+
+    @property
+    def accumulation_done(self) -> bool:
+        r"""Whether the last :meth:`backward` has finished an accumulation cycle
+        and written the gradients to .grad attributes, which is always True without
+        gradient accumulation.
+        """
+        return self._micro_step == 0
 
     def attached_tensors(self):
         r"""Return attached tensor list from :meth:`attach`."""
@@ -204,6 +252,7 @@ class GradManager:
                 self = selfref()
                 if self is not None:
                     del self._attach_specs[key]
+                    self._accumulated.pop(key, None)
 
             spec = AttachSpec()
             spec.tensor = weakref.ref(tensor, deleter)
@@ -289,24 +338,71 @@ class GradManager:
             self._grad(ys, dys)
             for callback in self._after_backward_callback:
                 callback()
-            for id_, grad in self._gradients.items():
-                if isinstance(grad, Future):
-                    grad = grad.get()
-                spec = self._attach_specs.get(id_)
-                tensor = spec and spec.tensor()
-                if tensor is not None:
-                    if tensor.grad is None:
-                        tensor.grad = grad
-                    else:
-                        tensor.grad += grad
-                    if tensor._isscalar() and tensor.grad is not None:
-                        tensor.grad._setscalar()
+            if self._accumulation_steps > 1:
+                self._accumulate(dys)
+            else:
+                for id_, grad in self._gradients.items():
+                    if isinstance(grad, Future):
+                        grad = grad.get()
+                    spec = self._attach_specs.get(id_)
+                    tensor = spec and spec.tensor()
+                    if tensor is not None:
+                        if tensor.grad is None:
+                            tensor.grad = grad
+                        else:
+                            tensor.grad += grad
+                        if tensor._isscalar() and tensor.grad is not None:
+                            tensor.grad._setscalar()
         finally:
             self.release()
             backwarding_grad_manager = cache
         set_option("record_computing_path", 1)
         pop_scope("backward")
 
+    def _accumulate(self, dys):
+        from ..functional.inplace import _inplace_add_
+
+        # the first gradient of a tensor in a cycle becomes its buffer, the
+        # following ones are added to it in place so that no sum is allocated
+        # per micro-step. Gradients that may be referenced elsewhere are copied.
+        shared = set(map(id, dys))
+        one = self._one
+        for id_, grad in self._gradients.items():
+            if isinstance(grad, Future):
+                grad = grad.get()
+            spec = self._attach_specs.get(id_)
+            tensor = spec and spec.tensor()
+            if tensor is None or grad is None:
+                continue
+            buf = self._accumulated.get(id_)
+            if buf is not None:
+                _inplace_add_(buf, grad, alpha=one, beta=one)
+                continue
+            if id(grad) in shared:
+                grad = grad + 0
+            shared.add(id(grad))
+            if tensor._isscalar():
+                grad._setscalar()
+            self._accumulated[id_] = grad
+
+        self._micro_step += 1
+        if self._micro_step < self._accumulation_steps:
+            return
+        self._micro_step = 0
+        accumulated, self._accumulated = self._accumulated, {}
+        for id_, buf in accumulated.items():
+            spec = self._attach_specs.get(id_)
+            tensor = spec and spec.tensor()
+            if tensor is None:
+                continue
+            if tensor.grad is not None:
+                # scaled and added into the existing gradient in place
+                _inplace_add_(tensor.grad, buf, alpha=one, beta=self._scale)
+                continue
+            if self._accumulation_scale != 1.0:
+                _inplace_add_(buf, self._zero, alpha=self._scale, beta=self._zero)
+            tensor.grad = buf
+
     def record(self):
         r"""Start recording operations
 
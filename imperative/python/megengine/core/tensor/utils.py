@@ -314,3 +314,97 @@ def subgraph_fn(name, dtype, device, nr_inputs, gopt_level=None, interpret=False
             return interpret_subgraph(func, dtype, device)
 
     return decorator
+
+
+def param_pack_split(inp: Tensor, offsets: list, shapes: list):
+    r"""Returns split tensor to tensor list as offsets and shapes described,
+    only used for ``parampack``.
+
+    Args:
+        inp: input tensor.
+        offsets: offsets of outputs, length of `2 * n`,
+            while n is tensor nums you want to split,
+            format `[begin0, end0, begin1, end1]`.
+        shapes: tensor shapes of outputs.
+
+    Returns:
+        splitted tensors.
+
+    Examples:
+
+        .. testcode::
+
+           import numpy as np
+           from megengine import tensor
+           from megengine.distributed.helper import param_pack_split
+
+           a = tensor(np.ones((10,), np.int32))
+           b, c = param_pack_split(a, [0, 1, 1, 10], [(1,), (3, 3)])
+           print(b.numpy())
+           print(c.numpy())
+
+        Outputs:
+
+        .. testoutput::
+
+           [1]
+           [[1 1 1]
+            [1 1 1]
+            [1 1 1]]
+    """
+    op = builtin.ParamPackSplit()
+    op.offsets = offsets
+    op.shapes = [s or (1,) for s in shapes]
+    outputs = apply(op, inp)
+    for s, x in zip(shapes, outputs):
+        if not s:
+            x._setscalar()
+    return outputs
+
+
+def param_pack_concat(inps: list, offsets: Tensor, offsets_val: list):
+    r"""Returns concated tensor, only used for ``parampack``.
+
+    Args:
+         inps: input tensors.
+         offsets: device value of offsets.
+         offsets_val: offsets of inputs, length of `2 * n`,
+            format `[begin0, end0, begin1, end1]`.
+
+    Returns:
+         concated tensor.
+
+    Examples:
+
+         .. testcode::
+
+            import numpy as np
+            from megengine import tensor
+            from megengine.distributed.helper import param_pack_concat
+
+            a = tensor(np.ones((1,), np.int32))
+            b = tensor(np.ones((3, 3), np.int32))
+            offsets_val = [0, 1, 1, 10]
+            offsets = tensor(offsets_val, np.int32)
+            c = param_pack_concat([a, b], offsets, offsets_val)
+            print(c.numpy())
+
+         Outputs:
+
+         .. testoutput::
+
+            [1 1 1 1 1 1 1 1 1 1]
+    """
+    op = builtin.ParamPackConcat()
+    op.offsets = offsets_val
+    return apply(op, *inps, offsets)[0]
+
+
+def get_offsets(shapes):
+    offsets = []
+    offset = 0
+    for shape in shapes:
+        offsets.append(offset)
+        offset += int(np.prod(shape))
+        offsets.append(offset)
+    return offsets
@@ -6,8 +6,8 @@
 # Unless required by applicable law or agreed to in writing,
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
-from .collator import Collator
-from .dataloader import DataLoader
+from .collator import Collator, SchemaCollator
+from .dataloader import DataLoader, get_worker_info
 from .sampler import (
     Infinite,
     MapSampler,
@@ -69,3 +69,124 @@ class Collator:
             return [self.apply(samples) for samples in transposed]
 
         raise TypeError(default_collate_err_msg_format.format(elem_type))
+
+
+class SchemaCollator(Collator):
+    r"""A :class:`Collator` for samples which always have the same structure, and the
+    same shape and dtype for each numpy array field, e.g. nested dicts of arrays.
+
+    The schema of samples is inferred from the first batch and cached, then each
+    field of a batch is written with one ``np.stack`` into a preallocated contiguous
+    buffer. When used in a parallel :class:`~.DataLoader`, the buffers are allocated
+    in the shared memory batch queue directly, so the batch is not copied again
+    when being sent to main process.
+
+    Batches which do not match the cached schema are merged by :meth:`Collator.apply`.
+    """
+
+    def __init__(self):
+        self.schema = None
+
+    def _infer_schema(self, elem):
+        elem_type = type(elem)
+        if isinstance(elem, np.ndarray):
+            if np_str_obj_array_pattern.search(elem.dtype.str) is not None:
+                return None
+            return ("array", elem.shape, elem.dtype)
+        elif isinstance(elem, np.generic):
+            if isinstance(elem, (np.str_, np.bytes_)):
+                return ("list",)
+            return ("scalar", elem.dtype)
+        elif isinstance(elem, float):
+            return ("scalar", np.dtype(np.float64))
+        elif isinstance(elem, int):
+            return ("scalar", np.array([elem]).dtype)
+        elif isinstance(elem, (str, bytes)):
+            return ("list",)
+        elif isinstance(elem, collections.abc.Mapping):
+            children = {key: self._infer_schema(value) for key, value in elem.items()}
+            if any(child is None for child in children.values()):
+                return None
+            return ("mapping", children)
+        elif isinstance(elem, tuple) and hasattr(elem, "_fields"):  # namedtuple
+            children = [self._infer_schema(value) for value in elem]
+            if any(child is None for child in children):
+                return None
+            return ("namedtuple", elem_type, children)
+        elif isinstance(elem, collections.abc.Sequence):
+            children = [self._infer_schema(value) for value in elem]
+            if any(child is None for child in children):
+                return None
+            return ("sequence", children)
+        return None
+
+    def _collate(self, schema, inputs, alloc):
+        kind = schema[0]
+        if kind == "array":
+            _, shape, dtype = schema
+            if any(elem.dtype != dtype for elem in inputs):
+                raise ValueError("dtype mismatch with the cached schema")
+            out = alloc((len(inputs),) + shape, dtype)
+            if out is None:
+                out = np.empty((len(inputs),) + shape, dtype)
+            # raise ValueError if shape mismatch
+            return np.stack(inputs, out=out)
+        elif kind == "scalar":
+            values = np.asarray(inputs)
+            if values.dtype != schema[1]:
+                # e.g. floats after ints would be truncated
+                raise ValueError("dtype mismatch with the cached schema")
+            out = alloc((len(inputs),), schema[1])
+            if out is None:
+                out = np.empty((len(inputs),), schema[1])
+            out[:] = values
+            return out
+        elif kind == "list":
+            return inputs
+        elif kind == "mapping":
+            if any(d.keys() != schema[1].keys() for d in inputs):
+                raise ValueError("keys mismatch with the cached schema")
+            return {
+                key: self._collate(child, [d[key] for d in inputs], alloc)
+                for key, child in schema[1].items()
+            }
+        elif kind == "namedtuple":
+            _, elem_type, children = schema
+            if any(len(elem) != len(children) for elem in inputs):
+                raise ValueError("length mismatch with the cached schema")
+            return elem_type(
+                *(
+                    self._collate(child, samples, alloc)
+                    for child, samples in zip(children, zip(*inputs))
+                )
+            )
+        else:
+            if any(len(elem) != len(schema[1]) for elem in inputs):
+                raise ValueError("length mismatch with the cached schema")
+            return [
+                self._collate(child, list(samples), alloc)
+                for child, samples in zip(schema[1], zip(*inputs))
+            ]
+
+    def apply(self, inputs, alloc=None):
+        r"""Merge samples into a batch.
+
+        Args:
+            inputs: list of samples.
+            alloc: a callable ``alloc(shape, dtype)`` which returns an uninitialized
+                numpy array to store a field of batch, or ``None`` if it can not
+                allocate one. Default: None, means ``np.empty`` is used.
+        """
+        if self.schema is None:
+            self.schema = self._infer_schema(inputs[0])
+        if self.schema is not None:
+            try:
+                return self._collate(self.schema, inputs, alloc or _no_alloc)
+            except (AttributeError, KeyError, TypeError, ValueError):
+                pass
+        # `Collator.apply` calls `self.apply` recursively, so a plain `Collator` is used
+        return Collator().apply(inputs)
+
+
+def _no_alloc(shape, dtype):
+    return None
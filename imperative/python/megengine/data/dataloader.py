@@ -7,24 +7,27 @@
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 import collections
+import concurrent.futures
 import gc
 import math
 import multiprocessing
+import multiprocessing.connection
 import platform
 import queue
 import random
 import threading
 import time
+import traceback
+import weakref
 from typing import Callable, Union
 
 import numpy as np
 
-from ..device import _sh, get_default_device
-from ..functional.tensor import copy
+from ..device import get_default_device
 from ..logger import get_logger
 from ..random.rng import _random_seed_generator
 from ..tensor import Tensor
-from .collator import Collator
+from .collator import Collator, SchemaCollator
 from .dataset import Dataset, StreamDataset
 from .sampler import MapSampler, Sampler, SequentialSampler, StreamSampler
 from .transform import PseudoTransform, Transform
@@ -34,17 +37,126 @@ try:
 except:
     import _thread as thread
 
+# interval at which workers blocked on queues check whether they should exit
+GLOBAL_TIMEOUT = 5
 
 logger = get_logger(__name__)
 
 
-GLOBAL_TIMEOUT = 5
+# upper bound of the prefetch factor tuned by `auto_prefetch`, relative to the
+# initial `prefetch_factor`
+AUTO_PREFETCH_MAX_RATIO = 4
+# number of consecutive waits on an empty batch queue before growing prefetch depth
+AUTO_PREFETCH_PATIENCE = 3
+
+# stages measured by `DataLoader.stats`
+_STAT_STAGES = ("sampling", "dataset", "transform", "collate", "queue_wait", "h2d")
+
+
+WorkerInfo = collections.namedtuple("WorkerInfo", ["id", "num_workers", "seed"])
+
+# information of current worker process, set when the worker starts
+_worker_info = None
+
+
+def get_worker_info():
+    r"""Get the information of current worker process of :class:`~.DataLoader`.
+
+    It can be used in :meth:`~.StreamDataset.__iter__` to iterate a different shard
+    of the stream in each worker when ``shard_stream=True``.
+
+    Returns:
+        ``None`` in the main process, otherwise a ``WorkerInfo`` with ``id``,
+        ``num_workers`` and ``seed`` of the worker.
+    """
+    return _worker_info
 
 
 def raise_timeout_error():
     raise RuntimeError("dataloader timeout")
 
 
+def _wait_for_batch(batch_queue, processes, timeout=None):
+    # Block until the batch queue is readable or any of the processes exits,
+    # so that main process does not wake up periodically to poll them.
+    # `processes` should be the ones alive before checking the batch queue,
+    # otherwise a process exiting in between could not wake it up.
+    sentinels = [p.sentinel for p in processes]
+    multiprocessing.connection.wait([batch_queue.reader] + sentinels, timeout)
+
+
+def _should_exit(shutdown_flag):
+    if shutdown_flag.value == 1:
+        return True
+    # the main process is killed without shutting down workers
+    parent = getattr(multiprocessing, "parent_process", lambda: None)()
+    return parent is not None and not parent.is_alive()
+
+
+def _get_or_exit(q, shutdown_flag):
+    # Blocking waits of workers are bounded, so that a worker waiting for a
+    # crashed peer still exits on shutdown. Returns None if it should exit.
+    while True:
+        try:
+            return q.get(timeout=GLOBAL_TIMEOUT)
+        except queue.Empty:
+            if _should_exit(shutdown_flag):
+                return None
+
+
+def _put_or_exit(q, item, shutdown_flag, **kwargs):
+    while True:
+        try:
+            q.put(item, timeout=GLOBAL_TIMEOUT, **kwargs)
+            return True
+        except queue.Full:
+            if _should_exit(shutdown_flag):
+                return False
+
+
+def _acquire_or_exit(semaphore, shutdown_flag):
+    while not semaphore.acquire(timeout=GLOBAL_TIMEOUT):
+        if _should_exit(shutdown_flag):
+            return False
+    return True
+
+
+class _LoaderStats:
+    r"""Accumulated time of each loading stage, shared by the main process and
+    all the worker processes of a :class:`DataLoader`.
+    """
+
+    def __init__(self):
+        # (count, total seconds) of each stage
+        self.values = multiprocessing.Array("d", 2 * len(_STAT_STAGES))
+
+    def add(self, stage, duration):
+        idx = 2 * _STAT_STAGES.index(stage)
+        with self.values.get_lock():
+            values = self.values.get_obj()
+            values[idx] += 1
+            values[idx + 1] += duration
+
+    def reset(self):
+        with self.values.get_lock():
+            values = self.values.get_obj()
+            for idx in range(len(values)):
+                values[idx] = 0
+
+    def summary(self):
+        with self.values.get_lock():
+            values = list(self.values.get_obj())
+        ret = {}
+        for idx, stage in enumerate(_STAT_STAGES):
+            count, total = int(values[2 * idx]), values[2 * idx + 1]
+            ret[stage] = {
+                "count": count,
+                "total": total,
+                "mean": total / count if count else 0.0,
+            }
+        return ret
+
+
 class DataLoader:
     r"""Provides a convenient way to iterate on a given dataset.
 
@@ -59,8 +171,9 @@ class DataLoader:
             Default: None
         collator: defined the merging strategy for a transformed batch.
             Default: None
-        num_workers: the number of sub-process to load, transform and collate
-            the batch. ``0`` means using single-process. Default: 0
+        num_workers: the number of sub-process (or thread, see ``worker_type``) to
+            load, transform and collate the batch. ``0`` means using single-process.
+            Default: 0
         timeout: if positive, means the timeout value(second) for collecting a
             batch from workers. Default: 0
         timeout_event: callback function triggered by timeout, default to raise
@@ -71,6 +184,35 @@ class DataLoader:
             different sub-process will process different batch. Default: False
         preload: Defines whether to apply the preloading strategy of dataloader, and parallelize the copy of host2device while kernal is executed to improve the loading speed. default is seted False
             the output will change from np.ndarry to dtype tensor. the support dtypes for preload are int,float,list[int,float],tuple[int,float],and another type is not supported.
+        preload_depth: number of batches loaded to device in advance by a background
+            thread when ``preload=True``. ``0`` means batches are loaded to device
+            in the main thread when requested. Default: 2
+        ordered: whether to deliver the batches in the same order as the indices
+            generated by sampler. ``False`` means the batch finished first is delivered
+            first, which avoids a slow sample stalling the whole pipeline, and each
+            minibatch is returned as ``(batch, indices)`` where ``indices`` are the
+            sampler indices of the batch. Only works for map dataset and
+            can not be used in divide mode. Default: True
+        persistent_workers: whether to keep the worker processes and queues alive
+            between epochs, only the random seed and the sampler indices of the new
+            epoch are sent to them when a new epoch starts. Only works for map dataset
+            when ``num_workers > 0``. Default: False
+        prefetch_factor: number of batches loaded in advance by each worker.
+            Only works when ``num_workers > 0``. Default: 2
+        auto_prefetch: whether to grow the prefetch depth when the main process keeps
+            waiting for batches, up to ``4 * prefetch_factor``. Only works for map
+            dataset when ``num_workers > 0``. Default: False
+        shard_stream: whether each worker iterates its own shard of the stream, and
+            transforms and collates whole batches by itself. The dataset should
+            choose its shard by :func:`get_worker_info` in ``__iter__``, otherwise
+            each worker reads the whole stream. Only works for stream dataset when
+            ``num_workers > 0``. Default: False
+        worker_type: ``"process"`` runs the workers in sub-processes, ``"thread"``
+            runs them on a thread pool of the main process, which avoids forking and
+            pickling batches between processes, and suits the transforms releasing
+            GIL, like the ones based on OpenCV. Threads share the random state, and
+            ``persistent_workers`` and ``auto_prefetch`` have no effect on them.
+            Only works for map dataset. Default: "process"
     """
     __initialized = False
 
@@ -85,6 +227,13 @@ class DataLoader:
         timeout_event: Callable = raise_timeout_error,
         divide: bool = False,
         preload: bool = False,
+        preload_depth: int = 2,
+        ordered: bool = True,
+        persistent_workers: bool = False,
+        prefetch_factor: int = 2,
+        auto_prefetch: bool = False,
+        shard_stream: bool = False,
+        worker_type: str = "process",
     ):
         if num_workers < 0:
             raise ValueError("num_workers should not be negative")
@@ -95,6 +244,30 @@ class DataLoader:
         if divide and num_workers <= 1:
             raise ValueError("divide should not be set to True when num_workers <= 1")
 
+        if divide and not ordered:
+            raise ValueError("ordered should not be set to False in divide mode")
+
+        if prefetch_factor <= 0:
+            raise ValueError("prefetch_factor should be positive")
+
+        if preload_depth < 0:
+            raise ValueError("preload_depth should not be negative")
+
+        if persistent_workers and num_workers == 0:
+            raise ValueError(
+                "persistent_workers should not be set to True when num_workers is 0"
+            )
+
+        if worker_type not in ("process", "thread"):
+            raise ValueError(
+                "worker_type should be 'process' or 'thread', but got {}".format(
+                    worker_type
+                )
+            )
+
+        if worker_type == "thread" and isinstance(dataset, StreamDataset):
+            raise ValueError("worker_type='thread' only works for map dataset")
+
         self.dataset = dataset
 
         self.num_workers = num_workers
@@ -103,6 +276,18 @@ class DataLoader:
 
         self.divide = divide
         self.preload = preload
+        self.preload_depth = preload_depth
+        self.ordered = ordered
+        self.persistent_workers = persistent_workers
+        self.prefetch_factor = prefetch_factor
+        self.auto_prefetch = auto_prefetch
+        self.shard_stream = shard_stream
+        self.worker_type = worker_type
+        self._iterator = None
+        # the iterator of current epoch, and the number of batches it should skip
+        self._last_iterator = None
+        self._resume_batches = 0
+        self._stats = _LoaderStats()
 
         if isinstance(dataset, StreamDataset):
             self.sampler = sampler if sampler else StreamSampler(batch_size=1)
@@ -145,9 +330,13 @@ class DataLoader:
         self.__initialized = True
 
     def __iter__(self):
-        if platform.system() == "Windows" and self.num_workers > 0:
+        if (
+            platform.system() == "Windows"
+            and self.num_workers > 0
+            and self.worker_type == "process"
+        ):
             print(
-                "pyarrow.plasma does not support ParallelDataLoader on windows, changing num_workers to be zero"
+                "ParallelDataLoader is not supported on windows, changing num_workers to be zero"
             )
             self.num_workers = 0
         if isinstance(self.dataset, StreamDataset):
@@ -160,66 +349,166 @@ class DataLoader:
                 self.dataset, Dataset
             ), "Can not recognize this kind of dataset: %s" % type(self.dataset)
             if not self.num_workers:
-                return _SerialMapDataLoaderIter(self, self.preload)
+                loader_iter = _SerialMapDataLoaderIter(self, self.preload)
+            elif self.worker_type == "thread":
+                loader_iter = _ThreadMapDataLoaderIter(self, self.preload)
+            elif self.persistent_workers:
+                if self._iterator is not None and self._iterator._exhausted():
+                    self._iterator._reset()
+                else:
+                    # workers of an unfinished epoch still hold its batches,
+                    # so they are replaced by new ones.
+                    self._iterator = None
+                    self._iterator = _ParallelMapDataLoaderIter(self, self.preload)
+                loader_iter = self._iterator
             else:
-                return _ParallelMapDataLoaderIter(self, self.preload)
+                loader_iter = _ParallelMapDataLoaderIter(self, self.preload)
+            self._last_iterator = weakref.ref(loader_iter)
+            return loader_iter
 
     def __len__(self):
         return len(self.sampler)
 
+    def state_dict(self) -> dict:
+        r"""Get the state to resume loading from the next batch not consumed yet.
+
+        It contains the state of sampler at the start of current epoch and the
+        number of batches consumed in the epoch, after loading it by
+        :meth:`load_state_dict`, the next iteration skips the consumed batches by
+        the sampler without loading them. The random state of transforms is not
+        saved. Only works for map dataset when ``ordered=True``.
+
+        Returns:
+            a dict with ``sampler`` and ``num_batches``.
+        """
+        if isinstance(self.dataset, StreamDataset):
+            raise ValueError("state_dict only works for map dataset")
+        if not self.ordered:
+            raise ValueError("state_dict does not work when ordered=False")
+        loader_iter = self._last_iterator() if self._last_iterator else None
+        if loader_iter is None or loader_iter._exhausted():
+            # the next epoch is started from the current state of sampler
+            return {
+                "sampler": self.sampler.state_dict(),
+                "num_batches": self._resume_batches,
+            }
+        return loader_iter.state_dict()
+
+    def load_state_dict(self, state: dict):
+        r"""Load the state got by :meth:`state_dict`, which takes effect when
+        iterating the DataLoader next time.
+        """
+        if isinstance(self.dataset, StreamDataset):
+            raise ValueError("load_state_dict only works for map dataset")
+        self.sampler.load_state_dict(state["sampler"])
+        self._resume_batches = state["num_batches"]
+        # the workers of persistent iterator are restarted with the new state
+        self._iterator = None
+        self._last_iterator = None
+
+    def stats(self, reset: bool = False):
+        r"""Get the time spent in each stage of loading since the creation of
+        DataLoader or the last reset.
+
+        Stages are ``sampling`` (generating indices by sampler), ``dataset``
+        (getting items from dataset), ``transform``, ``collate``, ``queue_wait``
+        (main process waiting for batches from workers) and ``h2d``
+        (host to device copy when ``preload=True``).
+
+        Args:
+            reset: whether to reset the statistics after getting them. Default: False
+
+        Returns:
+            a dict maps each stage to a dict with ``count``, ``total`` and ``mean``,
+            the time is measured in seconds.
+        """
+        ret = self._stats.summary()
+        if reset:
+            self._stats.reset()
+        return ret
+
 
 class PreLoader:
-    def __init__(self, preload):
+    def __init__(self, preload, preload_depth=0):
         if preload:
             self.default_device = get_default_device()
-            self.pre_load_device = self.default_device + ":" + str(_sh.get_next())
-            self.pre_load_device_cache = None
+            self.preload_depth = preload_depth
+            self.preload_thread = None
+            self.preload_finished = False
         self.preload = preload
 
-    """
-    strategy one: load from numpy data, and generate dtype tensor
-    """
-
-    def _load_tensor(self, batch, cached=True):
+    def _load_tensor(self, batch):
+        # load numpy data to default device directly
         if isinstance(batch, np.ndarray):
-            device = self.pre_load_device if cached else self.default_device
-            return Tensor(batch, device=device)
+            return Tensor(batch, device=self.default_device)
         elif isinstance(batch, collections.abc.Mapping):
-            return {k: self._load_tensor(v, cached) for k, v in batch.items()}
+            return {k: self._load_tensor(v) for k, v in batch.items()}
         elif isinstance(batch, tuple) and hasattr(batch, "_fields"):  # namedtuple
-            return type(batch)(*(self._load_tensor(value, cached) for value in batch))
+            return type(batch)(*(self._load_tensor(value) for value in batch))
         elif isinstance(batch, collections.abc.Sequence):
-            return [self._load_tensor(value, cached) for value in batch]
+            return [self._load_tensor(value) for value in batch]
         else:
             return batch
 
-    """
-    strategy two: load from cache that is already tensor just do d2d copy
-    """
+    def _get_next_host_batch(self):
+        raise NotImplementedError
 
-    def _load_cache(self, data):
-        if isinstance(data, Tensor):
-            if data.device == self.default_device:
-                return data
-            return copy(data, device=self.default_device)
-        elif isinstance(data, collections.abc.Mapping):
-            return {k: self._load_cache(v) for k, v in data.items()}
-        elif isinstance(data, tuple) and hasattr(data, "_fields"):  # namedtuple
-            return type(data)(*(self._load_cache(value) for value in data))
-        elif isinstance(data, collections.abc.Sequence):
-            return [self._load_cache(value) for value in data]
-        else:
-            return data
+    def _load_next_to_device(self):
+        batch = self._get_next_host_batch()
+        start_time = time.perf_counter()
+        batch = self._load_tensor(batch)
+        self.stats.add("h2d", time.perf_counter() - start_time)
+        return batch
+
+    def _start_preload(self):
+        self.preload_queue = queue.Queue()
+        self.preload_credits = threading.Semaphore(self.preload_depth)
+        self.preload_stop = threading.Event()
+        self.preload_thread = threading.Thread(
+            target=_preload_loop,
+            args=(
+                weakref.ref(self),
+                self.preload_queue,
+                self.preload_credits,
+                self.preload_stop,
+            ),
+            daemon=True,
+        )
+        self.preload_thread.start()
+
+    def _get_preloaded(self):
+        if self.preload_depth == 0:
+            return self._load_next_to_device()
+        if self.preload_finished:
+            raise StopIteration
+        if self.preload_thread is None:
+            self._start_preload()
+        batch, error = self.preload_queue.get()
+        if error is not None:
+            # the thread stops at StopIteration or error, like a generator
+            self.preload_finished = True
+            raise error
+        self.preload_credits.release()
+        return batch
+
+    def _stop_preload(self, join=False):
+        thread = getattr(self, "preload_thread", None)
+        if thread is None:
+            return
+        self.preload_stop.set()
+        self.preload_credits.release()
+        if join and thread is not threading.current_thread():
+            thread.join()
+        self.preload_thread = None
+        self.preload_finished = False
 
-    def _swap_out_cache(self):
-        out = self._load_cache(self.pre_load_device_cache)
-        self.pre_load_device_cache = None  # clean cache
-        return out
+    def __del__(self):
+        self._stop_preload()
 
 
 class _BaseMapDataLoaderIter(PreLoader):
     def __init__(self, loader, preload):
-        super().__init__(preload)
+        super().__init__(preload, loader.preload_depth)
         self.dataset = loader.dataset
         self.sampler = loader.sampler
         self.seed = _random_seed_generator().__next__()
@@ -229,7 +518,27 @@ class _BaseMapDataLoaderIter(PreLoader):
         self.timeout = loader.timeout
         self.timeout_event = loader.timeout_event
         self.divide = loader.divide
+        self.ordered = loader.ordered
+        self.stats = loader._stats
         self.num_processed = 0
+        self.num_returned = 0
+        # batches consumed before the loaded state was saved
+        self.num_skipped = loader._resume_batches
+        loader._resume_batches = 0
+
+    def _iter_sampler(self):
+        # the state of sampler at the start of each epoch is kept, so that the
+        # epoch can be restarted by the state and the number of returned batches.
+        self.sampler_state = self.sampler.state_dict()
+        indices_iter = iter(self.sampler)
+        if self.num_skipped:
+            _skip_batches(indices_iter, self.num_skipped)
+            self.num_processed = self.num_returned = self.num_skipped
+            self.num_skipped = 0
+        return indices_iter
+
+    def state_dict(self):
+        return {"sampler": self.sampler_state, "num_batches": self.num_returned}
 
     def _get_next_batch(self):
         raise NotImplementedError
@@ -240,43 +549,41 @@ class _BaseMapDataLoaderIter(PreLoader):
     def __iter__(self):
         return self
 
+    def _exhausted(self):
+        return self.num_returned >= len(self)
+
     def __next__(self):
         if self.preload:
-            cached = self.pre_load_device_cache
-            if cached is None:  # first and last
-                if self.num_processed >= len(self):  # last
-                    raise StopIteration
-                elif self.num_processed == 0:  # first
-                    self._try_load_tensor(cached=False)  # first do the h2d
-            out = self._swap_out_cache()
-            self._try_load_tensor()
-            return out
+            minibatch = self._get_preloaded()
         else:
-            if self.num_processed >= len(self):
-                raise StopIteration
-            minibatch = self._get_next_batch()
-            self.num_processed += 1
-            return minibatch
+            minibatch = self._get_next_host_batch()
+        self.num_returned += 1
+        return minibatch
 
-    def _try_load_tensor(self, cached=True):
+    def _get_next_host_batch(self):
         if self.num_processed >= len(self):
-            return
-        else:
-            self.num_processed += 1
-            batch = self._get_next_batch()
-            self.pre_load_device_cache = self._load_tensor(batch, cached)
+            raise StopIteration
+        minibatch = self._get_next_batch()
+        self.num_processed += 1
+        return minibatch
 
 
 class _SerialMapDataLoaderIter(_BaseMapDataLoaderIter):
     def __init__(self, loader, preload):
         super(_SerialMapDataLoaderIter, self).__init__(loader, preload)
-        self.indices_iter = iter(self.sampler)
+        self.indices_iter = self._iter_sampler()
 
     def _get_next_batch(self):
+        start_time = time.perf_counter()
         indices = next(self.indices_iter)
-        items = [self.dataset[idx] for idx in indices]
-        trans_items = self.transform.apply_batch(items)
-        return self.collator.apply(trans_items)
+        self.stats.add("sampling", time.perf_counter() - start_time)
+        trans_items = _load_items(self.dataset, indices, self.transform, self.stats)
+        start_time = time.perf_counter()
+        batch_data = self.collator.apply(trans_items)
+        self.stats.add("collate", time.perf_counter() - start_time)
+        if not self.ordered:
+            return batch_data, indices
+        return batch_data
 
 
 class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
@@ -284,33 +591,75 @@ class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
 
     def __init__(self, loader, preload):
         super(_ParallelMapDataLoaderIter, self).__init__(loader, preload)
-
-        self.task_queues = [
-            multiprocessing.Queue(maxsize=2) for _ in range(self.num_workers)
-        ]
+        self.persistent = loader.persistent_workers
+        self.auto_prefetch = loader.auto_prefetch
+        if self.auto_prefetch:
+            max_prefetch_factor = AUTO_PREFETCH_MAX_RATIO * loader.prefetch_factor
+        else:
+            max_prefetch_factor = loader.prefetch_factor
+        self.max_prefetch_factor = max_prefetch_factor
+        # the number of batches in flight is limited to ``prefetch_factor`` per
+        # worker, feeding worker takes a credit for each batch and main process
+        # gives it back when the batch is consumed.
+        self.prefetch_factor = multiprocessing.Value("i", loader.prefetch_factor)
+        self.credits_per_factor = 1 if self.divide else self.num_workers
+        self.prefetch_credits = multiprocessing.Semaphore(
+            loader.prefetch_factor * self.credits_per_factor
+        )
+        self.num_waits = 0
+
+        if self.ordered:
+            self.task_queues = [
+                multiprocessing.Queue(maxsize=max_prefetch_factor)
+                for _ in range(self.num_workers)
+            ]
+            self.trans_data_queues = [
+                multiprocessing.Queue(maxsize=1) for _ in range(self.num_workers)
+            ]
+        else:
+            # all workers share the same queues, so that any idle worker can take
+            # the next task and any finished batch can be collected first.
+            task_queue = multiprocessing.Queue(
+                maxsize=max_prefetch_factor * self.num_workers
+            )
+            trans_data_queue = multiprocessing.Queue(maxsize=self.num_workers)
+            self.task_queues = [task_queue] * self.num_workers
+            self.trans_data_queues = [trans_data_queue] * self.num_workers
 
         self.feed_batch_idx = multiprocessing.Value("i", 0)
         self.target_batch_idx = multiprocessing.Value("i", 0)
         self.shutdown_flag = multiprocessing.Value("i", 0)
 
-        self.trans_data_queues = [
-            multiprocessing.Queue(maxsize=1) for _ in range(self.num_workers)
-        ]
+        # use shared-memory queue, see `tools._queue.create_batch_queue` for backends.
+        from .tools._queue import create_batch_queue
 
-        # use shared-memory queue implemented by pyarrow plasma store.
-        from .tools._queue import PlasmaShmQueue
+        self.batch_queue = create_batch_queue(maxsize=max_prefetch_factor)
 
-        self.batch_queue = PlasmaShmQueue(maxsize=2)
+        indices_iter = self._iter_sampler()
+        if self.persistent:
+            # sampler indices and seed of each epoch are sent by `_reset`
+            self.epoch_queue = multiprocessing.Queue()
+            self.epoch_seed = multiprocessing.Value("L", self.seed)
+            self.epoch_queue.put(indices_iter)
+            # batch index keeps increasing across epochs, so there is no end
+            length = None
+        else:
+            self.epoch_seed = None
+            length = len(self) - self.num_processed
 
         self.task_feeding_worker = multiprocessing.Process(
-            target=_task_feeding_loop,
+            target=_persistent_task_feeding_loop
+            if self.persistent
+            else _task_feeding_loop,
             args=(
-                iter(self.sampler),
+                self.epoch_queue if self.persistent else indices_iter,
                 self.task_queues,
                 self.num_workers,
                 self.divide,
                 self.shutdown_flag,
                 self.feed_batch_idx,
+                self.prefetch_credits,
+                self.stats,
             ),
             daemon=True,
         )
@@ -328,6 +677,10 @@ class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
                     self.transform,
                     self.seed + worker_id + 1,
                     self.shutdown_flag,
+                    self.stats,
+                    worker_id,
+                    self.epoch_seed,
+                    self.num_workers,
                 ),
                 daemon=True,
             )
@@ -342,10 +695,25 @@ class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
                     self.trans_data_queues,
                     self.batch_queue,
                     self.collator,
-                    len(self),
+                    length,
                     self.num_workers,
                     self.shutdown_flag,
                     self.target_batch_idx,
+                    self.stats,
+                ),
+                daemon=True,
+            )
+        elif not self.ordered:
+            self.data_collecting_worker = multiprocessing.Process(
+                target=_data_unordered_loop,
+                args=(
+                    self.trans_data_queues[0],
+                    self.batch_queue,
+                    self.collator,
+                    length,
+                    self.shutdown_flag,
+                    self.target_batch_idx,
+                    self.stats,
                 ),
                 daemon=True,
             )
@@ -356,10 +724,11 @@ class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
                     self.trans_data_queues,
                     self.batch_queue,
                     self.collator,
-                    len(self),
+                    length,
                     self.num_workers,
                     self.shutdown_flag,
                     self.target_batch_idx,
+                    self.stats,
                 ),
                 daemon=True,
             )
@@ -368,6 +737,17 @@ class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
 
         self.__initialized = True
 
+    def _reset(self):
+        # start a new epoch on the persistent workers
+        if self.preload:
+            self._stop_preload(join=True)
+        self.num_processed = 0
+        self.num_returned = 0
+        self.seed = _random_seed_generator().__next__()
+        with self.epoch_seed.get_lock():
+            self.epoch_seed.value = self.seed
+        self.epoch_queue.put(self._iter_sampler())
+
     def _check_workers(self):
         # Check the status of each worker.
         if not self.data_collecting_worker.is_alive():
@@ -388,23 +768,56 @@ class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
 
         logger.debug("all workers are alive.")
 
+    def _tune_prefetch(self, waited):
+        # grow prefetch depth when main process keeps waiting for batches
+        if not waited:
+            self.num_waits = 0
+            return
+        self.num_waits += 1
+        if self.num_waits < AUTO_PREFETCH_PATIENCE:
+            return
+        self.num_waits = 0
+        with self.prefetch_factor.get_lock():
+            if self.prefetch_factor.value < self.max_prefetch_factor:
+                self.prefetch_factor.value += 1
+                for _ in range(self.credits_per_factor):
+                    self.prefetch_credits.release()
+                logger.debug(
+                    "increase prefetch_factor to {}".format(self.prefetch_factor.value)
+                )
+
     def _get_next_batch(self):
-        start_time = time.time()
+        start_time = time.perf_counter()
+        waited = self.batch_queue.empty()
+        processes = [self.task_feeding_worker, self.data_collecting_worker]
+        processes += self.workers
         while True:
             self._check_workers()
+            alive = [p for p in processes if p.exitcode is None]
             try:
-                return self.batch_queue.get(timeout=1)
+                batch_data = self.batch_queue.get(block=False)
+                break
             except queue.Empty:
                 logger.debug("batch queue empty!")
-            waited_time = time.time() - start_time
+            wait_time = None
             if self.timeout > 0:
-                if waited_time > self.timeout:
+                wait_time = self.timeout - (time.perf_counter() - start_time)
+                if wait_time <= 0:
                     raise RuntimeError("get_next_batch timeout!")
+            _wait_for_batch(self.batch_queue, alive, wait_time)
+        self.stats.add("queue_wait", time.perf_counter() - start_time)
+        self.prefetch_credits.release()
+        if self.auto_prefetch:
+            self._tune_prefetch(waited)
+        return batch_data
 
     def _shutdown(self):
         with self.shutdown_flag.get_lock():
             self.shutdown_flag.value = 1
 
+        if self.preload:
+            self._stop_preload()
+
         if self.task_feeding_worker.is_alive():
             self.task_feeding_worker.terminate()
         self.task_feeding_worker.join()
@@ -418,14 +831,18 @@ class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
                 worker.terminate()
             worker.join()
 
-        for q in self.trans_data_queues:
+        for q in set(self.trans_data_queues):
             q.cancel_join_thread()
             q.close()
 
-        for q in self.task_queues:
+        for q in set(self.task_queues):
             q.cancel_join_thread()
             q.close()
 
+        if self.persistent:
+            self.epoch_queue.cancel_join_thread()
+            self.epoch_queue.close()
+
         self.batch_queue.cancel_join_thread()
         self.batch_queue.close()
 
@@ -434,9 +851,113 @@ class _ParallelMapDataLoaderIter(_BaseMapDataLoaderIter):
             self._shutdown()
 
 
+class _ThreadMapDataLoaderIter(_BaseMapDataLoaderIter):
+    __initialized = False
+
+    def __init__(self, loader, preload):
+        super(_ThreadMapDataLoaderIter, self).__init__(loader, preload)
+        # the number of batches in flight is limited to ``prefetch_factor`` per
+        # worker, new batches are submitted when one is consumed.
+        self.max_tasks = loader.prefetch_factor * self.num_workers
+        self.indices_iter = self._iter_sampler()
+        # (indices, futures) of each batch in flight, in the order of sampler
+        self.tasks = collections.deque()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.num_workers, thread_name_prefix="DataLoaderWorker"
+        )
+        self.__initialized = True
+
+    def _feed_tasks(self):
+        while len(self.tasks) < self.max_tasks:
+            start_time = time.perf_counter()
+            try:
+                indices = next(self.indices_iter)
+            except StopIteration:
+                break
+            self.stats.add("sampling", time.perf_counter() - start_time)
+            if self.divide:
+                # divide into small pieces, the batch is collated after all of them
+                # are transformed.
+                sub_num = math.ceil(len(indices) / self.num_workers)
+                futures = [
+                    self.executor.submit(
+                        _load_items,
+                        self.dataset,
+                        indices[worker_id * sub_num : (worker_id + 1) * sub_num],
+                        self.transform,
+                        self.stats,
+                    )
+                    for worker_id in range(self.num_workers)
+                ]
+            else:
+                futures = [
+                    self.executor.submit(
+                        _load_and_collate,
+                        self.dataset,
+                        indices,
+                        self.transform,
+                        self.collator,
+                        self.stats,
+                    )
+                ]
+            self.tasks.append((indices, futures))
+
+    def _get_next_batch(self):
+        self._feed_tasks()
+        if not self.tasks:
+            raise StopIteration
+        start_time = time.perf_counter()
+        timeout = self.timeout if self.timeout > 0 else None
+        task_idx = 0
+        if not self.ordered:
+            # deliver the batch finished first
+            done, _ = concurrent.futures.wait(
+                [futures[0] for _, futures in self.tasks],
+                timeout,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for task_idx, (_, futures) in enumerate(self.tasks):
+                if futures[0] in done:
+                    break
+        indices, futures = self.tasks[task_idx]
+        if timeout is not None:
+            timeout = max(timeout - (time.perf_counter() - start_time), 0)
+        _, not_done = concurrent.futures.wait(futures, timeout)
+        if not_done:
+            raise RuntimeError("get_next_batch timeout!")
+        del self.tasks[task_idx]
+        self.stats.add("queue_wait", time.perf_counter() - start_time)
+
+        if self.divide:
+            full_trans_items = []
+            for future in futures:
+                full_trans_items.extend(future.result())
+            start_time = time.perf_counter()
+            batch_data = self.collator.apply(full_trans_items)
+            self.stats.add("collate", time.perf_counter() - start_time)
+        else:
+            batch_data = futures[0].result()
+        if not self.ordered:
+            return batch_data, indices
+        return batch_data
+
+    def _shutdown(self):
+        if self.preload:
+            self._stop_preload()
+        for _, futures in self.tasks:
+            for future in futures:
+                future.cancel()
+        self.tasks.clear()
+        self.executor.shutdown(wait=False)
+
+    def __del__(self):
+        if self.__initialized:
+            self._shutdown()
+
+
 class _BaseStreamDataLoaderIter(PreLoader):
     def __init__(self, loader, preload):
-        super().__init__(preload)
+        super().__init__(preload, loader.preload_depth)
         self.dataset = loader.dataset
         self.sampler = loader.sampler
         self.transform = loader.transform
@@ -444,6 +965,7 @@ class _BaseStreamDataLoaderIter(PreLoader):
         self.num_workers = loader.num_workers
         self.timeout = loader.timeout
         self.timeout_event = loader.timeout_event
+        self.stats = loader._stats
 
     def _get_next_batch(self):
         raise NotImplementedError
@@ -466,22 +988,20 @@ class _BaseStreamDataLoaderIter(PreLoader):
 
     def __next__(self):
         if self.preload:
-            if self.pre_load_device_cache is None:
-                self._try_load_tensor(cached=False)  # load in current
-            out = self._swap_out_cache()
-            self._try_load_tensor()  # load in cached
-            return out
+            return self._get_preloaded()
         else:
             return self._get_next_batch()
 
-    def _try_load_tensor(self, cached=True):
-        batch = self._get_next_batch()
-        self.pre_load_device_cache = self._load_tensor(batch, cached)
+    def _get_next_host_batch(self):
+        return self._get_next_batch()
 
 
 class _SerialStreamDataLoaderIter(_BaseStreamDataLoaderIter):
     def __init__(self, loader, preload):
         super().__init__(loader, preload)
+        if preload and self.timeout > 0:
+            # timeout interrupts main thread, so data is loaded in main thread
+            self.preload_depth = 0
         self.dataset_iter = iter(self.dataset)
         self.idx = 0
         self.unused = []
@@ -493,7 +1013,9 @@ class _SerialStreamDataLoaderIter(_BaseStreamDataLoaderIter):
                 if self.timeout > 0:
                     timer = threading.Timer(self.timeout, thread.interrupt_main)
                     timer.start()
+                read_time = time.perf_counter()
                 raw_data = next(self.dataset_iter)
+                self.stats.add("dataset", time.perf_counter() - read_time)
                 if self.timeout > 0:
                     timer.cancel()
             except KeyboardInterrupt:
@@ -516,12 +1038,17 @@ class _SerialStreamDataLoaderIter(_BaseStreamDataLoaderIter):
                 raw_data = self._try_get_raw_data(start_time)
                 batch_data = self._process_raw_data(raw_data)
 
+            transform_time = time.perf_counter()
             while len(batch_data) != 0 and len(ret) < self.sampler.batch_size:
                 data = batch_data.pop()
                 ret.append(self.transform.apply(data))
+            self.stats.add("transform", time.perf_counter() - transform_time)
             self.unused = batch_data
 
-        return self.collator.apply(ret)
+        collate_time = time.perf_counter()
+        batch_data = self.collator.apply(ret)
+        self.stats.add("collate", time.perf_counter() - collate_time)
+        return batch_data
 
 
 class _ParallelStreamDataLoaderIter(_BaseStreamDataLoaderIter):
@@ -531,6 +1058,12 @@ class _ParallelStreamDataLoaderIter(_BaseStreamDataLoaderIter):
         super().__init__(loader, preload)
 
         self.shutdown_flag = multiprocessing.Value("i", 0)
+        self.shard = loader.shard_stream
+
+        if self.shard:
+            self._init_shard_workers(loader)
+            self.__initialized = True
+            return
 
         self.raw_data_queues = [
             multiprocessing.Queue(maxsize=1) for _ in range(self.num_workers)
@@ -540,10 +1073,10 @@ class _ParallelStreamDataLoaderIter(_BaseStreamDataLoaderIter):
             multiprocessing.Queue(maxsize=1) for _ in range(self.num_workers)
         ]
 
-        # shared-memory queue implemented by pyarrow plasma store
-        from .tools._queue import PlasmaShmQueue
+        # shared-memory queue, see `tools._queue.create_batch_queue` for backends.
+        from .tools._queue import create_batch_queue
 
-        self.batch_queue = PlasmaShmQueue(maxsize=2)
+        self.batch_queue = create_batch_queue(maxsize=loader.prefetch_factor)
 
         self.recieve_worker = multiprocessing.Process(
             target=self._worker_to_raw_data_queues, daemon=True
@@ -568,20 +1101,63 @@ class _ParallelStreamDataLoaderIter(_BaseStreamDataLoaderIter):
 
         self.__initialized = True
 
+    def _init_shard_workers(self, loader):
+        from .tools._queue import create_batch_queue
+
+        self.batch_queue = create_batch_queue(maxsize=loader.prefetch_factor)
+        seed = _random_seed_generator().__next__()
+
+        self.shard_workers = []
+        for worker_id in range(self.num_workers):
+            worker = multiprocessing.Process(
+                target=self._shard_worker_to_batch_queue,
+                args=(worker_id, seed + worker_id + 1),
+                daemon=True,
+            )
+            gc.collect()
+            worker.start()
+            self.shard_workers.append(worker)
+
+    def _shard_worker_to_batch_queue(self, worker_id, seed):
+        global _worker_info
+        _worker_info = WorkerInfo(worker_id, self.num_workers, seed)
+        random.seed(seed)
+        np.random.seed(seed)
+
+        dataset_iter = iter(self.dataset)
+        batch_size = self.sampler.batch_size
+        items = []
+        while True:
+            if self.shutdown_flag.value == 1:
+                break
+            start_time = time.perf_counter()
+            try:
+                raw_data = next(dataset_iter)
+            except StopIteration:
+                break
+            self.stats.add("dataset", time.perf_counter() - start_time)
+            items.extend(self._process_raw_data(raw_data))
+            while len(items) >= batch_size:
+                self._transform_and_put(items[:batch_size])
+                items = items[batch_size:]
+        if items and self.shutdown_flag.value == 0:
+            # the last incomplete batch of the shard
+            self._transform_and_put(items)
+
+    def _transform_and_put(self, items):
+        start_time = time.perf_counter()
+        trans_items = self.transform.apply_batch(items)
+        self.stats.add("transform", time.perf_counter() - start_time)
+        _collate_and_put(
+            self.collator, trans_items, self.batch_queue, self.stats, self.shutdown_flag
+        )
+
     def _put_raw_data_queues(self, raw_data, qidx):
         batch_data = self._process_raw_data(raw_data)
         for data in batch_data:
-            while True:
-                qidx = qidx % self.num_workers
-                try:
-                    self.raw_data_queues[qidx].put(data)
-                    break
-                except queue.Full:
-                    if self.shutdown_flag.value == 1:
-                        break
-                    logger.debug("raw data queue %d is full" % qidx)
-                finally:
-                    qidx += 1
+            qidx = qidx % self.num_workers
+            _put_or_exit(self.raw_data_queues[qidx], data, self.shutdown_flag)
+            qidx += 1
         return qidx
 
     def _worker_to_raw_data_queues(self):
@@ -590,26 +1166,24 @@ class _ParallelStreamDataLoaderIter(_BaseStreamDataLoaderIter):
         while True:
             if self.shutdown_flag.value == 1:
                 break
+            start_time = time.perf_counter()
             raw_data = next(dataset_iter)
+            self.stats.add("dataset", time.perf_counter() - start_time)
             qidx = self._put_raw_data_queues(raw_data, qidx)
 
     def _worker_to_trans_data_queues(self, worker_id):
         while True:
             if self.shutdown_flag.value == 1:
                 break
-            try:
-                data = self.raw_data_queues[worker_id].get(timeout=GLOBAL_TIMEOUT)
-            except queue.Empty:
-                continue
+            data = _get_or_exit(self.raw_data_queues[worker_id], self.shutdown_flag)
+            if data is None:
+                break
+            start_time = time.perf_counter()
             trans_data = self.transform.apply(data)
-            while True:
-                try:
-                    self.trans_data_queues[worker_id].put(trans_data)
-                    break
-                except queue.Full:
-                    if self.shutdown_flag.value == 1:
-                        break
-                    logger.debug("batch queue if full")
+            self.stats.add("transform", time.perf_counter() - start_time)
+            _put_or_exit(
+                self.trans_data_queues[worker_id], trans_data, self.shutdown_flag
+            )
 
     def _worker_to_batch_queue(self):
         cnt = -1
@@ -619,26 +1193,32 @@ class _ParallelStreamDataLoaderIter(_BaseStreamDataLoaderIter):
                 break
             cnt += 1
             queue_id = cnt % self.num_workers
-            try:
-                trans_item = self.trans_data_queues[queue_id].get(
-                    timeout=GLOBAL_TIMEOUT
-                )
-            except queue.Empty:
-                continue
+            trans_item = _get_or_exit(
+                self.trans_data_queues[queue_id], self.shutdown_flag
+            )
+            if trans_item is None:
+                break
             trans_items.append(trans_item)
             if len(trans_items) == self.sampler.batch_size:
-                batch_data = self.collator.apply(trans_items)
-                while True:
-                    try:
-                        self.batch_queue.put(batch_data, timeout=1)
-                        break
-                    except queue.Full:
-                        if self.shutdown_flag.value == 1:
-                            break
-                        logger.debug("batch queue is full")
+                _collate_and_put(
+                    self.collator,
+                    trans_items,
+                    self.batch_queue,
+                    self.stats,
+                    self.shutdown_flag,
+                )
                 trans_items = []
 
     def _check_workers(self):
+        if self.shard:
+            for worker_id, worker in enumerate(self.shard_workers):
+                exitcode = worker.exitcode
+                if exitcode is not None and exitcode != 0:
+                    raise RuntimeError(
+                        "worker: {} died. {}".format(worker_id, exitcode)
+                    )
+            return
+
         if not self.collect_worker.is_alive():
             exitcode = self.collect_worker.exitcode
             if exitcode != 0:
@@ -653,21 +1233,56 @@ class _ParallelStreamDataLoaderIter(_BaseStreamDataLoaderIter):
                     )
 
     def _get_next_batch(self):
-        start_time = time.time()
+        start_time = time.perf_counter()
+        event_time = start_time
+        if self.shard:
+            processes = self.shard_workers
+        else:
+            processes = [self.collect_worker] + self.transform_workers
         while True:
             self._check_workers()
+            alive = [p for p in processes if p.exitcode is None]
             try:
-                return self.batch_queue.get(timeout=1)
+                batch_data = self.batch_queue.get(block=False)
+                self.stats.add("queue_wait", time.perf_counter() - start_time)
+                return batch_data
             except queue.Empty:
                 logger.debug("batch queue empty!")
-            waited_time = time.time() - start_time
-            if self.timeout > 0 and waited_time > self.timeout:
-                self._put_raw_data_queues(self.timeout_event(), 0)
+            if self.shard and not alive:
+                # all the shards are finished
+                raise StopIteration
+            wait_time = None
+            if self.timeout > 0:
+                wait_time = self.timeout - (time.perf_counter() - event_time)
+                if wait_time <= 0:
+                    raw_data = self.timeout_event()
+                    if self.shard:
+                        return self._transform_and_collate(raw_data)
+                    self._put_raw_data_queues(raw_data, 0)
+                    event_time = time.perf_counter()
+                    continue
+            _wait_for_batch(self.batch_queue, alive, wait_time)
+
+    def _transform_and_collate(self, raw_data):
+        trans_items = self.transform.apply_batch(self._process_raw_data(raw_data))
+        return self.collator.apply(trans_items)
 
     def _shutdown(self):
         with self.shutdown_flag.get_lock():
             self.shutdown_flag.value = 1
 
+        if self.preload:
+            self._stop_preload()
+
+        if self.shard:
+            for worker in self.shard_workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+            self.batch_queue.cancel_join_thread()
+            self.batch_queue.close()
+            return
+
         if self.recieve_worker.is_alive():
             self.recieve_worker.terminate()
         self.recieve_worker.join()
@@ -697,64 +1312,186 @@ class _ParallelStreamDataLoaderIter(_BaseStreamDataLoaderIter):
             self._shutdown()
 
 
+def _preload_loop(loader_iter_ref, preload_queue, preload_credits, stop_event):
+    # Load batches to device in background thread, at most `preload_depth` batches
+    # are loaded in advance. Only a weak reference of the iterator is kept while
+    # waiting, so that the iterator can be released and shut down.
+    while True:
+        preload_credits.acquire()
+        if stop_event.is_set():
+            break
+        loader_iter = loader_iter_ref()
+        if loader_iter is None:
+            break
+        try:
+            preload_queue.put((loader_iter._load_next_to_device(), None))
+        except Exception as exc:
+            # frames of traceback refer to the iterator
+            traceback.clear_frames(exc.__traceback__)
+            preload_queue.put((None, exc))
+            break
+        finally:
+            del loader_iter
+
+
+def _skip_batches(indices_iter, num_batches):
+    # skip the indices of consumed batches without loading them
+    if hasattr(indices_iter, "skip"):
+        indices_iter.skip(num_batches)
+        return
+    for _ in range(num_batches):
+        next(indices_iter)
+
+
+def _load_items(dataset, indices, transform, stats):
+    # Get dataset items and do the transform, time of each stage is recorded
+    start_time = time.perf_counter()
+    items = dataset.__getitems__(indices)
+    stats.add("dataset", time.perf_counter() - start_time)
+    start_time = time.perf_counter()
+    trans_items = transform.apply_batch(items)
+    stats.add("transform", time.perf_counter() - start_time)
+    return trans_items
+
+
+def _load_and_collate(dataset, indices, transform, collator, stats):
+    # Get a full batch in a worker thread, which is returned without copy
+    trans_items = _load_items(dataset, indices, transform, stats)
+    start_time = time.perf_counter()
+    batch_data = collator.apply(trans_items)
+    stats.add("collate", time.perf_counter() - start_time)
+    return batch_data
+
+
+def _collate_and_put(
+    collator, trans_items, batch_queue, stats, shutdown_flag, indices=None
+):
+    # Merge items into a batch and put it into batch queue. The batch is directly
+    # collated into shared memory if both collator and batch queue support it.
+    start_time = time.perf_counter()
+    slot = None
+    if isinstance(collator, SchemaCollator) and hasattr(batch_queue, "acquire_slot"):
+        slot = batch_queue.acquire_slot()
+    if slot is None:
+        batch_data = collator.apply(trans_items)
+    else:
+        batch_data = collator.apply(trans_items, alloc=batch_queue.slot_allocator(slot))
+    stats.add("collate", time.perf_counter() - start_time)
+    if indices is not None:
+        batch_data = (batch_data, indices)
+    if slot is None:
+        _put_or_exit(batch_queue, batch_data, shutdown_flag)
+    else:
+        _put_or_exit(batch_queue, batch_data, shutdown_flag, slot=slot)
+
+
 def _task_feeding_loop(
-    indices_iter, task_queues, num_workers, divide, shutdown_flag, feed_batch_idx
+    indices_iter,
+    task_queues,
+    num_workers,
+    divide,
+    shutdown_flag,
+    feed_batch_idx,
+    prefetch_credits,
+    stats,
 ):
     # Feed the indices into the task queues
     while True:
         if shutdown_flag.value == 1:
             break
         batch_idx = feed_batch_idx.value
+        # limit the number of batches in flight, blocks until a batch is consumed
+        if not _acquire_or_exit(prefetch_credits, shutdown_flag):
+            break
+        start_time = time.perf_counter()
         try:
             indices = next(indices_iter)
         except StopIteration:
+            prefetch_credits.release()
             break
+        stats.add("sampling", time.perf_counter() - start_time)
         if divide:
-            # make sure all task_queues is ready for put
-            while any([q.full() for q in task_queues]):
-                if shutdown_flag.value == 1:
-                    return
             # divide into small pieces, feed to different workers.
             sub_num = math.ceil(len(indices) / num_workers)
             for worker_id in range(num_workers):
                 sub_indices = indices[worker_id * sub_num : (worker_id + 1) * sub_num]
-                task_queues[worker_id].put((batch_idx, sub_indices))
+                _put_or_exit(
+                    task_queues[worker_id], (batch_idx, sub_indices), shutdown_flag
+                )
         else:
             # distribute tasks to different workers uniformly.
             target_id = batch_idx % num_workers
-            while task_queues[target_id].full():
-                if shutdown_flag.value == 1:
-                    return
-            task_queues[target_id].put((batch_idx, indices))
+            _put_or_exit(task_queues[target_id], (batch_idx, indices), shutdown_flag)
         with feed_batch_idx.get_lock():
             feed_batch_idx.value += 1
 
 
-def _worker_loop(dataset, task_queue, trans_data_queue, transform, seed, shutdown_flag):
+def _persistent_task_feeding_loop(
+    epoch_queue,
+    task_queues,
+    num_workers,
+    divide,
+    shutdown_flag,
+    feed_batch_idx,
+    prefetch_credits,
+    stats,
+):
+    # Feed the indices of each epoch sent by main process
+    while True:
+        if shutdown_flag.value == 1:
+            break
+        indices_iter = _get_or_exit(epoch_queue, shutdown_flag)
+        if indices_iter is None:
+            break
+        _task_feeding_loop(
+            indices_iter,
+            task_queues,
+            num_workers,
+            divide,
+            shutdown_flag,
+            feed_batch_idx,
+            prefetch_credits,
+            stats,
+        )
+
+
+def _worker_loop(
+    dataset,
+    task_queue,
+    trans_data_queue,
+    transform,
+    seed,
+    shutdown_flag,
+    stats,
+    worker_id=0,
+    epoch_seed=None,
+    num_workers=1,
+):
     # Get dataset items and do the transform
+    global _worker_info
+    _worker_info = WorkerInfo(worker_id, num_workers, seed)
     random.seed(seed)
     np.random.seed(seed)
+    base_seed = None if epoch_seed is None else epoch_seed.value
     while True:
         if shutdown_flag.value == 1:
             break
-        try:
-            batch_idx, indices = task_queue.get(timeout=GLOBAL_TIMEOUT)
-        except queue.Empty:
-            continue
+        task = _get_or_exit(task_queue, shutdown_flag)
+        if task is None:
+            break
+        batch_idx, indices = task
+        if epoch_seed is not None and epoch_seed.value != base_seed:
+            # a new epoch of persistent workers
+            base_seed = epoch_seed.value
+            _worker_info = WorkerInfo(worker_id, num_workers, base_seed + worker_id + 1)
+            random.seed(base_seed + worker_id + 1)
+            np.random.seed(base_seed + worker_id + 1)
         if len(indices) > 0:
-            items = [dataset[idx] for idx in indices]
-            trans_items = transform.apply_batch(items)
+            trans_items = _load_items(dataset, indices, transform, stats)
         else:
             # in case of incomplete last batch
             trans_items = ()
-        while True:
-            try:
-                trans_data_queue.put((batch_idx, trans_items), timeout=1)
-                break
-            except queue.Full:
-                if shutdown_flag.value == 1:
-                    break
-                logger.debug("batch part queue is full!")
+        _put_or_exit(trans_data_queue, (batch_idx, indices, trans_items), shutdown_flag)
 
 
 def _data_gathering_loop(
@@ -765,6 +1502,7 @@ def _data_gathering_loop(
     num_workers,
     shutdown_flag,
     target_idx,
+    stats,
 ):
     # Gathering the small pieces of batch data into full batch data
     while True:
@@ -773,25 +1511,16 @@ def _data_gathering_loop(
 
         target_batch_idx = target_idx.value
 
-        if target_batch_idx >= length:
+        if length is not None and target_batch_idx >= length:
             break
 
         full_trans_items = []
         for worker_id in range(num_workers):
-            while True:
-                try:
-                    batch_idx, trans_items = trans_data_queues[worker_id].get(
-                        timeout=GLOBAL_TIMEOUT
-                    )
-                    break
-                except queue.Empty:
-                    if shutdown_flag.value == 1:
-                        break
-                    logger.debug(
-                        "worker:{} data queue get timeout! target batch idx:{}".format(
-                            worker_id, target_batch_idx
-                        )
-                    )
+            trans_data = _get_or_exit(trans_data_queues[worker_id], shutdown_flag)
+            if trans_data is None:
+                full_trans_items = None
+                break
+            batch_idx, _, trans_items = trans_data
             if batch_idx != target_batch_idx:
                 raise RuntimeError(
                     "Unexperted batch_idx in data gathering loop. worker_id:{}.".format(
@@ -800,18 +1529,11 @@ def _data_gathering_loop(
                 )
             else:
                 full_trans_items.extend(trans_items)
+        if full_trans_items is None:
+            break
 
         # Merge different parts into a batch.
-        full_batch = collator.apply(full_trans_items)
-
-        while True:
-            try:
-                batch_queue.put(full_batch, timeout=1)
-                break
-            except queue.Full:
-                if shutdown_flag.value == 1:
-                    break
-                logger.debug("batch queue is full!")
+        _collate_and_put(collator, full_trans_items, batch_queue, stats, shutdown_flag)
 
         with target_idx.get_lock():
             target_idx.value += 1
@@ -827,6 +1549,7 @@ def _data_selecting_loop(
     num_workers,
     shutdown_flag,
     target_idx,
+    stats,
 ):
     # Make sure that batch is generated exactly with the same order as generated indices
     while True:
@@ -835,26 +1558,14 @@ def _data_selecting_loop(
 
         target_batch_idx = target_idx.value
 
-        if target_batch_idx >= length:
+        if length is not None and target_batch_idx >= length:
             break
 
         target_worker_id = target_batch_idx % num_workers
-        while True:
-            try:
-                batch_idx, trans_items = trans_data_queues[target_worker_id].get(
-                    timeout=GLOBAL_TIMEOUT
-                )
-                batch_data = collator.apply(trans_items)
-                break
-            except queue.Empty:
-                if shutdown_flag.value == 1:
-                    break
-                logger.debug(
-                    "worker:{} data queue get timeout! target batch idx:{}".format(
-                        target_worker_id, target_batch_idx
-                    )
-                )
-
+        trans_data = _get_or_exit(trans_data_queues[target_worker_id], shutdown_flag)
+        if trans_data is None:
+            break
+        batch_idx, _, trans_items = trans_data
         if batch_idx != target_batch_idx:
             raise RuntimeError(
                 "batch_idx {} mismatch the target_batch_idx {}".format(
@@ -862,14 +1573,32 @@ def _data_selecting_loop(
                 )
             )
 
-        while True:
-            try:
-                batch_queue.put(batch_data, timeout=1)
-                break
-            except queue.Full:
-                if shutdown_flag.value == 1:
-                    break
-                logger.debug("batch queue is full!")
+        _collate_and_put(collator, trans_items, batch_queue, stats, shutdown_flag)
+
+        with target_idx.get_lock():
+            target_idx.value += 1
+
+    batch_queue.disconnect_client()
+
+
+def _data_unordered_loop(
+    trans_data_queue, batch_queue, collator, length, shutdown_flag, target_idx, stats,
+):
+    # Deliver batches in the order they are finished by workers
+    while True:
+        if shutdown_flag.value == 1:
+            break
+
+        if length is not None and target_idx.value >= length:
+            break
+
+        trans_data = _get_or_exit(trans_data_queue, shutdown_flag)
+        if trans_data is None:
+            break
+        _, indices, trans_items = trans_data
+        _collate_and_put(
+            collator, trans_items, batch_queue, stats, shutdown_flag, indices
+        )
 
         with target_idx.get_lock():
             target_idx.value += 1
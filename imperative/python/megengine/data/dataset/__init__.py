@@ -6,5 +6,7 @@
 # Unless required by applicable law or agreed to in writing,
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+from .cached_dataset import CachedDataset
 from .meta_dataset import ArrayDataset, Dataset, StreamDataset
+from .packed_dataset import PackedDataset, PackedDatasetWriter
 from .vision import *
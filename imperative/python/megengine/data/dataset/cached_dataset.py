@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# MegEngine is Licensed under the Apache License, Version 2.0 (the "License")
+#
+# Copyright (c) 2014-2021 Megvii Inc. All rights reserved.
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import os
+import pickle
+from multiprocessing import Lock, RawArray
+from typing import List, Sequence
+
+import numpy as np
+
+from ...logger import get_logger
+from ..transform import Transform
+from .meta_dataset import Dataset
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # python < 3.8
+    shared_memory = None
+
+logger = get_logger(__name__)
+
+# offset of an item which is not cached yet
+_UNCACHED = -1
+# offset of an item which is being written by some process
+_WRITING = -2
+# records are aligned in the cache, like the slots of `SharedMemoryQueue`
+_RECORD_ALIGNMENT = 64
+# indices of the shared state guarded by the allocation lock: the virtual offset
+# of next record, bytes used by cached items, and the head and tail of the queue
+# of cached items in the order they are written
+_HEAD, _USED, _QUEUE_HEAD, _QUEUE_TAIL = range(4)
+# indices of the counters of each lock
+_HITS, _MISSES = range(2)
+# items are guarded by the lock of ``index % _NUM_LOCKS``
+_NUM_LOCKS = 64
+# returned by lookup of an item which is not cached
+_MISSING = object()
+
+
+class CachedDataset(Dataset):
+    r"""Cache the items of a map dataset in shared memory across epochs.
+
+    Items are optionally transformed by a deterministic ``transform``, e.g. decode
+    and resize, then pickled into a shared memory arena. The arena is shared by
+    the main process and all the :class:`~.DataLoader` workers, so an item loaded
+    by any of them is reused by all of them in later epochs.
+
+    Items are cached until ``capacity`` bytes are used up, later items are loaded
+    from the wrapped dataset every time. By default nothing is evicted: the whole
+    dataset is visited once per epoch, so evicting old items for new ones rewrites
+    the cache all the time and hits less often than a fixed cached subset, whose
+    hit rate is ``capacity / size of dataset``. With ``evict=True`` the cache is a
+    ring, and the oldest items are evicted to cache new ones, which suits samplers
+    visiting a changing subset of the dataset.
+
+    Args:
+        dataset: the map dataset to be cached.
+        capacity: size in bytes of the cache. It is clamped to the free space of
+            ``/dev/shm``. Pages are only committed when items are written.
+            Default: 1GB
+        transform: a deterministic transform applied to items before caching.
+            Random augmentations should be given to :class:`~.DataLoader` instead.
+            Default: None
+        evict: whether to evict the oldest items when the cache is full.
+            Default: False
+
+    Examples:
+
+        .. code-block::
+
+            dataset = ImageFolder("/data/imagenet/val")
+            dataset = CachedDataset(dataset, capacity=16 << 30, transform=Resize(256))
+            dataloader = DataLoader(dataset, sampler, transform=CenterCrop(224))
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        capacity: int = 1 << 30,
+        transform: Transform = None,
+        evict: bool = False,
+    ):
+        super().__init__()
+        if shared_memory is None:
+            raise RuntimeError("CachedDataset requires python 3.8 or higher")
+        if capacity <= 0:
+            raise ValueError("capacity should be positive")
+        if os.path.isdir("/dev/shm"):
+            stat = os.statvfs("/dev/shm")
+            free = stat.f_bavail * stat.f_frsize
+            if capacity > free:
+                logger.warning(
+                    "capacity {} of CachedDataset exceeds free space {} of /dev/shm, "
+                    "clamped".format(capacity, free)
+                )
+                capacity = max(free, _RECORD_ALIGNMENT)
+        self.dataset = dataset
+        self.transform = transform
+        self.capacity = capacity
+        self.evict = evict
+        self.shm = shared_memory.SharedMemory(create=True, size=capacity)
+        self.owner_pid = os.getpid()
+        # (offset, size) of an item and the counters of its lock are guarded by the
+        # lock, the space of records and the queue by the allocation lock, which
+        # is acquired before the lock of any item
+        self.locks = [Lock() for _ in range(_NUM_LOCKS)]
+        self.alloc_lock = Lock()
+        # numpy views are not shared by processes started by spawn, so the raw
+        # arrays are pickled instead and viewed again, see ``__setstate__``
+        self.raw_table = RawArray("q", 2 * len(dataset))
+        self.raw_counters = RawArray("q", 2 * _NUM_LOCKS)
+        self.raw_state = RawArray("q", 4)
+        # (item index, virtual offset) of cached items in the order they are written
+        self.raw_queue = RawArray("q", 2 * len(dataset))
+        self._view_raw_arrays()
+        self.table[:, 0] = _UNCACHED
+
+    def _view_raw_arrays(self):
+        def view(raw, ncols):
+            return np.frombuffer(raw, dtype=np.int64).reshape(-1, ncols)
+
+        self.table = view(self.raw_table, 2)
+        self.counters = view(self.raw_counters, 2)
+        self.state = view(self.raw_state, 4)[0]
+        self.queue = view(self.raw_queue, 2)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("table", "counters", "state", "queue"):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._view_raw_arrays()
+
+    @property
+    def hits(self) -> int:
+        r"""Number of items got from the cache, summed over all processes."""
+        return int(self.counters[:, _HITS].sum())
+
+    @property
+    def misses(self) -> int:
+        r"""Number of items loaded from the wrapped dataset, summed over all
+        processes."""
+        return int(self.counters[:, _MISSES].sum())
+
+    @property
+    def nbytes(self) -> int:
+        r"""Number of bytes used by the cached items."""
+        return int(self.state[_USED])
+
+    def _lookup(self, index):
+        lock_idx = index % _NUM_LOCKS
+        with self.locks[lock_idx]:
+            offset, size = self.table[index]
+            if offset < 0:
+                self.counters[lock_idx, _MISSES] += 1
+                return _MISSING
+            self.counters[lock_idx, _HITS] += 1
+            record = self.shm.buf[offset : offset + size]
+            if self.evict:
+                # the record may be overwritten once the lock is released
+                record = bytes(record)
+        return pickle.loads(record)
+
+    def _evict_before(self, bound):
+        r"""Evict the items written before virtual offset ``bound``, return False if
+        some of them are still being written."""
+        while self.state[_QUEUE_TAIL] < self.state[_QUEUE_HEAD]:
+            index, start = self.queue[self.state[_QUEUE_TAIL] % len(self.queue)]
+            if start >= bound:
+                break
+            with self.locks[index % _NUM_LOCKS]:
+                if self.table[index, 0] == _WRITING:
+                    return False
+                self.state[_USED] -= _aligned(self.table[index, 1])
+                self.table[index] = (_UNCACHED, 0)
+            self.state[_QUEUE_TAIL] += 1
+        return True
+
+    def _store(self, index, item):
+        record = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        size = len(record)
+        if size > self.capacity:
+            return
+        lock = self.locks[index % _NUM_LOCKS]
+        with self.alloc_lock:
+            with lock:
+                if self.table[index, 0] != _UNCACHED:
+                    return
+            # records are placed one after another in a ring, and never wrap
+            # around the end of the shared memory
+            start = int(self.state[_HEAD])
+            if start % self.capacity + size > self.capacity:
+                start += -start % self.capacity
+            if self.evict:
+                if not self._evict_before(start + size - self.capacity):
+                    return
+            elif start + size > self.capacity:
+                return
+            # reserve the space, other processes missing this item do not write it
+            self.state[_HEAD] = start + _aligned(size)
+            self.state[_USED] += _aligned(size)
+            self.queue[self.state[_QUEUE_HEAD] % len(self.queue)] = (index, start)
+            self.state[_QUEUE_HEAD] += 1
+            with lock:
+                self.table[index, 0] = _WRITING
+        offset = start % self.capacity
+        self.shm.buf[offset : offset + size] = record
+        with lock:
+            self.table[index] = (offset, size)
+
+    def __getitem__(self, index: int):
+        return self.__getitems__([index])[0]
+
+    def __getitems__(self, indices: Sequence[int]) -> List:
+        items = [self._lookup(idx) for idx in indices]
+        missed = [i for i, item in enumerate(items) if item is _MISSING]
+        if not missed:
+            return items
+        # load and transform all the missed items at once
+        missed_items = self.dataset.__getitems__([indices[i] for i in missed])
+        if self.transform is not None:
+            missed_items = self.transform.apply_batch(missed_items)
+        for i, item in zip(missed, missed_items):
+            self._store(indices[i], item)
+            items[i] = item
+        return items
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def close(self):
+        r"""Release the shared memory, the cache should not be used any more."""
+        if self.shm is None:
+            return
+        self.shm.close()
+        if os.getpid() == self.owner_pid:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.shm = None
+
+    def __del__(self):
+        if getattr(self, "shm", None) is not None:
+            self.close()
+
+
+def _aligned(size):
+    return -(-size // _RECORD_ALIGNMENT) * _RECORD_ALIGNMENT
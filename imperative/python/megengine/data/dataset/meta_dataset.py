@@ -7,13 +7,19 @@
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 from abc import ABC, abstractmethod
-from typing import Tuple
+from typing import List, Sequence, Tuple
+
+import numpy as np
 
 
 class Dataset(ABC):
     r"""An abstract base class for all datasets.
 
     __getitem__ and __len__ method are aditionally needed.
+
+    __getitems__ method can be overridden to get a batch of items at once,
+    which is used by :class:`~.DataLoader` to avoid calling
+    :meth:`__getitem__` for every sample, e.g. with a vectorized gather or a bulk read.
     """
 
     @abstractmethod
@@ -28,6 +34,10 @@ class Dataset(ABC):
     def __len__(self):
         pass
 
+    def __getitems__(self, indices: Sequence[int]) -> List:
+        r"""Return a list of items with the given indices."""
+        return [self[idx] for idx in indices]
+
 
 class StreamDataset(Dataset):
     r"""An abstract class for stream data.
@@ -66,5 +76,12 @@ class ArrayDataset(Dataset):
     def __getitem__(self, index: int) -> Tuple:
         return tuple(array[index] for array in self.arrays)
 
+    def __getitems__(self, indices: Sequence[int]) -> List[Tuple]:
+        if not all(isinstance(array, np.ndarray) for array in self.arrays):
+            return super().__getitems__(indices)
+        # gather each array with one fancy index
+        indices = np.asarray(indices, dtype=np.int64)
+        return list(zip(*(array[indices] for array in self.arrays)))
+
     def __len__(self) -> int:
         return len(self.arrays[0])
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# MegEngine is Licensed under the Apache License, Version 2.0 (the "License")
+#
+# Copyright (c) 2014-2021 Megvii Inc. All rights reserved.
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import mmap
+import os
+import pickle
+from typing import Callable
+
+import numpy as np
+
+from .meta_dataset import Dataset
+
+_INDEX_FILE = "index.npy"
+_SHARD_FILE = "shard-{:05d}.bin"
+# records are aligned in shards, so that raw arrays can be viewed without copy
+_RECORD_ALIGNMENT = 64
+
+
+def _default_encoder(item) -> bytes:
+    return pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _default_decoder(record: memoryview):
+    return pickle.loads(record)
+
+
+class PackedDatasetWriter:
+    r"""Writer of the packed dataset format read by :class:`PackedDataset`.
+
+    Items are encoded into records which are appended to a few large shard files,
+    and the shard id, offset and length of each record are saved in an index file.
+    The index file is written by :meth:`close` at last, and not written if the
+    ``with`` block raises an exception, so that an incomplete dataset is never
+    loaded.
+
+    Args:
+        root: directory to save shard files and index file.
+        encoder: a function encodes an item into bytes. Default: pickle
+        shard_size: a new shard file is started when the current one exceeds
+            this size in bytes. Default: 1GB
+
+    Examples:
+
+        .. code-block::
+
+            with PackedDatasetWriter("/data/imagenet_packed") as writer:
+                writer.write_dataset(ImageFolder("/data/imagenet/train"))
+            dataset = PackedDataset("/data/imagenet_packed")
+    """
+
+    def __init__(
+        self, root: str, encoder: Callable = _default_encoder, shard_size: int = 1 << 30
+    ):
+        if shard_size <= 0:
+            raise ValueError("shard_size should be positive")
+        self.root = os.path.expanduser(root)
+        os.makedirs(self.root, exist_ok=True)
+        # shards of an old dataset in the same directory are overwritten
+        try:
+            os.remove(os.path.join(self.root, _INDEX_FILE))
+        except FileNotFoundError:
+            pass
+        self.encoder = encoder
+        self.shard_size = shard_size
+        self.index = []  # (shard id, offset, length) of each record
+        self.shard_id = -1
+        self.shard = None
+        self.offset = 0
+        self._next_shard()
+
+    def _next_shard(self):
+        if self.shard is not None:
+            self.shard.close()
+        self.shard_id += 1
+        path = os.path.join(self.root, _SHARD_FILE.format(self.shard_id))
+        self.shard = open(path, "wb")
+        self.offset = 0
+
+    def write(self, item):
+        r"""Encode an item and append it to the dataset."""
+        record = self.encoder(item)
+        if self.offset > 0 and self.offset + len(record) > self.shard_size:
+            self._next_shard()
+        padding = -self.offset % _RECORD_ALIGNMENT
+        if padding:
+            self.shard.write(b"\0" * padding)
+            self.offset += padding
+        self.shard.write(record)
+        self.index.append((self.shard_id, self.offset, len(record)))
+        self.offset += len(record)
+
+    def write_dataset(self, dataset: Dataset):
+        r"""Append all the items of a map dataset."""
+        for idx in range(len(dataset)):
+            self.write(dataset[idx])
+
+    def close(self, save_index: bool = True):
+        r"""Finish the current shard and save the index.
+
+        Args:
+            save_index: whether to save the index, an incomplete dataset without
+                index can not be loaded. Default: True
+        """
+        if self.shard is None:
+            return
+        self.shard.close()
+        self.shard = None
+        if not save_index:
+            return
+        index = np.array(self.index, dtype=np.int64).reshape(-1, 3)
+        # the index is replaced atomically, a partially written one is not loaded
+        path = os.path.join(self.root, _INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, index)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(save_index=exc_type is None)
+
+
+class PackedDataset(Dataset):
+    r"""Dataset of the packed format written by :class:`PackedDatasetWriter`.
+
+    Shard files are memory-mapped, so getting an item only touches the pages of
+    its record instead of opening a file, and the records are decoded lazily in
+    the process calling :meth:`__getitem__`, e.g. the DataLoader workers.
+
+    Args:
+        root: directory of shard files and index file.
+        decoder: a function decodes a record, given as a ``memoryview`` of the
+            memory-mapped shard, into an item. If ``None``, the ``memoryview`` is
+            returned without copy, and decoding can be done in transforms.
+            Default: pickle
+    """
+
+    def __init__(self, root: str, decoder: Callable = _default_decoder):
+        super().__init__()
+        self.root = os.path.expanduser(root)
+        self.decoder = decoder
+        self.index = np.load(os.path.join(self.root, _INDEX_FILE), mmap_mode="r")
+        self.num_shards = int(self.index[:, 0].max()) + 1 if len(self.index) else 0
+        self._shards = None
+
+    def _open_shards(self):
+        shards = []
+        for shard_id in range(self.num_shards):
+            path = os.path.join(self.root, _SHARD_FILE.format(shard_id))
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    shards.append(memoryview(b""))
+                    continue
+                shards.append(
+                    memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                )
+        return shards
+
+    def __getstate__(self):
+        # memory maps are opened again in each process
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def raw(self, index: int) -> memoryview:
+        r"""Return the record of an item without decoding or copying."""
+        if self._shards is None:
+            self._shards = self._open_shards()
+        shard_id, offset, length = self.index[index]
+        return self._shards[shard_id][offset : offset + length]
+
+    def __getitem__(self, index: int):
+        record = self.raw(index)
+        if self.decoder is None:
+            return record
+        return self.decoder(record)
+
+    def __len__(self) -> int:
+        return len(self.index)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# MegEngine is Licensed under the Apache License, Version 2.0 (the "License")
+#
+# Copyright (c) 2014-2021 Megvii Inc. All rights reserved.
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ....logger import get_logger
+from .utils import _default_dataset_root
+
+logger = get_logger(__name__)
+
+# bumped when the layout of compiled annotations changes
+_CACHE_VERSION = 2
+_META_FILE = "meta.json"
+_ARRAY_NAMES = (
+    "image_ids",
+    "heights",
+    "widths",
+    "name_offsets",
+    "file_names",
+    "info_offsets",
+    "image_infos",
+    "ann_offsets",
+    "bbox",
+    "category_id",
+    "iscrowd",
+    "has_keypoints",
+    "keypoints",
+)
+
+
+class Annotations:
+    r"""Annotations of a COCO style json file compiled into columnar numpy arrays.
+
+    Images are sorted by id, annotations are grouped by image in the same order,
+    and the annotations of the ``i``-th image are ``ann_offsets[i]`` to
+    ``ann_offsets[i + 1]``. Arrays loaded from the cache are memory-mapped, so
+    they are shared by all the processes through page cache.
+    """
+
+    def __init__(self, arrays, categories):
+        for name in _ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def file_name(self, img_pos):
+        start, end = self.name_offsets[img_pos], self.name_offsets[img_pos + 1]
+        return self.file_names[start:end].tobytes().decode()
+
+    def image_info(self, img_pos):
+        r"""The dict of an image in the json file, with all its fields."""
+        start, end = self.info_offsets[img_pos], self.info_offsets[img_pos + 1]
+        return json.loads(self.image_infos[start:end].tobytes().decode())
+
+    def select(self, ann_mask):
+        r"""Select the annotations by a boolean mask.
+
+        Returns:
+            indices of the selected annotations grouped by image, and the offsets
+            of each image in them.
+        """
+        ann_index = np.flatnonzero(ann_mask)
+        image_of_anns = np.repeat(np.arange(len(self)), np.diff(self.ann_offsets))
+        counts = np.bincount(image_of_anns[ann_index], minlength=len(self))
+        ann_offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(counts, out=ann_offsets[1:])
+        return ann_index, ann_offsets
+
+
+def category_index(category_ids, ids):
+    r"""Positions of ``ids`` in the sorted ``category_ids``, raising KeyError for
+    ids missing from the categories."""
+    index = np.searchsorted(category_ids, ids)
+    found = index < len(category_ids)
+    found[found] = category_ids[index[found]] == ids[found]
+    if not found.all():
+        raise KeyError(int(ids[~found][0]))
+    return index
+
+
+def _compile(ann_file):
+    with open(ann_file, "r") as f:
+        dataset = json.load(f)
+
+    images = sorted(dataset["images"], key=lambda img: img["id"])
+    image_ids = np.array([img["id"] for img in images], dtype=np.int64)
+    names = [img["file_name"].encode() for img in images]
+    name_offsets = np.zeros(len(images) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in names], out=name_offsets[1:])
+    infos = [json.dumps(img).encode() for img in images]
+    info_offsets = np.zeros(len(images) + 1, dtype=np.int64)
+    np.cumsum([len(info) for info in infos], out=info_offsets[1:])
+
+    anns = dataset["annotations"]
+    ann_image_ids = np.array([ann["image_id"] for ann in anns], dtype=np.int64)
+    ann_image = np.searchsorted(image_ids, ann_image_ids)
+    # annotations of unknown images are dropped, the others are grouped by image
+    # in the order of json file
+    known = np.flatnonzero(ann_image < len(images))
+    known = known[image_ids[ann_image[known]] == ann_image_ids[known]]
+    order = known[np.argsort(ann_image[known], kind="stable")]
+    anns = [anns[i] for i in order]
+    ann_offsets = np.zeros(len(images) + 1, dtype=np.int64)
+    counts = np.bincount(ann_image[order], minlength=len(images))
+    np.cumsum(counts, out=ann_offsets[1:])
+
+    keypoints = [ann.get("keypoints") for ann in anns]
+    num_keypoints = max((len(kps) for kps in keypoints if kps is not None), default=0)
+    keypoints_array = np.zeros((len(anns), num_keypoints), dtype=np.float32)
+    for i, kps in enumerate(keypoints):
+        if kps:
+            keypoints_array[i, : len(kps)] = kps
+
+    nan_box = [np.nan] * 4
+    arrays = {
+        "image_ids": image_ids,
+        "heights": np.array([img["height"] for img in images], dtype=np.int64),
+        "widths": np.array([img["width"] for img in images], dtype=np.int64),
+        "name_offsets": name_offsets,
+        "file_names": np.frombuffer(b"".join(names), dtype=np.uint8),
+        "info_offsets": info_offsets,
+        "image_infos": np.frombuffer(b"".join(infos), dtype=np.uint8),
+        "ann_offsets": ann_offsets,
+        "bbox": np.array(
+            [ann.get("bbox", nan_box) for ann in anns], dtype=np.float32
+        ).reshape(-1, 4),
+        "category_id": np.array(
+            [ann.get("category_id", -1) for ann in anns], dtype=np.int64
+        ),
+        "iscrowd": np.array([ann.get("iscrowd", 0) for ann in anns], dtype=np.uint8),
+        "has_keypoints": np.array([kps is not None for kps in keypoints], dtype=bool),
+        "keypoints": keypoints_array,
+    }
+    return arrays, dataset["categories"]
+
+
+def _cache_path(ann_file, cache_dir):
+    # the cache is rebuilt when the annotation file is modified
+    stat = os.stat(ann_file)
+    key = "{}:{}:{}:{}".format(
+        os.path.abspath(ann_file), stat.st_size, stat.st_mtime_ns, _CACHE_VERSION
+    )
+    digest = hashlib.md5(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, "{}.{}".format(os.path.basename(ann_file), digest))
+
+
+def _save(path, arrays, categories):
+    # write into a temporary directory and rename it, so that processes loading
+    # the same annotation file never see a partial cache
+    tmp_path = "{}.tmp{}".format(path, os.getpid())
+    os.makedirs(tmp_path, exist_ok=True)
+    try:
+        for name in _ARRAY_NAMES:
+            np.save(os.path.join(tmp_path, name + ".npy"), arrays[name])
+        with open(os.path.join(tmp_path, _META_FILE), "w") as f:
+            json.dump({"categories": categories}, f)
+        os.rename(tmp_path, path)
+    except OSError:
+        # cache is built by another process at the same time
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _load(path):
+    arrays = {}
+    for name in _ARRAY_NAMES:
+        file = os.path.join(path, name + ".npy")
+        try:
+            arrays[name] = np.load(file, mmap_mode="r")
+        except ValueError:
+            # empty arrays can not be memory-mapped by old numpy
+            arrays[name] = np.load(file)
+    with open(os.path.join(path, _META_FILE), "r") as f:
+        categories = json.load(f)["categories"]
+    return arrays, categories
+
+
+def load_annotations(ann_file, cache_dir=None):
+    r"""Load the annotations of a COCO style json file, the compiled arrays are
+    cached in ``cache_dir`` and memory-mapped when loaded again.
+
+    Args:
+        ann_file: path of the annotation json file.
+        cache_dir: directory of the compiled annotations. ``None`` means
+            ``annotation_cache`` in the user cache directory of megengine, or in
+            the temporary directory if it is not writable. Default: None
+    """
+    if cache_dir is not None:
+        cache_dirs = [cache_dir]
+    else:
+        cache_dirs = [
+            os.path.join(_default_dataset_root(), "annotation_cache"),
+            os.path.join(tempfile.gettempdir(), "megengine_annotation_cache"),
+        ]
+    for cache_dir in cache_dirs:
+        path = _cache_path(ann_file, cache_dir)
+        if os.path.isdir(path):
+            return Annotations(*_load(path))
+
+    arrays, categories = _compile(ann_file)
+    for cache_dir in cache_dirs:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            _save(_cache_path(ann_file, cache_dir), arrays, categories)
+            break
+        except OSError as exc:
+            logger.warning(
+                "failed to save annotation cache to {}: {}".format(cache_dir, exc)
+            )
+    else:
+        # e.g. read-only file systems, the compiled arrays are used without cache
+        return Annotations(arrays, categories)
+    return Annotations(*_load(_cache_path(ann_file, cache_dir)))
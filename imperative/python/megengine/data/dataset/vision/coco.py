@@ -12,41 +12,56 @@
 #
 # Copyright (c) 2018 Facebook
 # ---------------------------------------------------------------------
-import json
 import os
-from collections import defaultdict
 
 import cv2
 import numpy as np
 
+from ._annotation_cache import category_index, load_annotations
 from .meta_vision import VisionDataset
 
 min_keypoints_per_image = 10
 
 
-def _count_visible_keypoints(anno):
-    return sum(sum(1 for v in ann["keypoints"][2::3] if v > 0) for ann in anno)
+def has_valid_annotation(anns, ann_index, ann_offsets, order):
+    r"""Check whether each image has valid annotations.
 
-
-def has_valid_annotation(anno, order):
+    Args:
+        anns: the compiled annotations.
+        ann_index: indices of the selected annotations grouped by image.
+        ann_offsets: offsets of each image in ``ann_index``.
+        order: the order of dataset.
+    """
+    num_anns = np.diff(ann_offsets)
+    if len(ann_index) == 0:
+        return np.zeros(len(num_anns), dtype=bool)
     # if it"s empty, there is no annotation
-    if len(anno) == 0:
-        return False
-    if "boxes" in order or "boxes_category" in order:
-        if "bbox" not in anno[0]:
-            return False
+    valid = num_anns > 0
+    # annotations without bbox are already removed by the size check of bbox
     if "keypoints" in order:
-        if "keypoints" not in anno[0]:
-            return False
+        # the first annotation of each image, only used for non-empty images
+        first = ann_index[np.minimum(ann_offsets[:-1], len(ann_index) - 1)]
+        valid &= anns.has_keypoints[first]
         # for keypoint detection tasks, only consider valid images those
         # containing at least min_keypoints_per_image
-        if _count_visible_keypoints(anno) < min_keypoints_per_image:
-            return False
-    return True
+        visible = (anns.keypoints[ann_index, 2::3] > 0).sum(axis=1)
+        image_of_anns = np.repeat(np.arange(len(num_anns)), num_anns)
+        num_visible = np.bincount(
+            image_of_anns, weights=visible, minlength=len(num_anns)
+        )
+        valid &= num_visible >= min_keypoints_per_image
+    return valid
 
 
 class COCO(VisionDataset):
-    r"""`MS COCO <http://cocodataset.org/#home>`_ Dataset."""
+    r"""`MS COCO <http://cocodataset.org/#home>`_ Dataset.
+
+    Annotations are compiled into numpy arrays when the json file is loaded for
+    the first time, and saved in ``cache_dir``, which is ``annotation_cache`` in
+    the user cache directory of megengine if not given, or in the temporary
+    directory if that is not writable. Later loads memory-map the arrays instead
+    of parsing the json file.
+    """
 
     supported_order = (
         "image",
@@ -59,62 +74,42 @@ class COCO(VisionDataset):
     )
 
     def __init__(
-        self, root, ann_file, remove_images_without_annotations=False, *, order=None
+        self,
+        root,
+        ann_file,
+        remove_images_without_annotations=False,
+        *,
+        order=None,
+        cache_dir=None
     ):
         super().__init__(root, order=order, supported_order=self.supported_order)
 
-        with open(ann_file, "r") as f:
-            dataset = json.load(f)
-
-        self.imgs = dict()
-        for img in dataset["images"]:
-            # for saving memory
-            if "license" in img:
-                del img["license"]
-            if "coco_url" in img:
-                del img["coco_url"]
-            if "date_captured" in img:
-                del img["date_captured"]
-            if "flickr_url" in img:
-                del img["flickr_url"]
-            self.imgs[img["id"]] = img
-
-        self.img_to_anns = defaultdict(list)
-        for ann in dataset["annotations"]:
-            # for saving memory
-            if (
-                "boxes" not in self.order
-                and "boxes_category" not in self.order
-                and "bbox" in ann
-            ):
-                del ann["bbox"]
-            if "polygons" not in self.order and "segmentation" in ann:
-                del ann["segmentation"]
-            self.img_to_anns[ann["image_id"]].append(ann)
+        # annotations are compiled into numpy arrays, which are memory-mapped from
+        # the cache and shared by all the workers
+        self.anns = load_annotations(ann_file, cache_dir)
 
         self.cats = dict()
-        for cat in dataset["categories"]:
+        for cat in self.anns.categories:
             self.cats[cat["id"]] = cat
 
-        self.ids = list(sorted(self.imgs.keys()))
+        # position of each image in the compiled annotations
+        self.img_pos = np.arange(len(self.anns))
+        # indices of annotations grouped by image, ``None`` means all of them
+        self.ann_index = None
+        self.ann_offsets = self.anns.ann_offsets
 
         # filter images without detection annotations
         if remove_images_without_annotations:
-            ids = []
-            for img_id in self.ids:
-                anno = self.img_to_anns[img_id]
-                # filter crowd annotations
-                anno = [obj for obj in anno if obj["iscrowd"] == 0]
-                anno = [
-                    obj for obj in anno if obj["bbox"][2] > 0 and obj["bbox"][3] > 0
-                ]
-                if has_valid_annotation(anno, order):
-                    ids.append(img_id)
-                    self.img_to_anns[img_id] = anno
-                else:
-                    del self.imgs[img_id]
-                    del self.img_to_anns[img_id]
-            self.ids = ids
+            bbox = self.anns.bbox
+            # filter crowd annotations
+            ann_mask = (self.anns.iscrowd == 0) & (bbox[:, 2] > 0) & (bbox[:, 3] > 0)
+            self.ann_index, self.ann_offsets = self.anns.select(ann_mask)
+            valid = has_valid_annotation(
+                self.anns, self.ann_index, self.ann_offsets, self.order
+            )
+            self.img_pos = np.flatnonzero(valid)
+
+        self.ids = self.anns.image_ids[self.img_pos].tolist()
 
         self.json_category_id_to_contiguous_id = {
             v: i + 1 for i, v in enumerate(sorted(self.cats.keys()))
@@ -123,47 +118,47 @@ class COCO(VisionDataset):
         self.contiguous_category_id_to_json_id = {
             v: k for k, v in self.json_category_id_to_contiguous_id.items()
         }
+        # json category ids in ascending order, contiguous id is the position + 1
+        self.category_ids = np.array(sorted(self.cats.keys()), dtype=np.int64)
+
+    def _get_ann_index(self, img_pos):
+        start, end = self.ann_offsets[img_pos], self.ann_offsets[img_pos + 1]
+        if self.ann_index is None:
+            return slice(start, end)
+        return self.ann_index[start:end]
 
     def __getitem__(self, index):
-        img_id = self.ids[index]
-        anno = self.img_to_anns[img_id]
+        img_pos = self.img_pos[index]
+        ann_index = self._get_ann_index(img_pos)
 
         target = []
         for k in self.order:
             if k == "image":
-                file_name = self.imgs[img_id]["file_name"]
+                file_name = self.anns.file_name(img_pos)
                 path = os.path.join(self.root, file_name)
                 image = cv2.imread(path, cv2.IMREAD_COLOR)
                 target.append(image)
             elif k == "boxes":
-                boxes = [obj["bbox"] for obj in anno]
-                boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+                boxes = np.array(self.anns.bbox[ann_index], dtype=np.float32)
                 # transfer boxes from xywh to xyxy
                 boxes[:, 2:] += boxes[:, :2]
                 target.append(boxes)
             elif k == "boxes_category":
-                boxes_category = [obj["category_id"] for obj in anno]
-                boxes_category = [
-                    self.json_category_id_to_contiguous_id[c] for c in boxes_category
-                ]
-                boxes_category = np.array(boxes_category, dtype=np.int32)
+                boxes_category = category_index(
+                    self.category_ids, self.anns.category_id[ann_index]
+                )
+                boxes_category = (boxes_category + 1).astype(np.int32)
                 target.append(boxes_category)
             elif k == "keypoints":
-                keypoints = [obj["keypoints"] for obj in anno]
-                keypoints = np.array(keypoints, dtype=np.float32).reshape(
-                    -1, len(self.keypoint_names), 3
-                )
+                keypoints = np.array(self.anns.keypoints[ann_index], dtype=np.float32)
+                keypoints = keypoints.reshape(-1, len(self.keypoint_names), 3)
                 target.append(keypoints)
-            elif k == "polygons":
-                polygons = [obj["segmentation"] for obj in anno]
-                polygons = [
-                    [np.array(p, dtype=np.float32).reshape(-1, 2) for p in ps]
-                    for ps in polygons
-                ]
-                target.append(polygons)
             elif k == "info":
-                info = self.imgs[img_id]
-                info = [info["height"], info["width"], info["file_name"]]
+                info = [
+                    int(self.anns.heights[img_pos]),
+                    int(self.anns.widths[img_pos]),
+                    self.anns.file_name(img_pos),
+                ]
                 target.append(info)
             else:
                 raise NotImplementedError
@@ -174,9 +169,7 @@ class COCO(VisionDataset):
         return len(self.ids)
 
     def get_img_info(self, index):
-        img_id = self.ids[index]
-        img_info = self.imgs[img_id]
-        return img_info
+        return self.anns.image_info(self.img_pos[index])
 
     class_names = (
         "person",
@@ -12,18 +12,24 @@
 #
 # Copyright (c) 2018 Facebook
 # ---------------------------------------------------------------------
-import json
 import os
-from collections import defaultdict
 
 import cv2
 import numpy as np
 
+from ._annotation_cache import category_index, load_annotations
 from .meta_vision import VisionDataset
 
 
 class Objects365(VisionDataset):
-    r"""`Objects365 <https://www.objects365.org/overview.html>`_ Dataset."""
+    r"""`Objects365 <https://www.objects365.org/overview.html>`_ Dataset.
+
+    Annotations are compiled into numpy arrays when the json file is loaded for
+    the first time, and saved in ``cache_dir``, which is ``annotation_cache`` in
+    the user cache directory of megengine if not given, or in the temporary
+    directory if that is not writable. Later loads memory-map the arrays instead
+    of parsing the json file.
+    """
 
     supported_order = (
         "image",
@@ -33,51 +39,39 @@ class Objects365(VisionDataset):
     )
 
     def __init__(
-        self, root, ann_file, remove_images_without_annotations=False, *, order=None
+        self,
+        root,
+        ann_file,
+        remove_images_without_annotations=False,
+        *,
+        order=None,
+        cache_dir=None
     ):
         super().__init__(root, order=order, supported_order=self.supported_order)
 
-        with open(ann_file, "r") as f:
-            dataset = json.load(f)
-
-        self.imgs = dict()
-        for img in dataset["images"]:
-            self.imgs[img["id"]] = img
-
-        self.img_to_anns = defaultdict(list)
-        for ann in dataset["annotations"]:
-            # for saving memory
-            if (
-                "boxes" not in self.order
-                and "boxes_category" not in self.order
-                and "bbox" in ann
-            ):
-                del ann["bbox"]
-            self.img_to_anns[ann["image_id"]].append(ann)
+        # annotations are compiled into numpy arrays, which are memory-mapped from
+        # the cache and shared by all the workers
+        self.anns = load_annotations(ann_file, cache_dir)
 
         self.cats = dict()
-        for cat in dataset["categories"]:
+        for cat in self.anns.categories:
             self.cats[cat["id"]] = cat
 
-        self.ids = list(sorted(self.imgs.keys()))
+        # position of each image in the compiled annotations
+        self.img_pos = np.arange(len(self.anns))
+        # indices of annotations grouped by image, ``None`` means all of them
+        self.ann_index = None
+        self.ann_offsets = self.anns.ann_offsets
 
         # filter images without detection annotations
         if remove_images_without_annotations:
-            ids = []
-            for img_id in self.ids:
-                anno = self.img_to_anns[img_id]
-                # filter crowd annotations
-                anno = [obj for obj in anno if obj["iscrowd"] == 0]
-                anno = [
-                    obj for obj in anno if obj["bbox"][2] > 0 and obj["bbox"][3] > 0
-                ]
-                if len(anno) > 0:
-                    ids.append(img_id)
-                    self.img_to_anns[img_id] = anno
-                else:
-                    del self.imgs[img_id]
-                    del self.img_to_anns[img_id]
-            self.ids = ids
+            bbox = self.anns.bbox
+            # filter crowd annotations
+            ann_mask = (self.anns.iscrowd == 0) & (bbox[:, 2] > 0) & (bbox[:, 3] > 0)
+            self.ann_index, self.ann_offsets = self.anns.select(ann_mask)
+            self.img_pos = np.flatnonzero(np.diff(self.ann_offsets) > 0)
+
+        self.ids = self.anns.image_ids[self.img_pos].tolist()
 
         self.json_category_id_to_contiguous_id = {
             v: i + 1 for i, v in enumerate(sorted(self.cats.keys()))
@@ -86,34 +80,43 @@ class Objects365(VisionDataset):
         self.contiguous_category_id_to_json_id = {
             v: k for k, v in self.json_category_id_to_contiguous_id.items()
         }
+        # json category ids in ascending order, contiguous id is the position + 1
+        self.category_ids = np.array(sorted(self.cats.keys()), dtype=np.int64)
+
+    def _get_ann_index(self, img_pos):
+        start, end = self.ann_offsets[img_pos], self.ann_offsets[img_pos + 1]
+        if self.ann_index is None:
+            return slice(start, end)
+        return self.ann_index[start:end]
 
     def __getitem__(self, index):
-        img_id = self.ids[index]
-        anno = self.img_to_anns[img_id]
+        img_pos = self.img_pos[index]
+        ann_index = self._get_ann_index(img_pos)
 
         target = []
         for k in self.order:
             if k == "image":
-                file_name = self.imgs[img_id]["file_name"]
+                file_name = self.anns.file_name(img_pos)
                 path = os.path.join(self.root, file_name)
                 image = cv2.imread(path, cv2.IMREAD_COLOR)
                 target.append(image)
             elif k == "boxes":
-                boxes = [obj["bbox"] for obj in anno]
-                boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+                boxes = np.array(self.anns.bbox[ann_index], dtype=np.float32)
                 # transfer boxes from xywh to xyxy
                 boxes[:, 2:] += boxes[:, :2]
                 target.append(boxes)
             elif k == "boxes_category":
-                boxes_category = [obj["category_id"] for obj in anno]
-                boxes_category = [
-                    self.json_category_id_to_contiguous_id[c] for c in boxes_category
-                ]
-                boxes_category = np.array(boxes_category, dtype=np.int32)
+                boxes_category = category_index(
+                    self.category_ids, self.anns.category_id[ann_index]
+                )
+                boxes_category = (boxes_category + 1).astype(np.int32)
                 target.append(boxes_category)
             elif k == "info":
-                info = self.imgs[img_id]
-                info = [info["height"], info["width"], info["file_name"]]
+                info = [
+                    int(self.anns.heights[img_pos]),
+                    int(self.anns.widths[img_pos]),
+                    self.anns.file_name(img_pos),
+                ]
                 target.append(info)
             else:
                 raise NotImplementedError
@@ -124,9 +127,7 @@ class Objects365(VisionDataset):
         return len(self.ids)
 
     def get_img_info(self, index):
-        img_id = self.ids[index]
-        img_info = self.imgs[img_id]
-        return img_info
+        return self.anns.image_info(self.img_pos[index])
 
     class_names = (
         "person",
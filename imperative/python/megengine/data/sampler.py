@@ -9,7 +9,7 @@
 import collections.abc
 import math
 from abc import ABC, abstractmethod
-from typing import Any, Generator, Iterator, List, Union
+from typing import Generator, Iterator, List, Sequence, Union
 
 import numpy as np
 
@@ -93,6 +93,8 @@ class MapSampler(Sampler):
         if seed is None and self.world_size > 1:
             seed = 0
         self.rng = np.random.RandomState(seed)
+        # number of epochs started by :meth:`batch`
+        self.epoch = 0
 
     def __iter__(self) -> Union[Generator, Iterator]:
         return self.batch()
@@ -104,42 +106,104 @@ class MapSampler(Sampler):
             return int(math.ceil(self.num_samples / self.batch_size))
 
     def sample(self):
-        r"""Return a list contains all sample indices."""
+        r"""Return all sample indices, as a numpy array, a range or a sequence."""
         raise NotImplementedError
 
-    def scatter(self, indices) -> List:
+    def scatter(self, indices) -> Sequence:
         r"""Scatter method is used for splitting indices into subset, each subset
         will be assigned to a rank. Indices are evenly splitted by default.
         If customized indices assignment method is needed, please rewrite this method.
+
+        Note:
+            The default method takes and returns numpy arrays or ranges as returned
+            by :meth:`sample`, while a rewritten method is passed a list as before.
         """
         total_size = self.num_samples * self.world_size
 
-        # add extra indices to make it evenly divisible
-        indices += indices[: (total_size - len(indices))]
-        assert len(indices) == total_size
+        # subsample, which is a view of numpy array or range without copy
+        subset = indices[self.rank : total_size : self.world_size]
+
+        # add extra indices from the head to make it evenly divisible
+        if len(subset) < self.num_samples:
+            start = (self.rank - len(indices)) % self.world_size
+            extra = indices[start : total_size - len(indices) : self.world_size]
+            if isinstance(subset, (np.ndarray, range)):
+                subset = np.concatenate((subset, extra))
+            else:
+                subset = list(subset) + list(extra)
+        assert len(subset) == self.num_samples
 
-        # subsample
-        indices = indices[self.rank : total_size : self.world_size]
-        assert len(indices) == self.num_samples
+        return subset
 
-        return indices
+    def state_dict(self) -> dict:
+        r"""Get the state of sampler, which contains the epoch and the random state
+        used to sample the indices of next epoch.
+        """
+        return {"epoch": self.epoch, "rng_state": self.rng.get_state()}
 
-    def batch(self) -> Iterator[List[Any]]:
-        r"""Batch method provides a batch indices generator."""
-        indices = list(self.sample())
+    def load_state_dict(self, state: dict):
+        r"""Load the state got by :meth:`state_dict`, the next epoch samples the
+        same indices as the one after the state was saved.
+        """
+        self.epoch = state["epoch"]
+        self.rng.set_state(state["rng_state"])
+
+    def batch(self) -> Iterator[List]:
+        r"""Batch method provides a batch indices iterator."""
+        state = self.state_dict()
+        indices = self.sample()
+        self.epoch += 1
+        if not isinstance(indices, (np.ndarray, range, collections.abc.Sequence)):
+            indices = list(indices)
 
         # user might pass the world_size parameter without dist,
         # so dist.is_distributed() should not be used
         if self.world_size > 1:
+            if type(self).scatter is not MapSampler.scatter:
+                indices = _to_list(indices)
             indices = self.scatter(indices)
 
-        step, length = self.batch_size, len(indices)
-        batch_index = [indices[i : i + step] for i in range(0, length, step)]
+        return _BatchIterator(indices, self.batch_size, self.drop_last, state)
 
-        if self.drop_last and len(batch_index[-1]) < self.batch_size:
-            batch_index.pop()
 
-        return iter(batch_index)
+class _BatchIterator:
+    r"""Iterator slicing batches from indices lazily. Unlike a generator, it could be
+    pickled and sent to the task feeding process of :class:`~.DataLoader`. Each batch
+    is converted to a list when it is sliced.
+    """
+
+    def __init__(self, indices, batch_size, drop_last, sampler_state=None):
+        self.indices = indices
+        self.batch_size = batch_size
+        self.stop = len(indices)
+        if drop_last:
+            self.stop -= self.stop % batch_size
+        self.pos = 0
+        # state of sampler before sampling the indices
+        self.sampler_state = sampler_state
+
+    def state_dict(self) -> dict:
+        return {"sampler": self.sampler_state, "pos": self.pos}
+
+    def skip(self, num_batches):
+        r"""Skip batches without slicing them."""
+        self.pos += num_batches * self.batch_size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pos >= self.stop:
+            raise StopIteration
+        batch = self.indices[self.pos : min(self.pos + self.batch_size, self.stop)]
+        self.pos += self.batch_size
+        return _to_list(batch)
+
+
+def _to_list(indices):
+    if isinstance(indices, np.ndarray):
+        return indices.tolist()
+    return list(indices)
 
 
 class StreamSampler(Sampler):
@@ -196,10 +260,10 @@ class SequentialSampler(MapSampler):
             )
         self.indices = indices
 
-    def sample(self) -> Iterator[Any]:
-        r"""Return a generator."""
+    def sample(self) -> Sequence:
+        r"""Return a range or the given indices."""
         if self.indices is None:
-            return iter(range(len(self.dataset)))
+            return range(len(self.dataset))
         else:
             return self.indices
 
@@ -238,11 +302,11 @@ class RandomSampler(MapSampler):
             )
         self.indices = indices
 
-    def sample(self) -> List:
+    def sample(self) -> np.ndarray:
         if self.indices is None:
-            return self.rng.permutation(len(self.dataset)).tolist()
+            return self.rng.permutation(len(self.dataset))
         else:
-            return self.rng.permutation(self.indices).tolist()
+            return self.rng.permutation(self.indices)
 
 
 class ReplacementSampler(MapSampler):
@@ -291,12 +355,12 @@ class ReplacementSampler(MapSampler):
         if self.weights is not None:
             self.weights = np.array(weights) / sum(weights)
 
-    def sample(self) -> List:
+    def sample(self) -> np.ndarray:
         n = len(self.dataset)
         if self.weights is None:
-            return self.rng.randint(n, size=self.num_samples).tolist()
+            return self.rng.randint(n, size=self.num_samples)
         else:
-            return self.rng.multinomial(n, self.weights, self.num_samples).tolist()
+            return self.rng.multinomial(n, self.weights, self.num_samples)
 
 
 class Infinite(MapSampler):
@@ -309,6 +373,29 @@ class Infinite(MapSampler):
         self.sampler = sampler
         self.sampler_iter = iter(self.sampler)
 
+    def _check_stateful(self):
+        if not isinstance(self.sampler_iter, _BatchIterator):
+            raise TypeError(
+                "state of Infinite is not supported for {}, whose iterator is not "
+                "the one returned by MapSampler.batch".format(
+                    type(self.sampler).__name__
+                )
+            )
+
+    def state_dict(self) -> dict:
+        r"""Get the state of the wrapped sampler at the start of its current epoch,
+        and the position in the epoch. Only works if the wrapped sampler iterates
+        over the iterator returned by :meth:`MapSampler.batch`.
+        """
+        self._check_stateful()
+        return self.sampler_iter.state_dict()
+
+    def load_state_dict(self, state: dict):
+        self.sampler.load_state_dict(state["sampler"])
+        self.sampler_iter = iter(self.sampler)
+        self._check_stateful()
+        self.sampler_iter.pos = state["pos"]
+
     def __iter__(self):
         return self
 
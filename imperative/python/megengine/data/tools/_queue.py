@@ -7,13 +7,23 @@
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 import binascii
+import collections.abc
 import os
 import queue
 import subprocess
-from multiprocessing import Queue
+import weakref
+from multiprocessing import Array, Queue
 
-import pyarrow
-import pyarrow.plasma as plasma
+import numpy as np
+
+from ...logger import get_logger
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # python < 3.8
+    shared_memory = None
+
+logger = get_logger(__name__)
 
 MGE_PLASMA_MEMORY = int(os.environ.get("MGE_PLASMA_MEMORY", 4000000000))  # 4GB
 
@@ -21,6 +31,13 @@ MGE_PLASMA_MEMORY = int(os.environ.get("MGE_PLASMA_MEMORY", 4000000000))  # 4GB
 # TODO: how to share between different processes?
 MGE_PLASMA_STORE_MANAGER = None
 
+# Size of each slot of `SharedMemoryQueue`. Pages of a slot are only committed
+# when they are written, so a large slot size does not cost memory by itself.
+MGE_SHM_SLOT_SIZE = int(os.environ.get("MGE_SHM_SLOT_SIZE", 64 * 1024 * 1024))  # 64MB
+
+# Alignment of every array stored in a shared memory slot.
+_SHM_ALIGNMENT = 64
+
 
 def _clear_plasma_store():
     # `_PlasmaStoreManager.__del__` will not be called automaticly in subprocess,
@@ -35,6 +52,8 @@ class _PlasmaStoreManager:
     __initialized = False
 
     def __init__(self):
+        import pyarrow
+
         self.socket_name = "/tmp/mge_plasma_{}".format(
             binascii.hexlify(os.urandom(8)).decode()
         )
@@ -95,6 +114,8 @@ class PlasmaShmQueue:
         self.queue = Queue(maxsize)  # type: Queue
 
     def put(self, data, block=True, timeout=None):
+        import pyarrow.plasma as plasma
+
         if self.client is None:
             self.client = plasma.connect(self.socket_name)
         try:
@@ -108,6 +129,8 @@ class PlasmaShmQueue:
             raise queue.Full
 
     def get(self, block=True, timeout=None):
+        import pyarrow.plasma as plasma
+
         if self.client is None:
             self.client = plasma.connect(self.socket_name)
         object_id = self.queue.get(block, timeout)
@@ -119,6 +142,12 @@ class PlasmaShmQueue:
         self.client.delete([object_id])
         return data
 
+    @property
+    def reader(self):
+        # connection readable when there is data in queue, can be waited by
+        # `multiprocessing.connection.wait`
+        return self.queue._reader
+
     def qsize(self):
         return self.queue.qsize()
 
@@ -141,3 +170,263 @@ class PlasmaShmQueue:
 
     def cancel_join_thread(self):
         self.queue.cancel_join_thread()
+
+
+# Placeholder of an array stored in a shared memory slot, only this small header
+# goes through the pipe while the array data stays in the slot.
+_ShmArray = collections.namedtuple("_ShmArray", ["offset", "dtype", "shape"])
+
+
+def _map_arrays(func, data):
+    # apply `func` to every numpy array inside a (nested) collated batch
+    if isinstance(data, (np.ndarray, _ShmArray)):
+        return func(data)
+    elif isinstance(data, collections.abc.Mapping):
+        return {k: _map_arrays(func, v) for k, v in data.items()}
+    elif isinstance(data, tuple) and hasattr(data, "_fields"):  # namedtuple
+        return type(data)(*(_map_arrays(func, v) for v in data))
+    elif isinstance(data, (tuple, list)):
+        return type(data)(_map_arrays(func, v) for v in data)
+    else:
+        return data
+
+
+def _aligned(nbytes):
+    return (nbytes + _SHM_ALIGNMENT - 1) // _SHM_ALIGNMENT * _SHM_ALIGNMENT
+
+
+def _shm_storable(array):
+    return isinstance(array, np.ndarray) and not array.dtype.hasobject
+
+
+def _release_slot(slot_busy, slot, shm=None):
+    # called when all arrays viewing the slot are garbage collected, ``shm`` is
+    # only referenced to keep the slot mapped until then
+    with slot_busy.get_lock():
+        slot_busy.get_obj()[slot] = 0
+
+
+class SharedMemoryQueue:
+    def __init__(self, maxsize: int = 0, num_slots: int = None, slot_size: int = None):
+        r"""Use ``multiprocessing.shared_memory`` to implement shared memory queue.
+        A fixed pool of shared memory slots is allocated, the producer copies numpy
+        arrays of a batch into a free slot and only sends a small header through
+        the pipe, the consumer gets numpy arrays which are zero-copy views of the slot.
+        A slot is recycled once all the arrays viewing it are released by the consumer.
+
+        Batches which do not fit in a slot, or arrive while all slots are still in use,
+        fall back to be pickled through the pipe, so the producer never waits for slots.
+
+        Args:
+            maxsize: maximum size of the queue, ``0`` means no limit. (default: ``0``)
+            num_slots: number of shared memory slots. Default: ``maxsize + 2``
+            slot_size: size in bytes of each slot.
+                Default: ``MGE_SHM_SLOT_SIZE`` environment variable or 64MB
+        """
+        if shared_memory is None:
+            raise RuntimeError("SharedMemoryQueue requires python 3.8 or higher")
+        if num_slots is None:
+            num_slots = maxsize + 2 if maxsize > 0 else 4
+        if slot_size is None:
+            slot_size = MGE_SHM_SLOT_SIZE
+        if os.path.isdir("/dev/shm"):
+            # writing pages beyond the free space of /dev/shm, e.g. 64MB by default
+            # in docker, kills the process by SIGBUS instead of raising an error
+            stat = os.statvfs("/dev/shm")
+            free = stat.f_bavail * stat.f_frsize
+            if num_slots * slot_size > free:
+                fit = free // slot_size
+                if fit == 0:
+                    # a smaller slot, larger batches fall back to pickle
+                    slot_size = free // _SHM_ALIGNMENT * _SHM_ALIGNMENT
+                    fit = 1 if slot_size > 0 else 0
+                logger.warning(
+                    "shared memory slots of batch queue exceed free space {} of "
+                    "/dev/shm, clamped to {} slots of {} bytes".format(
+                        free, fit, slot_size
+                    )
+                )
+                num_slots = fit
+        self.slot_size = slot_size
+        self.slots = [
+            shared_memory.SharedMemory(create=True, size=slot_size)
+            for _ in range(num_slots)
+        ]
+        self.owner_pid = os.getpid()
+
+        # Used to store the header for the data.
+        self.queue = Queue(maxsize)  # type: Queue
+        # Whether the slot is being written by producer or viewed by consumer.
+        self.slot_busy = Array("b", num_slots)
+
+    def acquire_slot(self):
+        r"""Reserve a free slot, return its index or ``None`` if all slots are in use.
+        The slot is released after the batch put with it is consumed.
+        """
+        with self.slot_busy.get_lock():
+            busy = self.slot_busy.get_obj()
+            for slot in range(len(busy)):
+                if not busy[slot]:
+                    busy[slot] = 1
+                    return slot
+        return None
+
+    def slot_allocator(self, slot):
+        r"""Get a callable ``alloc(shape, dtype)`` which allocates numpy arrays in
+        the slot one after another, ``None`` is returned when the slot is full.
+        Batches whose arrays are allocated in this way are put without copy by
+        ``put(data, slot=slot)``.
+        """
+        buf = self.slots[slot].buf
+        offset = 0
+
+        def alloc(shape, dtype):
+            nonlocal offset
+            dtype = np.dtype(dtype)
+            nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            if offset + nbytes > self.slot_size:
+                return None
+            array = np.ndarray(shape, dtype, buffer=buf, offset=offset)
+            offset += _aligned(nbytes)
+            return array
+
+        return alloc
+
+    def _acquire_slot(self, data):
+        nbytes = 0
+
+        def count(array):
+            nonlocal nbytes
+            if _shm_storable(array):
+                nbytes += _aligned(array.nbytes)
+
+        _map_arrays(count, data)
+        if nbytes == 0 or nbytes > self.slot_size:
+            return None
+        return self.acquire_slot()
+
+    def _write_slot(self, data, slot):
+        buf = self.slots[slot].buf
+        offset = 0
+
+        def write(array):
+            nonlocal offset
+            if not _shm_storable(array):
+                return array
+            dst = np.ndarray(array.shape, array.dtype, buffer=buf, offset=offset)
+            np.copyto(dst, array, casting="no")
+            meta = _ShmArray(offset, array.dtype.str, array.shape)
+            offset += _aligned(array.nbytes)
+            return meta
+
+        return _map_arrays(write, data)
+
+    def _locate_slot(self, data, slot):
+        # arrays already in the slot are replaced by their headers, others are
+        # sent through pipe
+        start = np.frombuffer(self.slots[slot].buf, np.uint8).ctypes.data
+
+        def locate(array):
+            if not _shm_storable(array) or not array.flags.c_contiguous:
+                return array
+            offset = array.ctypes.data - start
+            if offset < 0 or offset + array.nbytes > self.slot_size:
+                return array
+            return _ShmArray(offset, array.dtype.str, array.shape)
+
+        return _map_arrays(locate, data)
+
+    def _read_slot(self, meta, slot):
+        shm = self.slots[slot]
+        base = np.ndarray((self.slot_size,), dtype=np.uint8, buffer=shm.buf)
+        weakref.finalize(base, _release_slot, self.slot_busy, slot, shm)
+
+        def read(array):
+            if not isinstance(array, _ShmArray):
+                return array
+            dtype = np.dtype(array.dtype)
+            nbytes = int(np.prod(array.shape, dtype=np.int64)) * dtype.itemsize
+            view = base[array.offset : array.offset + nbytes].view(dtype)
+            return view.reshape(array.shape)
+
+        return _map_arrays(read, meta)
+
+    def put(self, data, block=True, timeout=None, slot=None):
+        r"""Put data into queue, ``slot`` is the slot acquired by :meth:`acquire_slot`
+        where the arrays of data are allocated by :meth:`slot_allocator`, and the
+        slot is still reserved if ``queue.Full`` is raised.
+        """
+        if slot is not None:
+            item = (slot, self._locate_slot(data, slot))
+            self.queue.put(item, block, timeout)
+            return
+        slot = self._acquire_slot(data)
+        if slot is None:
+            item = (None, data)
+        else:
+            item = (slot, self._write_slot(data, slot))
+        try:
+            self.queue.put(item, block, timeout)
+        except queue.Full:
+            if slot is not None:
+                _release_slot(self.slot_busy, slot)
+            raise queue.Full
+
+    def get(self, block=True, timeout=None):
+        slot, data = self.queue.get(block, timeout)
+        if slot is None:
+            return data
+        return self._read_slot(data, slot)
+
+    @property
+    def reader(self):
+        # connection readable when there is data in queue, can be waited by
+        # `multiprocessing.connection.wait`
+        return self.queue._reader
+
+    def qsize(self):
+        return self.queue.qsize()
+
+    def empty(self):
+        return self.queue.empty()
+
+    def join(self):
+        self.queue.join()
+
+    def disconnect_client(self):
+        pass
+
+    def close(self):
+        self.queue.close()
+        for shm in self.slots:
+            # numpy arrays do not pin the buffer, closing a slot explicitly would
+            # unmap it under arrays returned by `get`. Slots are unmapped when
+            # garbage collected instead, after all the arrays viewing them.
+            if os.getpid() == self.owner_pid:
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+        self.slots = []
+
+    def cancel_join_thread(self):
+        self.queue.cancel_join_thread()
+
+
+def create_batch_queue(maxsize: int = 0):
+    r"""Create the shared memory queue used to send batches to the main process.
+
+    The backend is chosen by the ``MGE_DATALOADER_QUEUE_BACKEND`` environment variable,
+    ``"shm"`` (default) uses :class:`SharedMemoryQueue` and ``"plasma"`` uses
+    :class:`PlasmaShmQueue` backed by a pyarrow plasma store.
+    """
+    backend = os.environ.get("MGE_DATALOADER_QUEUE_BACKEND", "shm")
+    if backend == "plasma" or shared_memory is None:
+        return PlasmaShmQueue(maxsize=maxsize)
+    elif backend == "shm":
+        return SharedMemoryQueue(maxsize=maxsize)
+    raise ValueError(
+        "MGE_DATALOADER_QUEUE_BACKEND should be 'shm' or 'plasma', but got {}".format(
+            backend
+        )
+    )
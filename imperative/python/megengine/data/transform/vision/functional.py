@@ -84,6 +84,45 @@ def pad(input, size, value):
     return cv2.copyMakeBorder(input, *size, cv2.BORDER_CONSTANT, value=value)
 
 
+def pad_batch(input, size, value):
+    r"""Pad a batch of data with *value* and given *size*, which is the same as
+    applying :func:`pad` on each sample.
+
+    Args:
+        input: input data, with `(N, H, W, C)` shape.
+        size: the same with :func:`pad`.
+        value: the same with :func:`pad`, channels missing in *value* are padded
+            with zero.
+
+    Returns:
+        padded batch.
+    """
+    if isinstance(size, int):
+        size = (size, size, size, size)
+    elif isinstance(size, collections.abc.Sequence) and len(size) == 2:
+        size = (0, size[0], 0, size[1])
+    if np.array(value).dtype == float:
+        input = input.astype(np.float32)
+    top, bottom, left, right = size
+    n, h, w, c = input.shape
+
+    fill = np.zeros(c)
+    value = np.array(value, dtype=np.float64).flatten()[:c]
+    fill[: len(value)] = value
+    if np.issubdtype(input.dtype, np.integer):
+        info = np.iinfo(input.dtype)
+        fill = np.clip(np.rint(fill), info.min, info.max)
+    fill = fill.astype(input.dtype)
+
+    output = np.empty((n, h + top + bottom, w + left + right, c), dtype=input.dtype)
+    output[:, :top] = fill
+    output[:, top + h :] = fill
+    output[:, top : top + h, :left] = fill
+    output[:, top : top + h, left + w :] = fill
+    output[:, top : top + h, left : left + w] = input
+    return output
+
+
 @wrap_keepdims
 def flip(image, flipCode):
     r"""Accordding to the flipCode (the type of flip), flip the input image.
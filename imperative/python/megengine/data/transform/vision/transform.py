@@ -47,6 +47,12 @@ class VisionTransform(Transform):
     method. If you want to implement a self-defined transform method for image,
     rewrite _apply_image method in subclass.
 
+    If a transform only changes images, it could also implement _apply_image_batch()
+    method, which transforms images of the same shape stacked into a `(N, H, W, C)`
+    array at once, and could modify the stacked array in place. apply_batch() then
+    calls it instead of transforming each sample, and falls back to apply() if images
+    are of different shapes, or _apply_image_batch() returns ``None``.
+
     Args:
         order: input type order. Input is a tuple containing different structures,
             order is used to specify the order of structures. For example, if your input
@@ -95,6 +101,13 @@ class VisionTransform(Transform):
 
     def apply_batch(self, inputs: Sequence[Tuple]):
         r"""Apply transform on batch input data."""
+        apply_image_batch = self._get_apply_image_batch()
+        if apply_image_batch is not None:
+            images = self._stack_images(inputs)
+            if images is not None:
+                images = apply_image_batch(images)
+                if images is not None:
+                    return self._unstack_images(inputs, images)
         return tuple(self.apply(input) for input in inputs)
 
     def apply(self, input: Tuple):
@@ -126,6 +139,42 @@ class VisionTransform(Transform):
             input = (input,)
         return input[self.order.index("image")]
 
+    def _get_apply_image_batch(self):
+        # batch method is only used when nothing but images is transformed, and the
+        # per-sample methods are not overridden by a subclass
+        if "image" not in self.order:
+            return None
+        for k in self.order:
+            if k != "image" and self._get_apply(k) is not None:
+                return None
+        for klass in type(self).__mro__:
+            if "_apply_image_batch" in vars(klass):
+                return self._apply_image_batch
+            if "apply" in vars(klass) or "_apply_image" in vars(klass):
+                return None
+        return None
+
+    def _stack_images(self, inputs: Sequence[Tuple]):
+        images = [self._get_image(input) for input in inputs]
+        if len(images) == 0:
+            return None
+        shape, dtype = images[0].shape, images[0].dtype
+        for image in images:
+            if not isinstance(image, np.ndarray) or image.ndim != 3:
+                return None
+            if image.shape != shape or image.dtype != dtype:
+                return None
+        return np.stack(images)
+
+    def _unstack_images(self, inputs: Sequence[Tuple], images: np.ndarray):
+        idx = self.order.index("image")
+        outputs = []
+        for input, image in zip(inputs, images):
+            output = list(input) if isinstance(input, tuple) else [input]
+            output[idx] = image
+            outputs.append(output[0] if len(output) == 1 else tuple(output))
+        return tuple(outputs)
+
     def _apply_image(self, image):
         raise NotImplementedError
 
@@ -173,6 +222,11 @@ class ToMode(VisionTransform):
             return np.ascontiguousarray(np.rollaxis(image, 2))
         return image
 
+    def _apply_image_batch(self, images):
+        if self.mode == "CHW":
+            return np.ascontiguousarray(images.transpose(0, 3, 1, 2))
+        return images
+
     def _apply_coords(self, coords):
         return coords
 
@@ -234,13 +288,32 @@ class Compose(VisionTransform):
                 t._set_order()
 
     def apply_batch(self, inputs: Sequence[Tuple]):
-        if self.batch_compose:
-            for t in self.transforms:
-                inputs = t.apply_batch(inputs)
-            return inputs
-        else:
+        if self.shuffle_indices is not None:
             return super().apply_batch(inputs)
 
+        # images are kept stacked across consecutive transforms with batch methods,
+        # other transforms are applied on each sample
+        images = None
+        for t in self.transforms:
+            apply_image_batch = t._get_apply_image_batch()
+            if apply_image_batch is not None:
+                stacked = images if images is not None else self._stack_images(inputs)
+                if stacked is not None:
+                    stacked = apply_image_batch(stacked)
+                if stacked is not None:
+                    images = stacked
+                    continue
+            if images is not None:
+                inputs = self._unstack_images(inputs, images)
+                images = None
+            if self.batch_compose:
+                inputs = t.apply_batch(inputs)
+            else:
+                inputs = tuple(t.apply(input) for input in inputs)
+        if images is not None:
+            inputs = self._unstack_images(inputs, images)
+        return inputs
+
     def apply(self, input: Tuple):
         for t in self._shuffle():
             input = t.apply(input)
@@ -339,6 +412,12 @@ class Pad(VisionTransform):
     def _apply_image(self, image):
         return F.pad(image, self.size, self.value)
 
+    def _apply_image_batch(self, images):
+        # cv2 drops the channel dim of single channel image
+        if not 1 < images.shape[3] <= 4:
+            return None
+        return F.pad_batch(images, self.size, self.value)
+
     def _apply_coords(self, coords):
         coords[:, 0] += self.size[2]
         coords[:, 1] += self.size[0]
@@ -694,6 +773,11 @@ class CenterCrop(VisionTransform):
         th, tw = self.output_size
         return image[y : y + th, x : x + tw]
 
+    def _apply_image_batch(self, images):
+        x, y = self._get_coord(images[0])
+        th, tw = self.output_size
+        return images[:, y : y + th, x : x + tw]
+
     def _apply_coords(self, coords):
         x, y = self._coord_info
         coords[:, 0] -= x
@@ -736,6 +820,11 @@ class RandomHorizontalFlip(VisionTransform):
             return F.flip(image, flipCode=1)
         return image
 
+    def _apply_image_batch(self, images):
+        for i in np.flatnonzero(np.random.random(len(images)) < self.prob):
+            cv2.flip(images[i], flipCode=1, dst=images[i])
+        return images
+
     def _apply_coords(self, coords):
         if self._flipped:
             coords[:, 0] = self._w - coords[:, 0]
@@ -769,6 +858,11 @@ class RandomVerticalFlip(VisionTransform):
             return F.flip(image, flipCode=0)
         return image
 
+    def _apply_image_batch(self, images):
+        for i in np.flatnonzero(np.random.random(len(images)) < self.prob):
+            cv2.flip(images[i], flipCode=0, dst=images[i])
+        return images
+
     def _apply_coords(self, coords):
         if self._flipped:
             coords[:, 1] = self._h - coords[:, 1]
@@ -800,6 +894,18 @@ class Normalize(VisionTransform):
     def _apply_image(self, image):
         return (image - self.mean) / self.std
 
+    def _apply_image_batch(self, images):
+        # broadcast along rows of `(N * H, W * C)` view instead of channels, which
+        # makes the inner loop of numpy much longer
+        if self.mean.ndim > 1 or self.std.ndim > 1:
+            return (images - self.mean) / self.std
+        n, h, w, c = images.shape
+        dtype = np.result_type(images, self.mean, self.std)
+        output = images.astype(dtype).reshape(n * h, w * c)
+        output -= np.tile(np.broadcast_to(self.mean, (c,)), w)
+        output /= np.tile(np.broadcast_to(self.std, (c,)), w)
+        return output.reshape(n, h, w, c)
+
     def _apply_coords(self, coords):
         return coords
 
@@ -9,6 +9,7 @@
 from mprop import mproperty
 
 from . import group
+from .checkpoint import load_checkpoint, save_checkpoint
 from .group import (
     WORLD,
     Group,
@@ -27,6 +28,7 @@ from .group import (
 from .helper import bcast_list_, make_allreduce_cb, synchronized
 from .launcher import launcher
 from .server import Client, Server
+from .sharded_optimizer import ShardedOptimizer
 
 
 @mproperty
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# MegEngine is Licensed under the Apache License, Version 2.0 (the "License")
+#
+# Copyright (c) 2014-2021 Megvii Inc. All rights reserved.
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import hashlib
+import os
+import pickle
+import re
+from typing import Callable
+
+import numpy as np
+
+from ..serialization import CheckpointReader, load, save
+from ..tensor import Tensor
+from .group import get_client, get_rank, get_world_size, group_barrier
+
+_MANIFEST = "manifest.pkl"
+# rank, world size and version of the checkpoint
+_SHARD = "shard-{:05d}-of-{:05d}.v{}.mge"
+_SHARD_PATTERN = re.compile(r"shard-\d{5}-of-\d{5}(\.v\d+)?\.mge")
+
+
+class _Leaf:
+    r"""Placeholder of a tensor or numpy array in the manifest."""
+
+    def __init__(self, key):
+        self.key = key
+
+
+def _split_leaves(obj, prefix, leaves, memo):
+    # replace tensors and numpy arrays in containers by placeholders, the
+    # placeholders of shared objects are shared
+    if id(obj) in memo:
+        return memo[id(obj)][1]
+    if isinstance(obj, Tensor) or (
+        isinstance(obj, np.ndarray) and not obj.dtype.hasobject
+    ):
+        # keys like 0 and "0", or containing "/", could collide
+        if prefix in leaves:
+            raise ValueError("duplicate tensor key {!r} in checkpoint".format(prefix))
+        leaves[prefix] = obj
+        skeleton = _Leaf(prefix)
+    elif isinstance(obj, dict):
+        skeleton = obj.copy()
+        for k, v in obj.items():
+            skeleton[k] = _split_leaves(v, "{}/{}".format(prefix, k), leaves, memo)
+    elif type(obj) in (list, tuple):
+        skeleton = type(obj)(
+            _split_leaves(v, "{}/{}".format(prefix, i), leaves, memo)
+            for i, v in enumerate(obj)
+        )
+    else:
+        return obj
+    memo[id(obj)] = (obj, skeleton)
+    return skeleton
+
+
+def _shape(value):
+    return value._tuple_shape if isinstance(value, Tensor) else value.shape
+
+
+def _nbytes(value):
+    return int(np.prod(_shape(value), dtype=np.int64)) * np.dtype(value.dtype).itemsize
+
+
+def _check_same_on_ranks(skeleton, leaves, rank, world_size):
+    # each rank writes a part of the tensors of its own object, objects of ranks
+    # must have the same structure, keys, shapes and other values to be merged
+    if world_size == 1:
+        return
+    meta = [
+        (key, _shape(value), np.dtype(value.dtype).str)
+        for key, value in sorted(leaves.items())
+    ]
+    digest = hashlib.md5(pickle.dumps((skeleton, meta))).hexdigest()
+    client = get_client()
+    client.user_set("checkpoint_digest_{}".format(rank), digest)
+    group_barrier()
+    digests = set(
+        client.user_get("checkpoint_digest_{}".format(r)) for r in range(world_size)
+    )
+    if len(digests) > 1:
+        raise ValueError(
+            "save_checkpoint got different objects on ranks, objects of each rank "
+            "like the state of ShardedOptimizer should be saved by megengine.save"
+        )
+
+
+def _assign_shards(leaves, world_size):
+    # largest first to the least loaded rank, so that every rank writes about
+    # the same number of bytes. It only depends on the keys and shapes, which
+    # are the same on all ranks.
+    loads = [0] * world_size
+    owners = {}
+    for key in sorted(leaves, key=lambda k: (-_nbytes(leaves[k]), k)):
+        rank = loads.index(min(loads))
+        owners[key] = rank
+        loads[rank] += _nbytes(leaves[key])
+    return owners
+
+
+def save_checkpoint(obj, path: str):
+    r"""Save a checkpoint in parallel, each rank writes a disjoint shard of it.
+
+    It should be called by all the ranks with the same ``obj``, e.g. the
+    ``state_dict`` of model and optimizer in data parallel training, ValueError
+    is raised if the objects differ in structure, shapes or values other than
+    tensors. States of each rank, like the ``state_dict`` of
+    :class:`~.ShardedOptimizer`, should be saved by each rank into its own file
+    with :func:`~.megengine.save` instead.
+
+    Tensors and numpy arrays nested in dicts, lists and tuples are distributed to
+    the ranks by size, each rank writes its tensors into a shard file. Then rank 0
+    replaces the manifest recording the other objects and which shard each tensor
+    is in, the checkpoint is complete once the manifest is replaced. When saving
+    into an existing checkpoint, shards are written as a new version next to the
+    old ones and the old checkpoint stays loadable until then, its shards are
+    removed afterwards.
+
+    Tensors are keyed by their paths joined with ``"/"``, ValueError is raised if
+    two paths give the same key, e.g. for dict keys ``0`` and ``"0"``.
+
+    Args:
+        obj: object to save, which is the same on all the ranks.
+        path: directory of the checkpoint, it is created if not existing.
+    """
+    rank, world_size = get_rank(), get_world_size()
+    manifest_path = os.path.join(path, _MANIFEST)
+    if rank == 0:
+        os.makedirs(path, exist_ok=True)
+    group_barrier()
+
+    leaves = {}
+    skeleton = _split_leaves(obj, "", leaves, {})
+    _check_same_on_ranks(skeleton, leaves, rank, world_size)
+    # read by all the ranks before rank 0 replaces the manifest below
+    version = 0
+    if os.path.exists(manifest_path):
+        version = load(manifest_path).get("version", -1) + 1
+    owners = _assign_shards(leaves, world_size)
+    shard = {key: value for key, value in leaves.items() if owners[key] == rank}
+    shard_name = _SHARD.format(rank, world_size, version)
+    save(shard, os.path.join(path, shard_name), mmap=True)
+    group_barrier()
+
+    if rank == 0:
+        shards = [_SHARD.format(r, world_size, version) for r in range(world_size)]
+        layout = {key: shards[r] for key, r in owners.items()}
+        manifest = {
+            "world_size": world_size,
+            "version": version,
+            "skeleton": skeleton,
+            "layout": layout,
+        }
+        tmp_path = manifest_path + ".tmp"
+        save(manifest, tmp_path)
+        os.replace(tmp_path, manifest_path)
+        # shards of previous versions, or left by interrupted saves
+        for name in os.listdir(path):
+            if _SHARD_PATTERN.fullmatch(name) and name not in shards:
+                os.remove(os.path.join(path, name))
+    group_barrier()
+
+
+def load_checkpoint(path: str, map_location=None, select: Callable[[str], bool] = None):
+    r"""Load a checkpoint saved by :func:`save_checkpoint`.
+
+    The checkpoint could be loaded by any number of ranks, including a single
+    process, no matter how many ranks saved it. Shards are memory-mapped and only
+    the tensors to load are read.
+
+    Args:
+        path: directory of the checkpoint.
+        map_location: device mapping, the same as :func:`~.megengine.load`.
+            Default: None
+        select: a function taking the key of a tensor, which is its path in the
+            saved object like ``"/model/conv1.weight"``, and returning whether to
+            load the tensor. Tensors not selected are loaded as ``None``, e.g.
+            each rank selects the states of its own parameters when optimizer
+            states are partitioned. Default: None, load all the tensors
+    """
+    manifest_path = os.path.join(path, _MANIFEST)
+    if not os.path.exists(manifest_path):
+        raise ValueError("{} is not a complete checkpoint".format(path))
+    manifest = load(manifest_path)
+    readers = {}
+
+    def fill(obj, memo):
+        if id(obj) in memo:
+            return memo[id(obj)][1]
+        if isinstance(obj, _Leaf):
+            if select is not None and not select(obj.key):
+                return None
+            shard = manifest["layout"][obj.key]
+            if shard not in readers:
+                readers[shard] = CheckpointReader(
+                    os.path.join(path, shard), map_location
+                )
+            value = readers[shard][obj.key]
+        elif isinstance(obj, dict):
+            value = obj.copy()
+            for k, v in obj.items():
+                value[k] = fill(v, memo)
+        elif type(obj) in (list, tuple):
+            value = type(obj)(fill(v, memo) for v in obj)
+        else:
+            return obj
+        memo[id(obj)] = (obj, value)
+        return value
+
+    return fill(manifest["skeleton"], {})
@@ -16,8 +16,7 @@ import numpy as np
 
 from megengine.autodiff.grad_manager import GradManager, get_backwarding_grad_manager
 
-from ..core._imperative_rt.core2 import apply
-from ..core.ops.builtin import ParamPackConcat, ParamPackSplit
+from ..core.tensor.utils import get_offsets, param_pack_concat, param_pack_split
 from ..functional.tensor import copy
 from ..tensor import Tensor
 from ..utils.deprecation import deprecated_func
@@ -27,100 +26,6 @@ from .functional import _bcast_param, all_reduce_sum, broadcast
 from .group import WORLD, Group, group_barrier, is_distributed, override_backend
 
 
-def param_pack_split(inp: Tensor, offsets: list, shapes: list):
-    r"""Returns split tensor to tensor list as offsets and shapes described,
-    only used for ``parampack``.
-
-    Args:
-        inp: input tensor.
-        offsets: offsets of outputs, length of `2 * n`,
-            while n is tensor nums you want to split,
-            format `[begin0, end0, begin1, end1]`.
-        shapes: tensor shapes of outputs.
-
-    Returns:
-        splitted tensors.
-
-    Examples:
-
-        .. testcode::
-
-           import numpy as np
-           from megengine import tensor
-           from megengine.distributed.helper import param_pack_split
-
-           a = tensor(np.ones((10,), np.int32))
-           b, c = param_pack_split(a, [0, 1, 1, 10], [(1,), (3, 3)])
-           print(b.numpy())
-           print(c.numpy())
-
-        Outputs:
-
-        .. testoutput::
-
-           [1]
-           [[1 1 1]
-            [1 1 1]
-            [1 1 1]]
-    """
-    op = ParamPackSplit()
-    op.offsets = offsets
-    op.shapes = [s or (1,) for s in shapes]
-    outputs = apply(op, inp)
-    for s, x in zip(shapes, outputs):
-        if not s:
-            x._setscalar()
-    return outputs
-
-
-def param_pack_concat(inps: list, offsets: Tensor, offsets_val: list):
-    r"""Returns concated tensor, only used for ``parampack``.
-
-    Args:
-         inps: input tensors.
-         offsets: device value of offsets.
-         offsets_val: offsets of inputs, length of `2 * n`,
-            format `[begin0, end0, begin1, end1]`.
-
-    Returns:
-         concated tensor.
-
-    Examples:
-
-         .. testcode::
-
-            import numpy as np
-            from megengine import tensor
-            from megengine.distributed.helper import param_pack_concat
-
-            a = tensor(np.ones((1,), np.int32))
-            b = tensor(np.ones((3, 3), np.int32))
-            offsets_val = [0, 1, 1, 10]
-            offsets = tensor(offsets_val, np.int32)
-            c = param_pack_concat([a, b], offsets, offsets_val)
-            print(c.numpy())
-
-         Outputs:
-
-         .. testoutput::
-
-            [1 1 1 1 1 1 1 1 1 1]
-    """
-    op = ParamPackConcat()
-    op.offsets = offsets_val
-    return apply(op, *inps, offsets)[0]
-
-
-def get_offsets(shapes):
-    offsets = []
-    offset = 0
-    for shape in shapes:
-        offsets.append(offset)
-        offset += int(np.prod(shape))
-        offsets.append(offset)
-    return offsets
-
-
 _enable_p2p_cache = None
 
 
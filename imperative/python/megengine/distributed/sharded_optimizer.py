@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# MegEngine is Licensed under the Apache License, Version 2.0 (the "License")
+#
+# Copyright (c) 2014-2021 Megvii Inc. All rights reserved.
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+from typing import Callable, Dict, Iterable, Union
+
+import numpy as np
+
+from ..core._imperative_rt.core2 import pop_scope, push_scope
+from ..core.tensor.utils import get_offsets, param_pack_concat, param_pack_split
+from ..functional.tensor import where, zeros
+from ..optimizer import Optimizer
+from ..tensor import Parameter, Tensor
+from .functional import all_gather, reduce_scatter_sum
+from .group import WORLD, Group, is_distributed
+
+
+class _Shard:
+    r"""Params of the same dtype in a param group, flattened, padded and evenly
+    split across the ranks. A rank only keeps its own part as a Parameter, which
+    is the one updated by the wrapped optimizer."""
+
+    def __init__(self, params, rank, size):
+        self.params = params
+        self.shapes = [param._tuple_shape for param in params]
+        numel = get_offsets(self.shapes)[-1]
+        self.chunk = -(-numel // size)
+        padding = self.chunk * size - numel
+        dtype = np.dtype(params[0].dtype)
+        device = str(params[0].device)
+        self.pad = None
+        if padding > 0:
+            self.pad = Tensor(np.zeros(padding, dtype=dtype), device=device)
+            self.shapes.append((padding,))
+        self.offsets_val = get_offsets(self.shapes)
+        self.offsets = Tensor(self.offsets_val, dtype="int32", device=device)
+        flat = np.concatenate(
+            [param.numpy().reshape(-1) for param in params]
+            + [np.zeros(padding, dtype=dtype)]
+        )
+        self.begin = rank * self.chunk
+        part = flat[self.begin : self.begin + self.chunk]
+        self.param = Parameter(part, device=device)
+
+    def pack(self, tensors):
+        if self.pad is not None:
+            tensors = tensors + [self.pad]
+        return param_pack_concat(tensors, self.offsets, self.offsets_val)
+
+    def unpack(self, flat):
+        return param_pack_split(flat, self.offsets_val, self.shapes)[: len(self.params)]
+
+    def mask_without_grad(self):
+        r"""Mask of the elements in this rank's part whose params have no grad, or
+        None if all of them have grads."""
+        missing = [param.grad is None for param in self.params]
+        if not any(missing):
+            return None
+        missing += [False] * (len(self.shapes) - len(self.params))
+        sizes = np.diff(self.offsets_val)[::2]
+        mask = np.repeat(missing, sizes)[self.begin : self.begin + self.chunk]
+        if not mask.any():
+            return None
+        return Tensor(mask, device=self.param.device)
+
+
+class ShardedOptimizer(Optimizer):
+    r"""Data parallel optimizer which partitions the optimizer states across ranks.
+
+    Params of each param group are flattened and evenly split across the ranks
+    of ``group``, every rank creates an optimizer of ``optimizer_cls`` on its own
+    part only, so that the memory of optimizer states like momentum is divided by
+    the number of ranks. In :meth:`step`, gradients are reduced and scattered to
+    the ranks owning them, each rank updates its part of params and the updated
+    params are gathered back to all the ranks.
+
+    Gradients should be computed by a GradManager without allreduce callbacks:
+
+    .. code-block::
+
+        gm = GradManager().attach(model.parameters())
+        opt = ShardedOptimizer(model.parameters(), optim.Adam, lr=1e-3)
+
+        with gm:
+            loss = model(data)
+            gm.backward(loss)
+        opt.step().clear_grad()
+
+    If the gradients are already reduced, e.g. by ``make_allreduce_cb("mean")``
+    attached to the GradManager, pass ``reduce_method=None`` so that each rank
+    takes its part of gradients without communication.
+
+    Params without gradients are kept unchanged by a step, as well as their
+    elements of optimizer states. Scalar states of a part, like the step count of
+    :class:`~.Adam`, are shared by its params and still advance.
+
+    Args:
+        params: params to optimize, or dicts defining param groups.
+        optimizer_cls: optimizer class to update the parts of params, e.g.
+            :class:`~.SGD` or :class:`~.Adam`.
+        group: communication group. Default: WORLD
+        reduce_method: how to reduce the gradients of ranks, ``"mean"``,
+            ``"sum"`` or None if they are already reduced. Default: "mean"
+        defaults: keyword arguments of ``optimizer_cls``, like ``lr``.
+    """
+
+    def __init__(
+        self,
+        params: Union[Iterable[Parameter], dict],
+        optimizer_cls: Callable[..., Optimizer],
+        group: Group = WORLD,
+        reduce_method: str = "mean",
+        **defaults
+    ):
+        if reduce_method is not None:
+            reduce_method = reduce_method.lower()
+        if reduce_method not in ("sum", "mean", None):
+            raise ValueError(
+                "reduce_method should be sum, mean or None, got {}".format(
+                    reduce_method
+                )
+            )
+        self._group = group if is_distributed() else None
+        self._rank = group.rank if is_distributed() else 0
+        self._size = group.size if is_distributed() else 1
+        self._reduce_method = reduce_method
+        super().__init__(params, {})
+
+        self._shards = []  # (param group, shard)
+        inner_groups = []
+        for param_group in self.param_groups:
+            options = {k: v for k, v in param_group.items() if k != "params"}
+            buckets = {}
+            for param in param_group["params"]:
+                buckets.setdefault(np.dtype(param.dtype), []).append(param)
+            for params in buckets.values():
+                shard = _Shard(params, self._rank, self._size)
+                self._shards.append((param_group, shard))
+                inner_groups.append(dict(options, params=[shard.param]))
+        self._optimizer = optimizer_cls(inner_groups, **defaults)
+        # expose the resolved options, e.g. for lr schedulers to adjust
+        for (param_group, _), inner_group in zip(
+            self._shards, self._optimizer.param_groups
+        ):
+            for k, v in inner_group.items():
+                param_group.setdefault(k, v)
+
+    def _create_state(self, param_group):
+        pass
+
+    def _updates(self, param_group):
+        pass
+
+    def _reduce_scatter(self, shard):
+        grads = [
+            param.grad
+            if param.grad is not None
+            else zeros(shape, param.dtype, device=param.device)
+            for param, shape in zip(shard.params, shard.shapes)
+        ]
+        flat = shard.pack(grads)
+        if self._reduce_method is None or self._group is None:
+            grad = flat[shard.begin : shard.begin + shard.chunk]
+        else:
+            grad = reduce_scatter_sum(flat, self._group)
+        if self._reduce_method == "mean" and self._group is not None:
+            grad = grad / self._size
+        return grad
+
+    def step(self):
+        r"""Performs a single optimization step."""
+        push_scope("step")
+        shards = []
+        restores = []
+        for (param_group, shard), inner_group in zip(
+            self._shards, self._optimizer.param_groups
+        ):
+            # a part without any gradient is skipped like in the wrapped
+            # optimizer, which should be the same on all the ranks
+            if all(param.grad is None for param in shard.params):
+                continue
+            for k, v in param_group.items():
+                if k != "params":
+                    inner_group[k] = v
+            shard.param.grad = self._reduce_scatter(shard)
+            shards.append(shard)
+            # params without grads are packed with zero grads, but weight decay
+            # and momentum would still change them, so their elements of the part
+            # and of its states are restored after the step
+            mask = shard.mask_without_grad()
+            if mask is not None:
+                self._optimizer._sync_states()
+                states = self._optimizer._state.get(shard.param, {}).values()
+                targets = [shard.param] + [
+                    state
+                    for state in states
+                    if state._tuple_shape == shard.param._tuple_shape
+                ]
+                # new buffers, as states may be updated in place
+                restores.append((mask, [(t, t + 0) for t in targets]))
+
+        self._optimizer.step()
+
+        if restores:
+            self._optimizer._sync_states()
+        for mask, targets in restores:
+            for target, value in targets:
+                target._reset(where(mask, value, target))
+
+        for shard in shards:
+            shard.param.grad = None
+            flat = shard.param
+            if self._group is not None:
+                flat = all_gather(flat, self._group)
+            for param, value in zip(shard.params, shard.unpack(flat)):
+                param._reset(value)
+        pop_scope("step")
+        return self
+
+    def state_dict(self, keep_var=False) -> Dict:
+        r"""Export the optimizer state of this rank, which only contains the states
+        of its own part of params.
+
+        The states differ between ranks, so each rank should save them into its own
+        file by :func:`~.megengine.save` rather than :func:`~.save_checkpoint`, and
+        load them after the params are restored:
+
+        .. code-block::
+
+            dist.save_checkpoint(model.state_dict(), path)
+            mge.save(opt.state_dict(), "{}/optimizer-{}.pkl".format(path, rank))
+
+            model.load_state_dict(dist.load_checkpoint(path))
+            opt = ShardedOptimizer(model.parameters(), optim.Adam, lr=1e-3)
+            opt.load_state_dict(mge.load("{}/optimizer-{}.pkl".format(path, rank)))
+
+        Return:
+            optimizer state. Can be loaded by :meth:`load_state_dict` of the same
+            rank with the same number of ranks.
+        """
+        return {
+            "param_groups": [
+                {k: v for k, v in group.items() if k != "params"}
+                for group in self.param_groups
+            ],
+            "shard": self._optimizer.state_dict(keep_var),
+            "rank": self._rank,
+            "world_size": self._size,
+        }
+
+    def load_state_dict(self, state: dict):
+        r"""Loads the optimizer state of this rank.
+
+        Args:
+            state: optimizer state. Should be an object returned from a call to
+                :meth:`state_dict` of the same rank.
+        """
+        if (state["rank"], state["world_size"]) != (self._rank, self._size):
+            raise ValueError(
+                "loaded state dict is saved by rank {} of {} ranks, but this is "
+                "rank {} of {}".format(
+                    state["rank"], state["world_size"], self._rank, self._size
+                )
+            )
+        if len(self.param_groups) != len(state["param_groups"]):
+            raise ValueError(
+                "loaded state dict has a different number of parameter groups"
+            )
+        self._optimizer.load_state_dict(state["shard"])
+        for group_new, group_saved in zip(self.param_groups, state["param_groups"]):
+            group_new.update(group_saved)
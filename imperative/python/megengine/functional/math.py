@@ -18,7 +18,15 @@ from ..core.ops import builtin
 from ..core.ops.builtin import BatchNorm, Elemwise, GetVarShape, Reduce, TypeCvt
 from ..core.ops.special import Const
 from ..core.tensor import amp
-from ..core.tensor.utils import _normalize_axis, cast_tensors, setscalar, subgraph
+from ..core.tensor.utils import (
+    _normalize_axis,
+    cast_tensors,
+    get_offsets,
+    param_pack_concat,
+    param_pack_split,
+    setscalar,
+    subgraph,
+)
 from ..jit import exclude_from_trace
 from ..tensor import Tensor
 from .debug_param import get_execution_strategy
@@ -1181,16 +1189,88 @@ def svd(inp: Tensor, full_matrices=False, compute_uv=True) -> Tensor:
     return U, sigma, V
 
 
-def _check_non_finite(inp: Tensor) -> Tensor:
+@lru_cache(maxsize=32)
+def _get_pack_offsets(offsets, device):
+    return Tensor(offsets, dtype="int32", device=device)
+
+
+def _pack_tensors(inps):
+    # tensors of the same dtype and device are packed into a flat tensor by one
+    # op, so that they could be processed by a few ops no matter how many they are
+    groups = collections.OrderedDict()
+    for i, inp in enumerate(inps):
+        groups.setdefault((inp.dtype, str(inp.device)), []).append(i)
+    for (_, device), indices in groups.items():
+        shapes = [inps[i]._tuple_shape for i in indices]
+        offsets = get_offsets(shapes)
+        if len(indices) == 1:
+            flat = inps[indices[0]].reshape(-1)
+        else:
+            offsets_tensor = _get_pack_offsets(tuple(offsets), device)
+            tensors = [inps[i] for i in indices]
+            flat = param_pack_concat(tensors, offsets_tensor, offsets)
+        yield indices, shapes, offsets, flat
+
+
+def _unpack_tensor(flat, shapes, offsets):
+    if len(shapes) == 1:
+        return [flat.reshape(shapes[0])]
+    return param_pack_split(flat, offsets, shapes)
+
+
+def _multi_tensor_norm(inps: Sequence[Tensor], ord: float = 2.0) -> Tensor:
+    r"""Calculates ``p``-norm of a list of tensors, as if they were flattened and
+    concatenated into a single vector. Tensors of the same dtype and device are
+    reduced together.
+
+    Args:
+        inps: tensors to calculate the norm of.
+        ord: power of value applied to the tensors. Default: 2
+
+    Returns:
+        a float32 scalar tensor.
+    """
+    norms = [norm(flat.astype("float32"), ord) for *_, flat in _pack_tensors(inps)]
+    if len(norms) == 1:
+        return norms[0]
+    return norm(concat(norms), ord)
+
+
+def _multi_tensor_mul(inps: Sequence[Tensor], scale: Tensor) -> Sequence[Tensor]:
+    r"""Multiplies each of a list of tensors by ``scale``, tensors of the same dtype
+    and device are multiplied by one op.
+
+    Args:
+        inps: tensors to be multiplied.
+        scale: a scalar tensor.
+
+    Returns:
+        the multiplied tensors, in the order of ``inps``.
+    """
+    outputs = [None] * len(inps)
+    for indices, shapes, offsets, flat in _pack_tensors(inps):
+        for i, x in zip(indices, _unpack_tensor(flat * scale, shapes, offsets)):
+            outputs[i] = x
+    return outputs
+
+
+def _check_non_finite(inp: Union[Tensor, Sequence[Tensor]]) -> Tensor:
     r"""Check whether input contains infinite or nan value.
 
     Args:
-        inp: a tensor to be checked.
+        inp: a tensor or a list of tensors to be checked, tensors of the same dtype
+            and device are checked by one op.
 
     Returns:
         a int32 scalar tensor, 0 for False and 1 for True.
     """
-    op = builtin.CheckNonFinite()
-    (oup,) = apply(op, inp.reshape(-1).astype("float32"))
-    oup._setscalar()
-    return oup
+    inps = [inp] if isinstance(inp, Tensor) else inp
+    flags = []
+    for *_, flat in _pack_tensors(inps):
+        op = builtin.CheckNonFinite()
+        (oup,) = apply(op, flat.astype("float32"))
+        oup._setscalar()
+        flags.append(oup)
+    if len(flags) == 1:
+        return flags[0]
+    return max(concat(flags))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# MegEngine is Licensed under the Apache License, Version 2.0 (the "License")
+#
+# Copyright (c) 2014-2021 Megvii Inc. All rights reserved.
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+from ..autodiff.checkpoint import checkpoint
+from .module import Module
+
+
+class Checkpoint(Module):
+    r"""Wraps a module to recompute its intermediate results in backward instead of
+    keeping them from forward, see :func:`~.autodiff.checkpoint`.
+
+    Examples:
+
+        .. code-block::
+
+            blocks = [M.Checkpoint(Block()) for _ in range(24)]
+            model = M.Sequential(*blocks)
+
+    Args:
+        module: the module to wrap, whose parameters are accessed with the
+            ``module.`` prefix.
+    """
+
+    def __init__(self, module: Module, **kwargs):
+        super().__init__(**kwargs)
+        self.module = module
+
+    def forward(self, *inputs):
+        return checkpoint(self.module, *inputs)
@@ -13,6 +13,7 @@ import numpy as np
 
 from ..core.tensor.utils import make_shape_tuple
 from ..logger import get_logger
+from ..serialization import CheckpointReader
 from ..tensor import Parameter, Tensor
 from ..utils.deprecation import deprecated
 from ..utils.hook import HookHandler
@@ -501,7 +502,9 @@ class Module(metaclass=ABCMeta):
 
     def load_state_dict(
         self,
-        state_dict: Union[dict, Callable[[str, Tensor], Optional[np.ndarray]]],
+        state_dict: Union[
+            dict, CheckpointReader, Callable[[str, Tensor], Optional[np.ndarray]]
+        ],
         strict=True,
     ):
         r"""Loads a given dictionary created by :func:`state_dict` into this module.
@@ -540,9 +543,29 @@ class Module(metaclass=ABCMeta):
                     M.init.zero_(v)
                 if 'conv' in k:
 
+        For models larger than the free host memory, pass a
+        :class:`~.serialization.CheckpointReader` of a state_dict saved with
+        ``mmap=True``. States are read from disk and copied into the module one at
+        a time, so the whole state_dict is never held in memory:
+
+        .. code-block::
+
+            mge.save(model.state_dict(), "model.mge", mmap=True)
+            model.load_state_dict(mge.serialization.CheckpointReader("model.mge"))
         """
         unused = []
-        if isinstance(state_dict, dict):
+        on_loaded = None
+        if isinstance(state_dict, CheckpointReader):
+            # stream tensors from the memory-mapped file, the pages of each tensor
+            # are dropped once it is copied into the module
+            unused = state_dict.keys()
+
+            def closure(k, _):  # var unused
+                return state_dict.numpy(k) if k in state_dict else None
+
+            on_loaded = state_dict.release
+
+        elif isinstance(state_dict, dict):
             unused = state_dict.keys()
 
             def closure(k, _):  # var unused
@@ -557,7 +580,7 @@ class Module(metaclass=ABCMeta):
                 )
             )
 
-        loaded, skipped = self._load_state_dict_with_closure(closure)
+        loaded, skipped = self._load_state_dict_with_closure(closure, on_loaded)
         unused = set(unused) - loaded
 
         if len(unused) != 0:
@@ -580,9 +603,10 @@ class Module(metaclass=ABCMeta):
                     "Missing params in `strict=False` mode, missing={}".format(skipped)
                 )
 
-    def _load_state_dict_with_closure(self, closure):
+    def _load_state_dict_with_closure(self, closure, on_loaded=None):
         r"""Advance state_dict load through callable ``closure`` whose signature is
-        ``closure(key: str, var: Tensor) -> Union[np.ndarry, None]``
+        ``closure(key: str, var: Tensor) -> Union[np.ndarry, None]``, and
+        ``on_loaded(key: str)`` is called after each state is loaded.
         """
         XNorm_typeclass = _get_XNorm_typeclass()
         assert callable(closure), "closure must be a function"
@@ -628,6 +652,8 @@ class Module(metaclass=ABCMeta):
                 )
             )
             loaded.append(k)
+            if on_loaded is not None:
+                on_loaded(k)
 
         return set(loaded), set(skipped)
 
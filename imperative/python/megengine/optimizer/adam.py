@@ -25,6 +25,9 @@ class Adam(Optimizer):
             and its square. Default: (0.9, 0.999)
         eps: term added to the denominator to improve numerical stability. Default: 1e-8
         weight_decay: weight decay (L2 penalty). Default: 0
+        fused: whether to pack the params, grads and states of each param group
+            and update them by a few vectorized ops, which is faster for models
+            with many small params. Default: False
     """
 
     def __init__(
@@ -34,6 +37,7 @@ class Adam(Optimizer):
         betas: Tuple[float, float] = (0.9, 0.999),
         eps: float = 1e-8,
         weight_decay: float = 0.0,
+        fused: bool = False,
     ):
         if lr < 0.0:
             raise ValueError("Invalid learning rate: {}".format(lr))
@@ -47,6 +51,7 @@ class Adam(Optimizer):
         defaults = dict(lr=lr, weight_decay=weight_decay, betas=betas, eps=eps)
         super().__init__(params, defaults)
         self._disable_type_convert = True
+        self._fused = fused
 
     def _create_state(self, param_group):
         for param in param_group["params"]:
@@ -123,3 +128,28 @@ class Adam(Optimizer):
                 (exp_avg_sq / (c1 - _beta1 ** step)) ** c05 + _eps
             )
             param -= _lr * delta
+
+    def _fused_updates(self, param_group, pack, param, grad, states):
+        weight_decay = param_group["weight_decay"]
+        beta0, beta1 = param_group["betas"]
+        _beta0, _beta1 = self._scalar(beta0), self._scalar(beta1)
+        c1 = self._scalar(1.0)
+
+        if weight_decay != 0.0:
+            grad = grad + param * tensor(weight_decay, dtype="float32")
+
+        step = states["step"] + c1
+        exp_avg = states["exp_avg"] * _beta0 + grad * self._scalar(1 - beta0)
+        exp_avg_sq = states["exp_avg_sq"] * _beta1 + self._scalar(1 - beta1) * (
+            grad * grad
+        )
+        states.update(step=step, exp_avg=exp_avg, exp_avg_sq=exp_avg_sq)
+
+        # bias corrections depend on the step of each param
+        bias_correction0 = pack.expand(c1 - _beta0 ** step)
+        bias_correction1 = pack.expand(c1 - _beta1 ** step)
+        delta = (exp_avg / bias_correction0) / (
+            (exp_avg_sq / bias_correction1) ** self._scalar(0.5)
+            + self._scalar(param_group["eps"])
+        )
+        return param - tensor(param_group["lr"], dtype="float32") * delta
@@ -10,7 +10,8 @@
 from typing import Iterable, Union
 
 from ..core._imperative_rt.core2 import pop_scope, push_scope
-from ..functional import clip, concat, minimum, norm
+from ..functional import clip, minimum
+from ..functional.math import _multi_tensor_mul, _multi_tensor_norm
 from ..tensor import Tensor
 
 __all__ = ["clip_grad_norm", "clip_grad_value"]
@@ -38,15 +39,12 @@ def clip_grad_norm(
     if len(tensors) == 0:
         pop_scope("clip_grad_norm")
         return Tensor(0.0)
-    norm_ = [norm(t.grad.flatten(), ord=ord) for t in tensors]
-    if len(norm_) > 1:
-        norm_ = norm(concat(norm_), ord=ord)
-    else:
-        norm_ = norm_[0]
+    grads = [t.grad for t in tensors]
+    norm_ = _multi_tensor_norm(grads, ord=ord)
     scale = max_norm / (norm_ + 1e-6)
     scale = minimum(scale, 1)
-    for tensor in tensors:
-        tensor.grad._reset(tensor.grad * scale)
+    for tensor, grad in zip(tensors, _multi_tensor_mul(grads, scale)):
+        tensor.grad._reset(grad)
     pop_scope("clip_grad_norm")
     return norm_
 
@@ -16,7 +16,12 @@ from typing import Union
 import numpy as np
 
 from ..core._imperative_rt.core2 import pop_scope, push_scope, set_option
-from ..core.tensor.utils import set_convert_inputs
+from ..core.tensor.utils import (
+    get_offsets,
+    param_pack_concat,
+    param_pack_split,
+    set_convert_inputs,
+)
 from ..tensor import Parameter, Tensor
 from ..utils.deprecation import deprecated
 
@@ -29,6 +34,32 @@ class _RequiredParameter:
 required = _RequiredParameter()
 
 
+class _Pack:
+    r"""Tensors of the given shapes packed into a flat tensor, which are packed and
+    split by one op each, like the gradients packed for allreduce."""
+
+    def __init__(self, shapes, device):
+        self.shapes = shapes
+        self.offsets_val = get_offsets(shapes)
+        self.sizes = np.diff(self.offsets_val)[::2]
+        self.offsets = Tensor(self.offsets_val, dtype="int32", device=device)
+        self.device = device
+        self._segments = None
+
+    def pack(self, tensors):
+        return param_pack_concat(tensors, self.offsets, self.offsets_val)
+
+    def split(self, flat):
+        return param_pack_split(flat, self.offsets_val, self.shapes)
+
+    def expand(self, values):
+        r"""Broadcast a value of each tensor to all its elements in the flat tensor."""
+        if self._segments is None:
+            segments = np.repeat(np.arange(len(self.sizes), dtype=np.int32), self.sizes)
+            self._segments = Tensor(segments, device=self.device)
+        return values[self._segments]
+
+
 class Optimizer(metaclass=ABCMeta):
     r"""Base class for all optimizers.
 
@@ -43,6 +74,10 @@ class Optimizer(metaclass=ABCMeta):
         self._state = dict()
         self._defaults = defaults
         self._disable_type_convert = False
+        # whether to update each param group by vectorized ops on packed tensors
+        self._fused = False
+        self._packs = dict()
+        self._scalars = dict()
 
         if isinstance(params, (Parameter, dict)):
             params = [params]
@@ -134,6 +169,96 @@ class Optimizer(metaclass=ABCMeta):
     def _updates(self, param_group):
         pass
 
+    def _fused_updates(self, param_group, pack, param, grad, states):
+        r"""Update the params of a group packed into flat tensors.
+
+        Args:
+            param_group: the param group.
+            pack: the :class:`_Pack` of params, whose ``expand`` broadcasts values
+                of each param to its elements.
+            param: packed params.
+            grad: packed grads.
+            states: dict of packed states, scalar states like ``step`` are packed
+                into a vector with a value per param. New states should be set
+                into it.
+
+        Returns:
+            packed new params.
+        """
+        raise NotImplementedError(
+            "{} does not support fused mode".format(type(self).__name__)
+        )
+
+    def _scalar(self, value):
+        # constants like betas are cached instead of being created on every step,
+        # values changed by schedulers like lr should be created by the caller
+        if value not in self._scalars:
+            self._scalars[value] = Tensor(value, dtype="float32")
+        return self._scalars[value]
+
+    def _unpack_states(self, pack):
+        if pack.states is None:
+            return
+        for name, flat in pack.states.items():
+            for param, value in zip(pack.params, pack.state_packs[name].split(flat)):
+                self._state[param][name]._reset(value)
+        pack.states = None
+
+    def _sync_states(self):
+        r"""Split the states kept packed by fused steps back into the states of
+        params, which should be called before the states of params are used."""
+        for packs in self._packs.values():
+            for pack in packs.values():
+                self._unpack_states(pack)
+
+    def _fused_step(self, param_group):
+        # params with grads are packed by dtype and device, the pack of each is
+        # cached per param group and rebuilt when the params with grads change.
+        # States stay packed across steps, while params are packed every step
+        # as they may be changed elsewhere, e.g. by ``load_state_dict``.
+        buckets = dict()
+        for param in param_group["params"]:
+            if param.grad is not None:
+                key = (np.dtype(param.dtype), str(param.device))
+                buckets.setdefault(key, []).append(param)
+
+        packs = self._packs.setdefault(id(param_group), dict())
+        for key, params in buckets.items():
+            pack = packs.get(key)
+            if (
+                pack is None
+                or len(pack.params) != len(params)
+                or any(p is not q for p, q in zip(pack.params, params))
+            ):
+                if pack is not None:
+                    self._unpack_states(pack)
+                device = params[0].device
+                pack = _Pack([p._tuple_shape for p in params], device)
+                scalars = _Pack([()] * len(params), device)
+                pack.params = params
+                pack.states = None
+                # a non-scalar param tells scalar states from states of params
+                ref = next((p for p in params if p._tuple_shape), params[0])
+                pack.state_packs = {
+                    name: scalars if value._isscalar() else pack
+                    for name, value in self._state.get(ref, {}).items()
+                }
+                packs[key] = pack
+
+            if pack.states is None:
+                pack.states = {
+                    name: state_pack.pack([self._state[p][name] for p in params])
+                    for name, state_pack in pack.state_packs.items()
+                }
+            states = dict(pack.states)
+            flat = pack.pack(params)
+            grad = pack.pack([p.grad for p in params])
+            flat = self._fused_updates(param_group, pack, flat, grad, states)
+            pack.states = states
+
+            for param, value in zip(params, pack.split(flat)):
+                param._reset(value)
+
     def _get_params(self):
         params = []
         for group in self.param_groups:
@@ -156,8 +281,17 @@ class Optimizer(metaclass=ABCMeta):
                     "Please use a list instead."
                 )
             push_scope("step")
-            self._updates(group)
+            if self._fused:
+                self._fused_step(group)
+            else:
+                self._updates(group)
             pop_scope("step")
+        if self._packs:
+            # evict the packs of param groups no longer in the optimizer
+            group_ids = set(map(id, self.param_groups))
+            for key in set(self._packs) - group_ids:
+                for pack in self._packs.pop(key).values():
+                    self._unpack_states(pack)
         if self._disable_type_convert:
             # restore the globle state `_enable_convert_inputs`
             set_convert_inputs(backup)
@@ -185,6 +319,7 @@ class Optimizer(metaclass=ABCMeta):
         Return:
             optimizer state. Can be loaded by :meth:`load_state_dict`.
         """
+        self._sync_states()
         param_groups = []
         state = dict()
         param2id = dict()
@@ -217,6 +352,8 @@ class Optimizer(metaclass=ABCMeta):
             state: optimizer state. Should be an object returned
                 from a call to :meth:`state_dict`.
         """
+        # states of params are replaced, the packed ones are packed again
+        self._sync_states()
         if len(self.param_groups) != len(state["param_groups"]):
             raise ValueError(
                 "loaded state dict has a different number of parameter groups"
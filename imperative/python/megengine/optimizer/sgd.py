@@ -27,6 +27,9 @@ class SGD(Optimizer):
         momentum: momentum factor. Default: 0.0
         nesterov: enables Nesterov momentum. Default: False
         weight_decay: weight decay (L2 penalty). Default: 0.0
+        fused: whether to pack the params, grads and states of each param group
+            and update them by a few vectorized ops, which is faster for models
+            with many small params. Default: False
     """
 
     def __init__(
@@ -36,6 +39,7 @@ class SGD(Optimizer):
         momentum: float = 0.0,
         nesterov: bool = False,
         weight_decay: float = 0.0,
+        fused: bool = False,
     ):
         assert lr >= 0.0, "Invalid learning rate: {}".format(lr)
         assert momentum >= 0.0, "Invalid momentum value: {}".format(momentum)
@@ -48,6 +52,7 @@ class SGD(Optimizer):
         super().__init__(params, defaults)
         self.nesterov = nesterov
         self._disable_type_convert = True
+        self._fused = fused
 
     def _create_state(self, param_group):
         if param_group["momentum"] != 0.0:
@@ -99,3 +104,19 @@ class SGD(Optimizer):
                 else:
                     grad = v
             param -= _lr * grad
+
+    def _fused_updates(self, param_group, pack, param, grad, states):
+        weight_decay = param_group["weight_decay"]
+        momentum = param_group["momentum"]
+        _momentum = self._scalar(momentum)
+
+        if weight_decay != 0.0:
+            grad = grad + param * tensor(weight_decay, dtype="float32")
+        if momentum != 0.0:
+            v = states["momentum_buffer"] * _momentum + grad
+            states["momentum_buffer"] = v
+            if self.nesterov:
+                grad = grad + v * _momentum
+            else:
+                grad = v
+        return param - tensor(param_group["lr"], dtype="float32") * grad
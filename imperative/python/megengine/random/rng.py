@@ -7,6 +7,7 @@
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 import collections
+import contextlib
 import time
 from typing import Iterable, Optional, Union
 
@@ -667,6 +668,22 @@ permutation = _default_handle.permutation
 shuffle = _default_handle.shuffle
 
 
+@contextlib.contextmanager
+def _forked_default_rng(seed: int):
+    r"""Draw random numbers of the default RNG, e.g. used by :func:`uniform` and
+    :func:`~.dropout`, from a new RNG of ``seed`` in the context. The state of the
+    default RNG is not changed, and the same numbers are drawn each time the
+    context is entered with the same seed.
+    """
+    rng = RNG(seed=seed)
+    saved = _default_handle.__dict__.copy()
+    _default_handle.__dict__.update(rng.__dict__)
+    try:
+        yield
+    finally:
+        _default_handle.__dict__.update(saved)
+
+
 def _random_seed_generator():
     assert _rng
     while True:
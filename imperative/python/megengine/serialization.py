@@ -6,14 +6,41 @@
 # Unless required by applicable law or agreed to in writing,
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import collections.abc
+import io
+import mmap as _mmap
+import os
 import pickle
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 from .device import _valid_device, get_default_device
 from .tensor import Tensor
 from .utils.max_recursion_limit import max_recursion_limit
 
+# Layout of the mmap format:
+#     header | aligned raw blobs | pickled object | footer
+# tensors and numpy arrays in the pickled object are persistent ids referring to
+# blobs by offset, and the footer holds the offset and size of the pickled object.
+# The header holds the size of the checkpoint, so that it can be followed by other
+# data in the same file, or 0 if the file is not seekable when saving, in which case
+# the checkpoint lasts till the end of the file.
+_MAGIC = b"MGECKPT\x01"
+_HEADER = struct.Struct("<8sQ")
+_FOOTER = struct.Struct("<QQ8s")
+_BLOB_ALIGNMENT = 64
+
 
-def save(obj, f, pickle_module=pickle, pickle_protocol=pickle.HIGHEST_PROTOCOL):
+def save(
+    obj,
+    f,
+    pickle_module=pickle,
+    pickle_protocol=pickle.HIGHEST_PROTOCOL,
+    mmap: bool = False,
+):
     r"""Save an object to disk file.
 
     Args:
@@ -21,17 +48,256 @@ def save(obj, f, pickle_module=pickle, pickle_protocol=pickle.HIGHEST_PROTOCOL):
         f: a string of file name or a text file object to which ``obj`` is saved to.
         pickle_module: Default: ``pickle``.
         pickle_protocol: Default: ``pickle.HIGHEST_PROTOCOL``.
+        mmap: whether to write tensors and numpy arrays as aligned raw blobs,
+            which are memory-mapped by :func:`~.megengine.load` and
+            :class:`CheckpointReader` instead of being unpickled. Default: False
     """
     if isinstance(f, str):
         with open(f, "wb") as fout:
             save(
-                obj, fout, pickle_module=pickle_module, pickle_protocol=pickle_protocol
+                obj,
+                fout,
+                pickle_module=pickle_module,
+                pickle_protocol=pickle_protocol,
+                mmap=mmap,
             )
         return
 
     with max_recursion_limit():
         assert hasattr(f, "write"), "{} does not support write".format(f)
-        pickle_module.dump(obj, f, pickle_protocol)
+        if mmap:
+            _save_mmap(obj, f, pickle_module, pickle_protocol)
+        else:
+            pickle_module.dump(obj, f, pickle_protocol)
+
+
+def _blob_storable(array):
+    return isinstance(array, np.ndarray) and not array.dtype.hasobject
+
+
+def _seekable(f):
+    seekable = getattr(f, "seekable", None)
+    return seekable is not None and seekable()
+
+
+def _save_mmap(obj, f, pickle_module, pickle_protocol):
+    start = f.tell() if _seekable(f) else None
+    f.write(_HEADER.pack(_MAGIC, 0))
+    offset = _HEADER.size
+    # persistent ids of saved objects, so that shared tensors are written once
+    memo = {}
+
+    def write_blob(array):
+        nonlocal offset
+        padding = -offset % _BLOB_ALIGNMENT
+        f.write(b"\0" * padding)
+        offset += padding
+        # ascontiguousarray turns scalars into 1-d arrays, keep the shape
+        shape = array.shape
+        array = np.ascontiguousarray(array)
+        f.write(array.reshape(-1).view(np.uint8).data)
+        blob = (offset, array.dtype, shape)
+        offset += array.nbytes
+        return blob
+
+    def persistent_id(obj):
+        if id(obj) in memo:
+            return memo[id(obj)][1]
+        if isinstance(obj, (Tensor, _TensorSnapshot)):
+            # same as pickling a tensor, except that the value is a raw blob
+            snapshot = obj if isinstance(obj, _TensorSnapshot) else _TensorSnapshot(obj)
+            pid = (
+                "tensor",
+                snapshot.cls,
+                snapshot.args,
+                snapshot.state,
+                write_blob(snapshot.value),
+            )
+        elif _blob_storable(obj):
+            pid = ("ndarray", write_blob(obj))
+        else:
+            return None
+        memo[id(obj)] = (obj, pid)
+        return pid
+
+    class Pickler(pickle_module.Pickler):
+        pass
+
+    Pickler.persistent_id = staticmethod(persistent_id)
+    buf = io.BytesIO()
+    Pickler(buf, pickle_protocol).dump(obj)
+    f.write(buf.getbuffer())
+    f.write(_FOOTER.pack(offset, buf.tell(), _MAGIC))
+    if start is not None:
+        end = f.tell()
+        f.seek(start)
+        f.write(_HEADER.pack(_MAGIC, end - start))
+        f.seek(end)
+
+
+class _TensorSnapshot:
+    r"""Value of a tensor copied to host, which is pickled the same as the tensor."""
+
+    def __init__(self, tensor):
+        self.cls = type(tensor)
+        self.value, *self.args = tensor.__getnewargs__()
+        self.state = tensor.__getstate__()
+
+    def __reduce_ex__(self, protocol):
+        # tensors are reconstructed by ``cls(value, dtype, device)``, which is the
+        # same as ``cls.__new__`` since ``Tensor.__init__`` does nothing
+        return self.cls, (self.value, *self.args), self.state
+
+
+def _snapshot(obj, memo):
+    # copy tensors and writable arrays in containers, objects shared in ``obj``
+    # are still shared in the snapshot
+    if id(obj) in memo:
+        return memo[id(obj)][1]
+    if isinstance(obj, Tensor):
+        snapshot = _TensorSnapshot(obj)
+    elif isinstance(obj, np.ndarray):
+        # arrays got by `Tensor.numpy` are read-only and never modified
+        snapshot = obj.copy() if obj.flags.writeable else obj
+    elif isinstance(obj, dict):
+        snapshot = obj.copy()
+        for k, v in obj.items():
+            snapshot[k] = _snapshot(v, memo)
+    elif type(obj) in (list, tuple):
+        snapshot = type(obj)(_snapshot(v, memo) for v in obj)
+    else:
+        return obj
+    memo[id(obj)] = (obj, snapshot)
+    return snapshot
+
+
+def _save_atomic(obj, path, pickle_module, pickle_protocol, mmap):
+    # write a temporary file and rename it, so that ``path`` is either the old or
+    # the complete new checkpoint even if the process is killed
+    tmp_path = "{}.tmp{}".format(path, os.getpid())
+    try:
+        with open(tmp_path, "wb") as f:
+            save(obj, f, pickle_module, pickle_protocol, mmap)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # persist the rename
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class AsyncSaver:
+    r"""Save checkpoints in a background thread, so that training is not blocked by
+    serialization and disk writes.
+
+    :meth:`save` copies the values of tensors to host before returning, later
+    changes of the tensors do not affect the checkpoint. Then the checkpoint is
+    written to a temporary file, synced to disk and renamed to the target path
+    in the background.
+
+    Args:
+        max_pending: maximum number of checkpoints which are not written yet,
+            :meth:`save` blocks when it is reached, which bounds the host memory
+            used by the copied values. Default: 1
+        pickle_module: Default: ``pickle``.
+        pickle_protocol: Default: ``pickle.HIGHEST_PROTOCOL``.
+        mmap: whether to save in the format which is memory-mapped when loaded,
+            see :func:`~.megengine.save`. Default: False
+
+    Examples:
+        .. code-block::
+
+           saver = mge.serialization.AsyncSaver()
+           for epoch in range(num_epochs):
+               train_one_epoch(model, optimizer, scaler)
+               saver.save(
+                   {
+                       "model": model.state_dict(),
+                       "optimizer": optimizer.state_dict(),
+                       "scaler": scaler.state_dict(),
+                   },
+                   "checkpoint.pkl",
+               )
+           saver.close()
+    """
+
+    def __init__(
+        self,
+        max_pending: int = 1,
+        pickle_module=pickle,
+        pickle_protocol=pickle.HIGHEST_PROTOCOL,
+        mmap: bool = False,
+    ):
+        if max_pending <= 0:
+            raise ValueError(
+                "max_pending should be positive, but got {}".format(max_pending)
+            )
+        self.pickle_module = pickle_module
+        self.pickle_protocol = pickle_protocol
+        self.mmap = mmap
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        # a single thread, so checkpoints are written in order
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def save(self, obj, path: str):
+        r"""Snapshot ``obj`` and save it to ``path`` in the background.
+
+        Args:
+            obj: object to save. Tensors and numpy arrays nested in dicts, lists
+                and tuples are copied, other objects should not be modified until
+                the checkpoint is written.
+            path: path of the checkpoint.
+
+        Returns:
+            a :class:`~concurrent.futures.Future` which is done when the
+            checkpoint is written, errors of writing are raised by its ``result``.
+        """
+        self._pending.acquire()
+        try:
+            snapshot = _snapshot(obj, {})
+            future = self._executor.submit(
+                _save_atomic,
+                snapshot,
+                path,
+                self.pickle_module,
+                self.pickle_protocol,
+                self.mmap,
+            )
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        self._futures.append(future)
+        return future
+
+    def wait(self):
+        r"""Wait until all the checkpoints are written, errors of writing are
+        raised."""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        r"""Wait for pending checkpoints and stop the background thread."""
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
 
 
 class dmap:
@@ -76,6 +342,181 @@ def _get_callable_map_location(map_location):
     return callable_map_location
 
 
+def _is_mmap_file(f):
+    if not _seekable(f):
+        return False
+    pos = f.tell()
+    head = f.read(len(_MAGIC))
+    f.seek(pos)
+    return head == _MAGIC
+
+
+def _map_file(f):
+    r"""Map the checkpoint starting at the current position of ``f``, return the
+    buffer and the position of checkpoint in it. ``f`` is moved to the end of the
+    checkpoint."""
+    start = f.tell()
+    head = f.read(_HEADER.size)
+    f.seek(start)
+    size = _HEADER.unpack(head)[1] if len(head) == _HEADER.size else 0
+    try:
+        fileno = f.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fileno = None
+    if fileno is None:
+        # not a real file, e.g. ``io.BytesIO``
+        buf = bytearray(f.read(size) if size else f.read())
+        base = 0
+    else:
+        # copy-on-write, arrays mapped from the file are writable but the file
+        # is never modified
+        buf = _mmap.mmap(fileno, 0, access=_mmap.ACCESS_COPY)
+        base = start
+    end = base + size if size else len(buf)
+    magic = b""
+    if base + _HEADER.size + _FOOTER.size <= end <= len(buf):
+        pickle_offset, pickle_size, magic = _FOOTER.unpack_from(buf, end - _FOOTER.size)
+    if magic != _MAGIC:
+        raise ValueError("{} is not a complete checkpoint".format(f))
+    f.seek(start + end - base)
+    return buf, base, base + pickle_offset, pickle_size
+
+
+class _Blob:
+    r"""A tensor or numpy array in the mmap format which is not created yet."""
+
+    def __init__(self, pid, buf, base):
+        self.pid = pid
+        self.buf = buf
+        self.base = base
+
+    def numpy(self):
+        offset, dtype, shape = self.pid[-1]
+        return np.ndarray(shape, dtype, buffer=self.buf, offset=self.base + offset)
+
+    def create(self):
+        array = self.numpy()
+        if self.pid[0] == "ndarray":
+            return array
+        _, cls, args, state, _ = self.pid
+        obj = cls.__new__(cls, array, *args)
+        if state:
+            obj.__setstate__(state)
+        return obj
+
+
+def _unpickle_mmap(buf, base, pickle_offset, pickle_size, pickle_module, lazy):
+    # objects created from the same blob are shared, as in the saved object
+    created = {}
+
+    def persistent_load(pid):
+        blob = _Blob(pid, buf, base)
+        if lazy:
+            return blob
+        key = pid[-1][0]
+        if key not in created:
+            created[key] = blob.create()
+        return created[key]
+
+    class Unpickler(pickle_module.Unpickler):
+        pass
+
+    Unpickler.persistent_load = staticmethod(persistent_load)
+    data = memoryview(buf)[pickle_offset : pickle_offset + pickle_size]
+    return Unpickler(io.BytesIO(data)).load()
+
+
+def _create_blobs(obj):
+    if isinstance(obj, _Blob):
+        return obj.create()
+    if isinstance(obj, dict):
+        obj = obj.copy()
+        for k, v in obj.items():
+            obj[k] = _create_blobs(v)
+        return obj
+    if type(obj) in (list, tuple):
+        return type(obj)(_create_blobs(v) for v in obj)
+    return obj
+
+
+class CheckpointReader(collections.abc.Mapping):
+    r"""Read a dict, e.g. ``state_dict``, saved by :func:`~.megengine.save` with
+    ``mmap=True``. The file is memory-mapped, and values are created lazily every
+    time they are got, so that only the tensors in use are read from disk.
+
+    Args:
+        f: a string of file name or a binary file object from which to read.
+        map_location: device mapping, the same as :func:`~.megengine.load`.
+            Default: None
+        pickle_module: Default: ``pickle``.
+
+    Examples:
+        .. code-block::
+
+           import megengine as mge
+           mge.save(model.state_dict(), "model.mge", mmap=True)
+           reader = mge.serialization.CheckpointReader("model.mge")
+           weight = reader["fc.weight"]  # only this tensor is read
+    """
+
+    def __init__(self, f, map_location=None, pickle_module=pickle):
+        if isinstance(f, str):
+            with open(f, "rb") as fin:
+                self.__init__(fin, map_location, pickle_module)
+            return
+        if not _is_mmap_file(f):
+            raise ValueError("{} is not saved with mmap=True".format(f))
+        self.map_location = _get_callable_map_location(map_location)
+        buf, base, pickle_offset, pickle_size = _map_file(f)
+        with max_recursion_limit(), dmap(self.map_location):
+            self.obj = _unpickle_mmap(
+                buf, base, pickle_offset, pickle_size, pickle_module, lazy=True
+            )
+        if not isinstance(self.obj, dict):
+            raise ValueError(
+                "CheckpointReader only reads dict, but got {}".format(type(self.obj))
+            )
+
+    def numpy(self, key):
+        r"""Get the value of a tensor as a numpy array mapped from the file without
+        copy, writing the array does not modify the file."""
+        value = self.obj[key]
+        if not isinstance(value, _Blob):
+            raise ValueError("{} is not a tensor or numpy array".format(key))
+        return value.numpy()
+
+    def release(self, key):
+        r"""Drop the pages of a tensor from memory after it is used, e.g. copied
+        into a parameter. They are read from the file again if the tensor is used
+        later, and changes made to the arrays got by :meth:`numpy` are lost."""
+        value = self.obj[key]
+        if not isinstance(value, _Blob) or not isinstance(value.buf, _mmap.mmap):
+            return
+        if not hasattr(value.buf, "madvise") or not hasattr(_mmap, "MADV_DONTNEED"):
+            return
+        array = value.numpy()
+        start = value.base + value.pid[-1][0]
+        end = start + array.nbytes
+        # only the pages entirely covered by the tensor
+        start = -(-start // _mmap.PAGESIZE) * _mmap.PAGESIZE
+        end = end // _mmap.PAGESIZE * _mmap.PAGESIZE
+        if start < end:
+            value.buf.madvise(_mmap.MADV_DONTNEED, start, end - start)
+
+    def __getitem__(self, key):
+        with dmap(self.map_location):
+            return _create_blobs(self.obj[key])
+
+    def __contains__(self, key):
+        return key in self.obj
+
+    def __iter__(self):
+        return iter(self.obj)
+
+    def __len__(self):
+        return len(self.obj)
+
+
 def load(f, map_location=None, pickle_module=pickle):
     r"""Load an object saved with :func:~.megengine.save` from a file.
 
@@ -88,6 +529,9 @@ def load(f, map_location=None, pickle_module=pickle):
        * ``map_location`` defines device mapping. See examples for usage.
        * If you will call :func:`~.megengine.set_default_device()`, please do it
          before :func:`~.megengine.load()`.
+       * Files saved with ``mmap=True`` are memory-mapped, tensors are created from
+         the mapped pages directly and numpy arrays are copy-on-write views of them.
+         Use :class:`CheckpointReader` to create tensors lazily.
 
     Examples:
         .. code-block::
@@ -108,5 +552,12 @@ def load(f, map_location=None, pickle_module=pickle):
 
     map_location = _get_callable_map_location(map_location)  # callable map_location
 
+    if _is_mmap_file(f):
+        buf, base, pickle_offset, pickle_size = _map_file(f)
+        with max_recursion_limit(), dmap(map_location):
+            return _unpickle_mmap(
+                buf, base, pickle_offset, pickle_size, pickle_module, lazy=False
+            )
+
     with dmap(map_location) as dm:
         return pickle_module.load(f)
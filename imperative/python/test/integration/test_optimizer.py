@@ -344,3 +344,95 @@ def test_adamw(monkeypatch, case, update_lr, inplace_mode):
     with monkeypatch.context() as mk:
         mk.setenv("MEGENGINE_INPLACE_UPDATE", str(int(inplace_mode)))
         _test_optimizer("AdamW", case, CheckValue, update_lr=update_lr)
+
+
+class ManyParams(Module):
+    def __init__(self, num_layers):
+        super().__init__()
+        self.layers = [Linear(8, 8) for _ in range(num_layers)]
+        self.scale = Parameter(1.0, dtype=np.float32)
+        self.unused = Parameter(np.ones(3, dtype=np.float32))
+
+    def forward(self, x):
+        for layer in self.layers:
+            x = F.relu(layer(x))
+        return x * self.scale
+
+
+def _train_steps(opt_str, case, fused, num_layers=4, iter_num=3):
+    np.random.seed(0)
+    net = ManyParams(num_layers)
+    opt = getattr(optimizer, opt_str)(net.parameters(), fused=fused, **case)
+    gm = ad.GradManager().attach(net.parameters())
+    data = Tensor(np.random.random((2, 8)).astype(np.float32))
+    for i in range(iter_num):
+        with gm:
+            gm.backward(net(data).sum())
+        if i == 1:
+            # params without grads are not updated
+            net.layers[0].bias.grad = None
+        opt.step().clear_grad()
+        if i == 0:
+            # states kept packed by fused steps are split and packed again
+            opt.load_state_dict(opt.state_dict())
+    return net, opt
+
+
+@pytest.mark.parametrize(
+    "opt_str,case",
+    [
+        ("SGD", {"lr": 0.01, "momentum": 0.9, "weight_decay": 0.1}),
+        ("SGD", {"lr": 0.01, "momentum": 0.9, "nesterov": True}),
+        ("SGD", {"lr": 0.01}),
+        ("Adam", {"lr": 0.01, "weight_decay": 0.1}),
+        ("AdamW", {"lr": 0.01}),
+    ],
+)
+def test_fused_step(opt_str, case):
+    net, opt = _train_steps(opt_str, case, fused=False)
+    fused_net, fused_opt = _train_steps(opt_str, case, fused=True)
+    for param, fused_param in zip(net.parameters(), fused_net.parameters()):
+        np.testing.assert_allclose(param.numpy(), fused_param.numpy(), rtol=1e-5)
+    state = opt.state_dict()["state"]
+    fused_state = fused_opt.state_dict()["state"]
+    for key in state:
+        for name in state[key]:
+            np.testing.assert_allclose(
+                state[key][name], fused_state[key][name], rtol=1e-5
+            )
+
+
+@pytest.mark.skipif(
+    not os.getenv("MGE_BENCHMARK_OPTIMIZER"),
+    reason="benchmark, set MGE_BENCHMARK_OPTIMIZER=1 to run",
+)
+@pytest.mark.parametrize("opt_str", ["SGD", "Adam", "AdamW"])
+def test_fused_step_benchmark(opt_str):
+    import time
+
+    net = ManyParams(500)
+    data = Tensor(np.random.random((2, 8)).astype(np.float32), device="cpu0")
+    gm = ad.GradManager().attach(net.parameters())
+    with gm:
+        gm.backward(net(data).sum())
+    net.unused.grad = F.zeros_like(net.unused)
+
+    latency = {}
+    for fused in (False, True):
+        opt = getattr(optimizer, opt_str)(net.parameters(), lr=0.01, fused=fused)
+        for _ in range(5):
+            opt.step()
+        net.scale.numpy()
+        start = time.perf_counter()
+        for _ in range(20):
+            opt.step()
+        net.scale.numpy()
+        latency[fused] = (time.perf_counter() - start) / 20
+    print(
+        "{} step with {} params: per-param {:.2f}ms, fused {:.2f}ms".format(
+            opt_str,
+            len(list(net.parameters())),
+            latency[False] * 1e3,
+            latency[True] * 1e3,
+        )
+    )
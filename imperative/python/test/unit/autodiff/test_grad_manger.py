@@ -17,7 +17,7 @@ import megengine.distributed as dist
 import megengine.functional as F
 import megengine.module as M
 import megengine.optimizer as optim
-from megengine.autodiff import GradManager
+from megengine.autodiff import GradManager, checkpoint
 from megengine.jit import trace
 
 
@@ -193,6 +193,54 @@ def test_empty_grad_in_backward():
         assert np.all(y.grad.numpy() == 1)
 
 
+@pytest.mark.parametrize("average", [True, False])
+def test_gradient_accumulation(average):
+    w = mge.Parameter([1.0, 2.0])
+    b = mge.Parameter(1.0)
+    xs = [np.array([1.0, 3.0]), np.array([2.0, 5.0]), np.array([4.0, -1.0])]
+
+    gm = GradManager(accumulation_steps=3, average=average).attach([w, b])
+    for step in range(2):
+        for i, x in enumerate(xs):
+            with gm:
+                gm.backward((mge.tensor(x) * w).sum() + b * (i + 1))
+            assert gm.accumulation_done == (i == len(xs) - 1)
+            if not gm.accumulation_done:
+                assert w.grad is None and b.grad is None
+
+        scale = 1 / len(xs) if average else 1
+        np.testing.assert_allclose(w.grad.numpy(), np.sum(xs, axis=0) * scale)
+        np.testing.assert_allclose(b.grad.numpy(), 6 * scale)
+        assert b.grad.ndim == 0
+        w.grad = b.grad = None
+
+    with pytest.raises(ValueError):
+        GradManager(accumulation_steps=0)
+
+
+@pytest.mark.parametrize("average", [True, False])
+def test_gradient_accumulation_existing_grad(average):
+    w = mge.Parameter([1.0, 2.0])
+    b = mge.Parameter(1.0)
+    xs = [np.array([1.0, 3.0]), np.array([2.0, 5.0])]
+    w.grad = mge.tensor([1.0, 1.0])
+    b.grad = mge.tensor(1.0)
+    w_grad, b_grad = w.grad, b.grad
+
+    gm = GradManager(accumulation_steps=2, average=average).attach([w, b])
+    for _ in range(2):
+        for x in xs:
+            with gm:
+                gm.backward((mge.tensor(x) * w).sum() + b)
+
+    # added to the existing .grad in place
+    assert w.grad is w_grad and b.grad is b_grad
+    scale = 1 / len(xs) if average else 1
+    np.testing.assert_allclose(w.grad.numpy(), 1 + 2 * np.sum(xs, axis=0) * scale)
+    np.testing.assert_allclose(b.grad.numpy(), 1 + 2 * len(xs) * scale)
+    assert b.grad.ndim == 0
+
+
 @pytest.mark.require_ngpu(2)
 @pytest.mark.isolated_distributed
 @pytest.mark.parametrize(
@@ -434,3 +482,44 @@ def test_emulate_forward_mode_with_reverse_mode(target):
 
     np.testing.assert_almost_equal(y.numpy(), y1.numpy(), decimal=5)
     np.testing.assert_almost_equal(dy.numpy(), dy1.numpy(), decimal=3)
+
+
+def test_checkpoint():
+    class Block(M.Module):
+        def __init__(self):
+            super().__init__()
+            self.fc = M.Linear(4, 4)
+            self.bn = M.BatchNorm1d(4)
+
+        def forward(self, x):
+            return F.relu(self.bn(self.fc(x)))
+
+    data = np.random.randn(8, 4).astype("float32")
+
+    def run(recompute):
+        np.random.seed(0)
+        block = Block()
+        x = mge.tensor(data)
+        gm = GradManager().attach(list(block.parameters()) + [x])
+        with gm:
+            y = M.Checkpoint(block)(x) if recompute else block(x)
+            gm.backward((y * y).sum())
+        grads = [p.grad.numpy() for p in block.parameters()] + [x.grad.numpy()]
+        return grads, block.bn.running_mean.numpy()
+
+    grads, running_mean = run(recompute=True)
+    expected_grads, expected_running_mean = run(recompute=False)
+    for grad, expected in zip(grads, expected_grads):
+        np.testing.assert_allclose(grad, expected, rtol=1e-5, atol=1e-6)
+    # running mean is only updated once
+    np.testing.assert_allclose(running_mean, expected_running_mean, rtol=1e-6)
+
+    # the same dropout mask is used in recomputation
+    x = mge.tensor(np.ones((64, 64), dtype="float32"))
+    w = mge.Parameter(np.ones((64, 64), dtype="float32"))
+    gm = GradManager().attach([x, w])
+    with gm:
+        y = checkpoint(lambda x, w: F.dropout(x * w, 0.5), x, w)
+        gm.backward(y.sum())
+    np.testing.assert_equal(x.grad.numpy(), y.numpy())
+    np.testing.assert_equal(w.grad.numpy(), y.numpy())
@@ -6,14 +6,20 @@
 # Unless required by applicable law or agreed to in writing,
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import io
 import os
 import pickle
 from tempfile import TemporaryFile
 
 import numpy as np
+import pytest
 
 import megengine as mge
+import megengine.module as M
+import megengine.optimizer as optim
 from megengine import Parameter, Tensor
+from megengine.amp import GradScaler
+from megengine.autodiff import GradManager
 from megengine.core.ops import builtin
 from megengine.traced_module.serialization import get_opdef_state, load_opdef_from_state
 
@@ -78,6 +84,99 @@ def test_tensor_serialization():
         np.testing.assert_equal(b.qparams.scale.numpy(), 1.0)
 
 
+def test_mmap_serialization():
+    weight = Parameter(np.random.random(size=(233, 2)).astype(np.float32))
+    state = {
+        "weight": weight,
+        "shared": weight,
+        "scalar": Tensor(2, dtype=np.int32, device="cpu0"),
+        "array": np.arange(10)[::2],
+        "nested": {"step": 3, "buffers": [Tensor(np.ones(5, dtype=np.int8))]},
+    }
+    with TemporaryFile() as f:
+        mge.save(state, f, mmap=True)
+        f.seek(0)
+        loaded = mge.load(f, map_location="cpux")
+        assert isinstance(loaded["weight"], Parameter)
+        assert loaded["weight"] is loaded["shared"]
+        np.testing.assert_equal(loaded["weight"].numpy(), weight.numpy())
+        assert loaded["scalar"].shape == () and loaded["scalar"].dtype == np.int32
+        np.testing.assert_equal(loaded["array"], np.arange(10)[::2])
+        assert loaded["nested"]["step"] == 3
+        np.testing.assert_equal(loaded["nested"]["buffers"][0].numpy(), 1)
+
+        # arrays are copy-on-write views of the file
+        loaded["array"][0] = 100
+        f.seek(0)
+        reader = mge.serialization.CheckpointReader(f)
+        assert len(reader) == len(state) and "weight" in reader
+        np.testing.assert_equal(reader.numpy("array"), np.arange(10)[::2])
+        np.testing.assert_equal(reader["weight"].numpy(), weight.numpy())
+        assert isinstance(reader["nested"]["buffers"][0], Tensor)
+
+    with TemporaryFile() as f:
+        mge.save(state, f)
+        f.seek(0)
+        with pytest.raises(ValueError):
+            mge.serialization.CheckpointReader(f)
+
+
+@pytest.mark.parametrize("file_type", ["file", "bytes"])
+def test_mmap_serialization_followed_by_data(file_type):
+    weight = Tensor(np.random.random(size=(3, 2)).astype(np.float32))
+    with TemporaryFile() if file_type == "file" else io.BytesIO() as f:
+        f.write(b"head")
+        mge.save({"weight": weight}, f, mmap=True)
+        mge.save({"step": 3}, f, mmap=True)
+        f.write(b"tail")
+        f.seek(4)
+        loaded = mge.load(f)
+        np.testing.assert_equal(loaded["weight"].numpy(), weight.numpy())
+        assert mge.load(f) == {"step": 3}
+        assert f.read() == b"tail"
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_async_saver(mmap, tmpdir):
+    model = M.Linear(3, 2)
+    optimizer = optim.SGD(model.parameters(), lr=0.1, momentum=0.9)
+    scaler = GradScaler()
+    gm = GradManager().attach(model.parameters())
+    x = Tensor(np.random.random(size=(4, 3)).astype(np.float32))
+
+    def train_step():
+        with gm:
+            scaler.backward(gm, model(x).sum())
+        optimizer.step().clear_grad()
+
+    train_step()
+    path = str(tmpdir.join("checkpoint"))
+    with mge.serialization.AsyncSaver(mmap=mmap) as saver:
+        expected = model.weight.numpy().copy()
+        future = saver.save(
+            {
+                "model": model.state_dict(keep_var=True),
+                "optimizer": optimizer.state_dict(keep_var=True),
+                "scaler": scaler.state_dict(),
+            },
+            path,
+        )
+        # values are copied before returning
+        train_step()
+        future.result()
+
+    checkpoint = mge.load(path)
+    np.testing.assert_equal(checkpoint["model"]["weight"].numpy(), expected)
+    assert checkpoint["scaler"] == scaler.state_dict()
+    model.load_state_dict(checkpoint["model"])
+    optimizer.load_state_dict(checkpoint["optimizer"])
+    assert os.listdir(str(tmpdir)) == ["checkpoint"]
+
+    with pytest.raises(FileNotFoundError):
+        with mge.serialization.AsyncSaver() as saver:
+            saver.save({"step": 1}, str(tmpdir.join("missing", "checkpoint")))
+
+
 def test_compatibility():
     def test_old_tensor(model_name):
         path = os.path.join(os.path.dirname(__file__), model_name)
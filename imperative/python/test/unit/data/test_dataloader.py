@@ -7,14 +7,21 @@
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 import os
+import pickle
 import platform
 import time
 
 import numpy as np
 import pytest
 
-from megengine.data.collator import Collator
-from megengine.data.dataloader import DataLoader
+from megengine.data.collator import Collator, SchemaCollator
+from megengine.data.dataloader import (
+    AUTO_PREFETCH_MAX_RATIO,
+    AUTO_PREFETCH_PATIENCE,
+    GLOBAL_TIMEOUT,
+    DataLoader,
+    get_worker_info,
+)
 from megengine.data.dataset import ArrayDataset, StreamDataset
 from megengine.data.sampler import RandomSampler, SequentialSampler, StreamSampler
 from megengine.data.transform import (
@@ -108,6 +115,42 @@ def test_stream_dataloader(batch, num_workers):
             check_set.add(i)
 
 
+class MyShardedStream(StreamDataset):
+    def __init__(self, number):
+        self.number = number
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        start, step = 0, 1
+        if worker_info is not None:
+            start, step = worker_info.id, worker_info.num_workers
+        for cnt in range(start, self.number, step):
+            yield (False, (np.full((2, 2, 3), cnt, dtype="uint8"), cnt))
+
+
+@pytest.mark.parametrize("preload", [False, True])
+def test_stream_dataloader_shard(preload):
+    dataset = MyShardedStream(50)
+    sampler = StreamSampler(batch_size=4)
+    dataloader = DataLoader(
+        dataset,
+        sampler,
+        ToMode("CHW"),
+        num_workers=2,
+        preload=preload,
+        shard_stream=True,
+    )
+
+    labels = []
+    for data, label in dataloader:
+        if preload:
+            data, label = data.numpy(), label.numpy()
+        assert data.shape[1:] == (3, 2, 2)
+        assert len(label) <= 4
+        labels.extend(label.tolist())
+    assert sorted(labels) == list(range(50))
+
+
 def test_stream_dataloader_error():
     dataset = MyStream(100, error_foramt=True)
     sampler = StreamSampler(batch_size=4)
@@ -164,6 +207,329 @@ def test_dataloader_parallel():
         assert label.shape == (4,)
 
 
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_dataloader_unordered(num_workers):
+    dataset = init_dataset()
+
+    class SlowTransform(Transform):
+        def apply(self, input):
+            if input[1] == dataset.arrays[1][0]:
+                time.sleep(0.1)
+            return input
+
+    with pytest.raises(ValueError):
+        DataLoader(
+            dataset,
+            sampler=SequentialSampler(dataset, batch_size=4),
+            num_workers=2,
+            divide=True,
+            ordered=False,
+        )
+
+    dataloader = DataLoader(
+        dataset,
+        sampler=RandomSampler(dataset, batch_size=4, drop_last=False),
+        transform=SlowTransform(),
+        num_workers=num_workers,
+        ordered=False,
+    )
+    seen = []
+    for (data, label), indices in dataloader:
+        assert data.shape == (4, 1, 32, 32)
+        np.testing.assert_equal(data, dataset.arrays[0][indices])
+        np.testing.assert_equal(label, dataset.arrays[1][indices])
+        seen.extend(indices)
+    assert sorted(seen) == list(range(len(dataset)))
+
+
+def test_dataloader_persistent_workers():
+    dataset = init_dataset()
+    with pytest.raises(ValueError):
+        DataLoader(dataset, num_workers=0, persistent_workers=True)
+
+    dataloader = DataLoader(
+        dataset,
+        sampler=RandomSampler(dataset, batch_size=4, drop_last=False),
+        num_workers=2,
+        persistent_workers=True,
+    )
+    workers = None
+    for epoch in range(3):
+        data_iter = iter(dataloader)
+        if workers is not None:
+            assert data_iter.workers == workers
+        workers = data_iter.workers
+        num_batches = 0
+        for data, label in data_iter:
+            assert data.shape == (4, 1, 32, 32)
+            assert label.shape == (4,)
+            num_batches += 1
+        assert num_batches == len(dataloader)
+
+    # break in the middle of an epoch
+    for idx, _ in enumerate(dataloader):
+        if idx == 2:
+            break
+    data_iter = iter(dataloader)
+    assert data_iter.workers != workers
+    assert len(list(data_iter)) == len(dataloader)
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_dataloader_stats(num_workers):
+    dataset = init_dataset()
+    dataloader = DataLoader(
+        dataset,
+        sampler=SequentialSampler(dataset, batch_size=4, drop_last=False),
+        num_workers=num_workers,
+    )
+    for _ in dataloader:
+        pass
+    stats = dataloader.stats(reset=True)
+    for stage in ["sampling", "dataset", "transform", "collate"]:
+        assert stats[stage]["count"] == len(dataloader)
+        assert stats[stage]["total"] >= 0
+    if num_workers > 0:
+        assert stats["queue_wait"]["count"] == len(dataloader)
+    assert stats["h2d"]["count"] == 0
+    assert dataloader.stats()["dataset"]["count"] == 0
+
+
+def test_dataloader_auto_prefetch():
+    dataset = init_dataset()
+    with pytest.raises(ValueError):
+        DataLoader(dataset, num_workers=2, prefetch_factor=0)
+
+    dataloader = DataLoader(
+        dataset,
+        sampler=SequentialSampler(dataset, batch_size=4, drop_last=False),
+        num_workers=2,
+        prefetch_factor=1,
+        auto_prefetch=True,
+    )
+    data_iter = iter(dataloader)
+    prefetch_factor = data_iter.prefetch_factor
+
+    # the tuner is driven by whether each batch had to be waited for
+    for _ in range(AUTO_PREFETCH_PATIENCE - 1):
+        data_iter._tune_prefetch(True)
+    # a batch ready in time resets the patience
+    data_iter._tune_prefetch(False)
+    for _ in range(AUTO_PREFETCH_PATIENCE - 1):
+        data_iter._tune_prefetch(True)
+    assert prefetch_factor.value == 1
+    data_iter._tune_prefetch(True)
+    assert prefetch_factor.value == 2
+    for _ in range(AUTO_PREFETCH_PATIENCE * AUTO_PREFETCH_MAX_RATIO):
+        data_iter._tune_prefetch(True)
+    assert prefetch_factor.value == AUTO_PREFETCH_MAX_RATIO
+
+    # batches are still delivered in order with the grown depth
+    for idx, (data, label) in enumerate(data_iter):
+        np.testing.assert_equal(data, dataset.arrays[0][idx * 4 : (idx + 1) * 4])
+
+
+@pytest.mark.skipif(
+    os.getenv("MGE_BENCHMARK_DATALOADER") != "1" or platform.system() != "Linux",
+    reason="benchmark reading the cpu time of workers from procfs",
+)
+def test_dataloader_idle_cpu_time():
+    dataset = init_dataset()
+    dataloader = DataLoader(
+        dataset,
+        sampler=SequentialSampler(dataset, batch_size=4, drop_last=False),
+        num_workers=2,
+    )
+    data_iter = iter(dataloader)
+    next(data_iter)
+    # wait for the queues to be filled, then all the workers should be idle
+    time.sleep(1)
+    processes = [data_iter.task_feeding_worker, data_iter.data_collecting_worker]
+    processes += data_iter.workers
+
+    def cpu_time():
+        ticks = 0
+        for p in processes:
+            with open("/proc/{}/stat".format(p.pid)) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])  # utime and stime
+        return ticks / os.sysconf("SC_CLK_TCK")
+
+    start_cpu_time = cpu_time()
+    time.sleep(2)
+    assert cpu_time() - start_cpu_time < 0.05
+
+
+def test_dataloader_workers_exit_on_shutdown():
+    dataset = init_dataset()
+    dataloader = DataLoader(
+        dataset,
+        sampler=SequentialSampler(dataset, batch_size=4, drop_last=False),
+        num_workers=2,
+    )
+    data_iter = iter(dataloader)
+    next(data_iter)
+    # workers blocked on the queues of a crashed peer still notice shutdown
+    data_iter.data_collecting_worker.terminate()
+    data_iter.data_collecting_worker.join()
+    with data_iter.shutdown_flag.get_lock():
+        data_iter.shutdown_flag.value = 1
+    for p in [data_iter.task_feeding_worker] + data_iter.workers:
+        p.join(timeout=4 * GLOBAL_TIMEOUT)
+        assert p.exitcode is not None
+
+
+def test_schema_collator():
+    samples = [
+        {
+            "image": np.random.randint(0, 255, (3, 4, 4), dtype=np.uint8),
+            "boxes": [np.random.rand(2, 4).astype("float32"), i],
+            "name": "sample{}".format(i),
+            "score": np.float32(i),
+        }
+        for i in range(4)
+    ]
+    expected = Collator().apply(samples)
+    collator = SchemaCollator()
+    for _ in range(2):
+        batch = collator.apply(samples)
+        np.testing.assert_equal(batch, expected)
+        assert batch["boxes"][1].dtype == expected["boxes"][1].dtype
+    assert collator.schema is not None
+
+    buffers = []
+
+    def alloc(shape, dtype):
+        buffers.append(np.empty(shape, dtype))
+        return buffers[-1]
+
+    batch = collator.apply(samples, alloc=alloc)
+    np.testing.assert_equal(batch, expected)
+    assert batch["image"] is buffers[0]
+
+    # shape mismatch with the cached schema
+    samples[0]["image"] = np.zeros((3, 2, 2), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        collator.apply(samples)
+
+
+def test_schema_collator_fallback():
+    collator = SchemaCollator()
+    batch = collator.apply([(1, {"a": 1}), (2, {"a": 2})])
+    np.testing.assert_equal(batch, Collator().apply([(1, {"a": 1}), (2, {"a": 2})]))
+
+    # batches not fitting the cached schema are collated by Collator
+    for samples in [
+        [(0.5, {"a": 1}), (1.5, {"a": 2})],
+        [(True, {"a": 1}), (2, {"a": 2})],
+        [(1, {"a": 1}, 5), (2, {"a": 2}, 6)],
+        [(1, {"a": 1, "b": 3}), (2, {"a": 2, "b": 4})],
+    ]:
+        batch = collator.apply(samples)
+        expected = Collator().apply(samples)
+        np.testing.assert_equal(batch, expected)
+        assert batch[0].dtype == expected[0].dtype
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_dataloader_schema_collator(num_workers):
+    dataset = init_dataset()
+    dataloader = DataLoader(
+        dataset,
+        sampler=SequentialSampler(dataset, batch_size=4, drop_last=False),
+        collator=SchemaCollator(),
+        num_workers=num_workers,
+    )
+    for idx, (data, label) in enumerate(dataloader):
+        np.testing.assert_equal(data, dataset.arrays[0][idx * 4 : (idx + 1) * 4])
+        np.testing.assert_equal(label, dataset.arrays[1][idx * 4 : (idx + 1) * 4])
+
+
+@pytest.mark.parametrize("backend", ["shm", "plasma"])
+def test_dataloader_parallel_queue_backend(monkeypatch, backend):
+    if backend == "plasma":
+        pytest.importorskip("pyarrow.plasma")
+    # set max shared memory to 100M
+    os.environ["MGE_PLASMA_MEMORY"] = "100000000"
+    monkeypatch.setenv("MGE_DATALOADER_QUEUE_BACKEND", backend)
+
+    dataset = init_dataset()
+    dataloader = DataLoader(
+        dataset,
+        sampler=SequentialSampler(dataset, batch_size=4, drop_last=False),
+        num_workers=2,
+    )
+    for idx, (data, label) in enumerate(dataloader):
+        np.testing.assert_equal(data, dataset.arrays[0][idx * 4 : (idx + 1) * 4])
+        np.testing.assert_equal(label, dataset.arrays[1][idx * 4 : (idx + 1) * 4])
+
+
+def test_shared_memory_queue():
+    from megengine.data.tools._queue import SharedMemoryQueue
+
+    q = SharedMemoryQueue(maxsize=2, num_slots=1, slot_size=1024)
+    data = {"x": np.arange(12, dtype="float32").reshape(3, 4), "y": [1, "a"]}
+    q.put(data)
+    out = q.get()
+    np.testing.assert_equal(out["x"], data["x"])
+    assert out["y"] == [1, "a"]
+    assert q.slot_busy[0] == 1
+
+    # slot is in use, fall back to pickle
+    q.put(data)
+    fallback = q.get()
+    np.testing.assert_equal(fallback["x"], data["x"])
+    assert fallback["x"].base is not out["x"].base
+
+    # slot is recycled after the arrays are released
+    del out
+    assert q.slot_busy[0] == 0
+
+    # too large for a slot
+    big = np.zeros((1024,), dtype="float32")
+    q.put(big)
+    np.testing.assert_equal(q.get(), big)
+
+    # arrays allocated in the slot are put without copy
+    slot = q.acquire_slot()
+    alloc = q.slot_allocator(slot)
+    x = alloc((3, 4), "float32")
+    x[:] = data["x"]
+    assert alloc((1024,), "float32") is None
+    q.put({"x": x, "y": big}, slot=slot)
+    out = q.get()
+    np.testing.assert_equal(out["x"], data["x"])
+    np.testing.assert_equal(out["y"], big)
+    del out
+    assert q.slot_busy[0] == 0
+    q.close()
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="no /dev/shm")
+def test_shared_memory_queue_free_space(monkeypatch):
+    from collections import namedtuple
+
+    from megengine.data.tools._queue import SharedMemoryQueue
+
+    statvfs = namedtuple("statvfs", ["f_bavail", "f_frsize"])
+    monkeypatch.setattr(os, "statvfs", lambda path: statvfs(2500, 1))
+
+    # slots are clamped to the free space of /dev/shm
+    q = SharedMemoryQueue(maxsize=4, slot_size=1024)
+    assert len(q.slots) == 2
+    assert q.slot_size == 1024
+    q.close()
+
+    # not even one slot fits, a smaller slot is used
+    q = SharedMemoryQueue(maxsize=4, slot_size=4096)
+    assert len(q.slots) == 1
+    assert q.slot_size == 2496
+    data = np.arange(1000, dtype="uint8")
+    q.put(data)
+    np.testing.assert_equal(q.get(), data)
+    q.close()
+
+
 @pytest.mark.skipif(
     platform.system() == "Windows",
     reason="dataloader do not support parallel on windows",
@@ -217,6 +583,118 @@ def test_dataloader_parallel_worker_exception():
         batch_data = next(data_iter)
 
 
+@pytest.mark.parametrize(
+    "divide,ordered", [(False, True), (True, True), (False, False)]
+)
+def test_dataloader_thread_workers(divide, ordered):
+    dataset = init_dataset()
+    with pytest.raises(ValueError):
+        DataLoader(dataset, num_workers=2, worker_type="fiber")
+    with pytest.raises(ValueError):
+        DataLoader(MyStream(100), num_workers=2, worker_type="thread")
+
+    dataloader = DataLoader(
+        dataset,
+        sampler=SequentialSampler(dataset, batch_size=6, drop_last=False),
+        num_workers=2,
+        divide=divide,
+        ordered=ordered,
+        worker_type="thread",
+    )
+    all_indices = np.arange(len(dataset))
+    seen = []
+    for batch_idx, batch_data in enumerate(dataloader):
+        if ordered:
+            indices = all_indices[batch_idx * 6 : (batch_idx + 1) * 6]
+        else:
+            batch_data, indices = batch_data
+        data, label = batch_data
+        np.testing.assert_equal(data, dataset.arrays[0][indices])
+        np.testing.assert_equal(label, dataset.arrays[1][indices])
+        seen.extend(indices)
+    assert sorted(seen) == list(range(len(dataset)))
+
+
+def test_dataloader_thread_worker_exception():
+    dataset = init_dataset()
+
+    class FakeErrorTransform(Transform):
+        def apply(self, input):
+            raise RuntimeError("test raise error")
+
+    dataloader = DataLoader(
+        dataset,
+        sampler=RandomSampler(dataset, batch_size=4, drop_last=False),
+        transform=FakeErrorTransform(),
+        num_workers=2,
+        worker_type="thread",
+    )
+    # the exception is raised again in main thread
+    with pytest.raises(RuntimeError, match="test raise error"):
+        next(iter(dataloader))
+
+
+@pytest.mark.parametrize(
+    "num_workers,worker_type,persistent",
+    [
+        (0, "process", False),
+        (2, "process", False),
+        (2, "process", True),
+        (2, "thread", False),
+    ],
+)
+def test_dataloader_state_dict(num_workers, worker_type, persistent):
+    dataset = init_dataset()
+
+    class CountingDataset(ArrayDataset):
+        def __init__(self, *arrays):
+            super().__init__(*arrays)
+            self.num_items = 0
+
+        def __getitems__(self, indices):
+            self.num_items += len(indices)
+            return super().__getitems__(indices)
+
+    def make_loader(seed):
+        counting = CountingDataset(*dataset.arrays)
+        dataloader = DataLoader(
+            counting,
+            sampler=RandomSampler(counting, batch_size=6, seed=seed),
+            num_workers=num_workers,
+            worker_type=worker_type,
+            persistent_workers=persistent,
+        )
+        return dataloader, counting
+
+    dataloader, _ = make_loader(1)
+    list(dataloader)  # finish the first epoch
+    data_iter = iter(dataloader)
+    for _ in range(5):
+        next(data_iter)
+    state = pickle.loads(pickle.dumps(dataloader.state_dict()))
+    assert state["num_batches"] == 5
+    expected = [label for _, label in data_iter]
+    expected_next_epoch = [label for _, label in dataloader]
+
+    dataloader, counting = make_loader(2)
+    dataloader.load_state_dict(state)
+    assert dataloader.state_dict()["num_batches"] == 5
+    labels = [label for _, label in dataloader]
+    assert len(labels) == len(dataloader) - 5
+    for label, target in zip(labels, expected):
+        np.testing.assert_equal(label, target)
+    if num_workers == 0:
+        # the consumed batches are not loaded again
+        assert counting.num_items == len(dataset) - 5 * 6
+    # the epoch after resuming is the same as well
+    assert dataloader.state_dict()["num_batches"] == 0
+    for (_, label), target in zip(dataloader, expected_next_epoch):
+        np.testing.assert_equal(label, target)
+
+    with pytest.raises(ValueError):
+        DataLoader(dataset, ordered=False).state_dict()
+
+
 def _multi_instances_parallel_dataloader_worker():
     dataset = init_dataset()
 
@@ -6,13 +6,28 @@
 # Unless required by applicable law or agreed to in writing,
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+import json
+import multiprocessing
 import os
+import pickle
 import sys
 
 import numpy as np
 import pytest
 
-from megengine.data.dataset import ArrayDataset, Dataset, StreamDataset
+from megengine.data.dataloader import DataLoader
+from megengine.data.dataset import (
+    ArrayDataset,
+    COCO,
+    CachedDataset,
+    Dataset,
+    Objects365,
+    PackedDataset,
+    PackedDatasetWriter,
+    StreamDataset,
+)
+from megengine.data.sampler import SequentialSampler
+from megengine.data.transform import Transform
 
 
 def test_abstract_cls():
@@ -34,8 +49,256 @@ def test_array_dataset():
     assert len(dataset) == size[0]
 
 
+def test_array_dataset_getitems():
+    data = np.random.randint(0, 255, (10, 3, 4, 4))
+    label = np.random.randint(0, 9, (10,))
+    dataset = ArrayDataset(data, label)
+    indices = [3, 0, 7, 7]
+    items = dataset.__getitems__(indices)
+    assert len(items) == len(indices)
+    for idx, item in zip(indices, items):
+        np.testing.assert_equal(item, dataset[idx])
+
+    dataset = ArrayDataset(list(range(10)), label)
+    assert dataset.__getitems__(indices) == [dataset[idx] for idx in indices]
+
+
 def test_array_dataset_dim_error():
     data = np.random.randint(0, 255, (10, 3, 256, 256))
     label = np.random.randint(0, 9, (1,))
     with pytest.raises(ValueError):
         ArrayDataset(data, label)
+
+
+def test_packed_dataset(tmp_path):
+    data = np.random.randint(0, 255, (10, 3, 4, 4), dtype=np.uint8)
+    label = np.random.randint(0, 9, (10,))
+    dataset = ArrayDataset(data, label)
+    with PackedDatasetWriter(str(tmp_path), shard_size=500) as writer:
+        writer.write_dataset(dataset)
+    assert len(os.listdir(str(tmp_path))) > 2
+
+    packed = PackedDataset(str(tmp_path))
+    assert len(packed) == len(dataset)
+    for idx in range(len(dataset)):
+        np.testing.assert_equal(packed[idx], dataset[idx])
+    items = packed.__getitems__([5, 1])
+    np.testing.assert_equal(items[0], dataset[5])
+
+    raw = PackedDataset(str(tmp_path), decoder=None)
+    assert isinstance(raw[3], memoryview)
+    np.testing.assert_equal(pickle.loads(raw[3]), dataset[3])
+
+    # no index is saved if writing fails
+    del packed, raw
+    with pytest.raises(RuntimeError):
+        with PackedDatasetWriter(str(tmp_path), shard_size=500) as writer:
+            writer.write(dataset[0])
+            raise RuntimeError("failed to read")
+    assert "index.npy" not in os.listdir(str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        PackedDataset(str(tmp_path))
+
+
+def test_cached_dataset():
+    data = np.random.randint(0, 255, (10, 3, 4, 4), dtype=np.uint8)
+    label = np.random.randint(0, 9, (10,))
+    dataset = ArrayDataset(data, label)
+
+    class CountTransform(Transform):
+        def __init__(self):
+            self.count = 0
+
+        def apply(self, input):
+            self.count += 1
+            return (input[0] * 2, input[1])
+
+    transform = CountTransform()
+    cached = CachedDataset(dataset, transform=transform)
+    assert len(cached) == len(dataset)
+    for _ in range(2):
+        for idx in range(len(dataset)):
+            np.testing.assert_equal(cached[idx], (data[idx] * 2, label[idx]))
+    assert transform.count == len(dataset)
+    assert cached.misses == len(dataset)
+    assert cached.hits == len(dataset)
+    items = cached.__getitems__([3, 3, 0])
+    np.testing.assert_equal(items[0], (data[3] * 2, label[3]))
+    assert cached.hits == len(dataset) + 3
+    cached.close()
+
+    # only the items fitting in the capacity are cached
+    record_size = len(pickle.dumps(dataset[0], protocol=pickle.HIGHEST_PROTOCOL))
+    cached = CachedDataset(dataset, capacity=3 * 64 * (record_size // 64 + 1))
+    for _ in range(2):
+        for idx in range(len(dataset)):
+            np.testing.assert_equal(cached[idx], dataset[idx])
+    assert cached.hits == 3
+    assert cached.misses == 2 * len(dataset) - 3
+    assert cached.nbytes <= cached.capacity
+
+    with pytest.raises(ValueError):
+        CachedDataset(dataset, capacity=0)
+
+
+def test_cached_dataset_evict():
+    data = np.random.randint(0, 255, (10, 3, 4, 4), dtype=np.uint8)
+    dataset = ArrayDataset(data)
+    record_size = len(pickle.dumps(dataset[0], protocol=pickle.HIGHEST_PROTOCOL))
+    capacity = 3 * 64 * (record_size // 64 + 1)
+    cached = CachedDataset(dataset, capacity=capacity, evict=True)
+    for idx in range(len(dataset)):
+        np.testing.assert_equal(cached[idx], dataset[idx])
+    # the last three items are kept
+    assert cached.misses == len(dataset)
+    for idx in range(len(dataset) - 3, len(dataset)):
+        np.testing.assert_equal(cached[idx], dataset[idx])
+    assert cached.hits == 3
+    assert cached.nbytes <= cached.capacity
+
+    # the oldest ones are evicted for new items
+    np.testing.assert_equal(cached[0], dataset[0])
+    np.testing.assert_equal(cached[len(dataset) - 3], dataset[len(dataset) - 3])
+    np.testing.assert_equal(cached[len(dataset) - 1], dataset[len(dataset) - 1])
+    assert cached.hits == 4
+    assert cached.misses == len(dataset) + 2
+    cached.close()
+
+
+def _load_cached_items(cached, indices):
+    for idx in indices:
+        cached[idx]
+
+
+def test_cached_dataset_spawn():
+    data = np.random.randint(0, 255, (10, 3, 4, 4), dtype=np.uint8)
+    start_method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method("spawn", force=True)
+    try:
+        cached = CachedDataset(ArrayDataset(data))
+        # the cache and its counters are shared with processes started by spawn
+        process = multiprocessing.Process(
+            target=_load_cached_items, args=(cached, [1, 2, 2])
+        )
+        process.start()
+        process.join()
+    finally:
+        multiprocessing.set_start_method(start_method, force=True)
+    assert process.exitcode == 0
+    assert cached.misses == 2
+    assert cached.hits == 1
+    np.testing.assert_equal(cached[2], (data[2],))
+    assert cached.hits == 2
+    cached.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fork is not supported on windows")
+def test_cached_dataset_shared_by_workers():
+    data = np.random.randint(0, 255, (20, 3, 4, 4), dtype=np.uint8)
+    cached = CachedDataset(ArrayDataset(data))
+    dataloader = DataLoader(
+        cached, sampler=SequentialSampler(cached, batch_size=4), num_workers=2
+    )
+    for _ in range(2):
+        for batch_idx, (batch,) in enumerate(dataloader):
+            np.testing.assert_equal(batch, data[batch_idx * 4 : (batch_idx + 1) * 4])
+    # items loaded by a worker are shared with others and the main process
+    assert cached.misses == len(data)
+    assert cached.hits == len(data)
+    np.testing.assert_equal(cached[7], (data[7],))
+    assert cached.hits == len(data) + 1
+
+
+def test_coco_annotation_cache(tmp_path):
+    images = [
+        {"id": 3, "file_name": "c.jpg", "height": 30, "width": 40, "license": 2},
+        {"id": 1, "file_name": "a.jpg", "height": 10, "width": 20},
+        {"id": 2, "file_name": "b.jpg", "height": 50, "width": 60},
+    ]
+    keypoints = [5, 6, 2] * 17
+    annotations = [
+        {"image_id": 1, "bbox": [1, 2, 3, 4], "category_id": 7, "iscrowd": 0},
+        {"image_id": 3, "bbox": [5, 6, 7, 8], "category_id": 9, "iscrowd": 0},
+        {"image_id": 1, "bbox": [2, 3, 0, 4], "category_id": 9, "iscrowd": 0},
+        {"image_id": 1, "bbox": [0, 1, 2, 3], "category_id": 9, "iscrowd": 1},
+        {"image_id": 2, "bbox": [4, 4, 4, 4], "category_id": 7, "iscrowd": 1},
+        {"image_id": 4, "bbox": [1, 1, 1, 1], "category_id": 7, "iscrowd": 0},
+    ]
+    annotations[1]["keypoints"] = keypoints
+    categories = [{"id": 9, "name": "b"}, {"id": 7, "name": "a"}]
+    ann_file = str(tmp_path / "instances.json")
+    with open(ann_file, "w") as f:
+        json.dump(
+            {"images": images, "annotations": annotations, "categories": categories}, f,
+        )
+    cache_dir = str(tmp_path / "cache")
+    order = ["boxes", "boxes_category", "info"]
+
+    for _ in range(2):  # compile and load from cache
+        dataset = COCO(str(tmp_path), ann_file, order=order, cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 1
+        assert dataset.ids == [1, 2, 3]
+        assert all(type(i) is int for i in dataset.ids)
+        boxes, boxes_category, info = dataset[0]
+        np.testing.assert_equal(boxes, [[1, 2, 4, 6], [2, 3, 2, 7], [0, 1, 2, 4]])
+        assert boxes.dtype == np.float32
+        np.testing.assert_equal(boxes_category, [1, 2, 2])
+        assert boxes_category.dtype == np.int32
+        assert info == [10, 20, "a.jpg"]
+        np.testing.assert_equal(dataset[1][0], [[4, 4, 8, 8]])
+        assert dataset.get_img_info(2) == {
+            "id": 3,
+            "file_name": "c.jpg",
+            "height": 30,
+            "width": 40,
+            "license": 2,
+        }
+
+    # crowd and empty boxes are removed, and then images without annotations
+    dataset = COCO(str(tmp_path), ann_file, True, order=order, cache_dir=cache_dir)
+    assert list(dataset.ids) == [1, 3]
+    np.testing.assert_equal(dataset[0][0], [[1, 2, 4, 6]])
+    np.testing.assert_equal(dataset[1][1], [2])
+
+    dataset = COCO(
+        str(tmp_path), ann_file, True, order=["keypoints"], cache_dir=cache_dir
+    )
+    assert list(dataset.ids) == [3]
+    np.testing.assert_equal(dataset[0][0], np.reshape(keypoints, (1, 17, 3)))
+
+    dataset = Objects365(
+        str(tmp_path), ann_file, True, order=order, cache_dir=cache_dir
+    )
+    assert list(dataset.ids) == [1, 3]
+    np.testing.assert_equal(dataset[1][0], [[5, 6, 12, 14]])
+
+    # annotations are compiled without cache if it can not be saved
+    not_dir = str(tmp_path / "not_dir")
+    open(not_dir, "w").close()
+    dataset = COCO(str(tmp_path), ann_file, order=order, cache_dir=not_dir)
+    assert dataset.ids == [1, 2, 3]
+    assert dataset.get_img_info(2)["license"] == 2
+
+
+@pytest.mark.parametrize("category_id", [8, 10])
+def test_coco_unknown_category(tmp_path, category_id):
+    images = [{"id": 1, "file_name": "a.jpg", "height": 10, "width": 20}]
+    annotations = [
+        {"image_id": 1, "bbox": [1, 2, 3, 4], "category_id": 7, "iscrowd": 0},
+        {"image_id": 1, "bbox": [1, 2, 3, 4], "category_id": category_id},
+    ]
+    categories = [{"id": 9, "name": "b"}, {"id": 7, "name": "a"}]
+    ann_file = str(tmp_path / "instances.json")
+    with open(ann_file, "w") as f:
+        json.dump(
+            {"images": images, "annotations": annotations, "categories": categories}, f,
+        )
+    for dataset_cls in (COCO, Objects365):
+        dataset = dataset_cls(
+            str(tmp_path),
+            ann_file,
+            order=["boxes_category"],
+            cache_dir=str(tmp_path / "cache"),
+        )
+        with pytest.raises(KeyError):
+            dataset[0]
@@ -9,6 +9,7 @@
 import gc
 import os
 import platform
+import threading
 import time
 
 import numpy as np
@@ -148,6 +149,46 @@ def test_dataloader_serial():
         assert label._tuple_shape == (4,)
 
 
+def test_dataloader_preload_overlap():
+    loaded = [threading.Event() for _ in range(20)]
+
+    class RecordedDataset(ArrayDataset):
+        def __getitems__(self, indices):
+            items = super().__getitems__(indices)
+            for i in indices:
+                loaded[i].set()
+            return items
+
+    rand_data = np.random.randint(0, 255, size=(20, 1, 32, 32), dtype=np.uint8)
+    dataset = RecordedDataset(rand_data)
+
+    def run(preload_depth):
+        for event in loaded:
+            event.clear()
+        dataloader = DataLoader(
+            dataset,
+            sampler=SequentialSampler(dataset, batch_size=1),
+            preload=True,
+            preload_depth=preload_depth,
+        )
+        num_batches = 0
+        for i, (data,) in enumerate(dataloader):
+            assert data._tuple_shape == (1, 1, 32, 32)
+            num_batches += 1
+            if i + 1 < len(loaded):
+                if preload_depth > 0:
+                    # the next batch is loaded while this one is being used
+                    assert loaded[i + 1].wait(timeout=10)
+                else:
+                    assert not loaded[i + 1].is_set()
+        assert num_batches == 20
+
+    with pytest.raises(ValueError):
+        DataLoader(dataset, preload=True, preload_depth=-1)
+    run(0)
+    run(2)
+
+
 def test_dataloader_parallel():
     # set max shared memory to 100M
     os.environ["MGE_PLASMA_MEMORY"] = "100000000"
@@ -7,14 +7,22 @@
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 import copy
+import math
 import os
+import pickle
 import sys
+import tracemalloc
 
 import numpy as np
 import pytest
 
 from megengine.data.dataset import ArrayDataset
-from megengine.data.sampler import RandomSampler, ReplacementSampler, SequentialSampler
+from megengine.data.sampler import (
+    Infinite,
+    RandomSampler,
+    ReplacementSampler,
+    SequentialSampler,
+)
 
 
 def test_sequential_sampler():
@@ -79,3 +87,91 @@ def test_sampler_drop_last_true():
         ArrayDataset(indices), batch_size=batch_size, drop_last=drop_last
     )
     assert len([each for each in sampler]) == len(sampler)
+
+
+@pytest.mark.parametrize("world_size", [1, 3])
+def test_sampler_scatter(world_size):
+    indices = list(range(10))
+    num_samples = int(math.ceil(len(indices) / world_size))
+    samples = []
+    for rank in range(world_size):
+        sampler = RandomSampler(
+            ArrayDataset(indices), batch_size=3, world_size=world_size, rank=rank
+        )
+        # batch iterator is sent to the task feeding process by pickle
+        sampler_iter = pickle.loads(pickle.dumps(iter(sampler)))
+        batches = [list(each) for each in sampler_iter]
+        assert len(batches) == len(sampler)
+        assert sum(len(each) for each in batches) == num_samples
+        samples += sum(batches, [])
+    assert len(samples) == num_samples * world_size
+    assert sorted(set(samples)) == indices
+
+
+def test_sampler_custom_scatter():
+    class RoundRobinSampler(SequentialSampler):
+        def scatter(self, indices):
+            assert isinstance(indices, list)
+            indices += indices[: self.num_samples * self.world_size - len(indices)]
+            return indices[self.rank :: self.world_size]
+
+    sampler = RoundRobinSampler(
+        ArrayDataset(list(range(10))), batch_size=2, world_size=3, rank=1
+    )
+    batches = list(sampler)
+    assert all(type(each) is list for each in batches)
+    assert batches == [[1, 4], [7, 0]]
+
+
+def test_sampler_memory():
+    num_samples = 1 << 22
+    dataset = ArrayDataset(np.zeros(num_samples, dtype=np.uint8))
+    sampler = RandomSampler(dataset, batch_size=256, world_size=8, rank=3)
+    tracemalloc.start()
+    try:
+        for _ in sampler:
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # indices are kept in one int64 array, and batches are views of it
+    assert peak < 2 * 8 * num_samples
+
+
+@pytest.mark.parametrize("sampler_cls", [RandomSampler, ReplacementSampler])
+def test_sampler_state_dict(sampler_cls):
+    dataset = ArrayDataset(np.arange(100))
+    sampler = sampler_cls(dataset, batch_size=8, seed=1)
+    list(sampler)
+    state = pickle.loads(pickle.dumps(sampler.state_dict()))
+    assert state["epoch"] == 1
+    expected = [list(indices) for indices in sampler]
+
+    new_sampler = sampler_cls(dataset, batch_size=8, seed=2)
+    new_sampler.load_state_dict(state)
+    assert [list(indices) for indices in new_sampler] == expected
+    assert new_sampler.epoch == 2
+
+
+def test_infinite_sampler_state_dict():
+    dataset = ArrayDataset(np.arange(10))
+    sampler = Infinite(RandomSampler(dataset, batch_size=4, seed=1))
+    for _ in range(5):
+        next(sampler)
+    state = sampler.state_dict()
+    expected = [list(next(sampler)) for _ in range(7)]
+
+    new_sampler = Infinite(RandomSampler(dataset, batch_size=4, seed=2))
+    new_sampler.load_state_dict(state)
+    assert [list(next(new_sampler)) for _ in range(7)] == expected
+
+    class GeneratorSampler(RandomSampler):
+        def batch(self):
+            yield from super().batch()
+
+    sampler = Infinite(GeneratorSampler(dataset, batch_size=4))
+    next(sampler)
+    with pytest.raises(TypeError):
+        sampler.state_dict()
+    with pytest.raises(TypeError):
+        sampler.load_state_dict(state)
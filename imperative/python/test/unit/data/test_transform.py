@@ -107,3 +107,51 @@ def test_Compose():
     assert aug_data_shape == target_shape, "aug {}, target {}".format(
         aug_data_shape, target_shape
     )
+
+
+def test_batch_transform_same_as_per_sample():
+    transforms = [
+        Pad(size=(1, 2, 3, 4), value=[1, 2, 3]),
+        Pad(size=5, value=1.5),
+        CenterCrop(output_size=CenterCrop_size),
+        RandomHorizontalFlip(prob=1),
+        RandomVerticalFlip(prob=1),
+        Normalize(mean=[1, 2, 3], std=[4, 5, 6]),
+        ToMode(mode="CHW"),
+        Compose(
+            [
+                Resize((60, 50)),
+                RandomHorizontalFlip(prob=1),
+                Normalize(mean=[1, 2, 3], std=[4, 5, 6]),
+                ToMode(mode="CHW"),
+            ]
+        ),
+    ]
+    data = generate_data()
+    for t in transforms:
+        aug_data = t.apply_batch(data)
+        target = [t.apply(input) for input in data]
+        for (a, b), (c, d) in zip(aug_data, target):
+            assert a.shape == c.shape and a.dtype == c.dtype
+            np.testing.assert_array_equal(a, c)
+            np.testing.assert_array_equal(b, d)
+
+
+def test_batch_transform_fallback():
+    data = generate_data()
+    data[0] = ((np.random.rand(80, 80, 3) * 255).astype(np.uint8), data[0][1])
+    t = Compose([RandomHorizontalFlip(prob=1), ToMode(mode="CHW")])
+    aug_data = t.apply_batch(data)
+    aug_data_shape = [(a.shape, b.shape) for a, b in aug_data]
+    target_shape = [((3, 80, 80), label_shape)]
+    target_shape += [(ToMode_target_shape, label_shape)] * 3
+    assert aug_data_shape == target_shape
+
+    class Negative(Normalize):
+        def _apply_image(self, image):
+            return -image.astype(np.float32)
+
+    data = generate_data()
+    aug_data = Negative().apply_batch(data)
+    for (a, _), (b, _) in zip(aug_data, data):
+        np.testing.assert_array_equal(a, -b.astype(np.float32))
@@ -7,6 +7,7 @@
 # software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT ARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 import multiprocessing as mp
+import os
 import platform
 import queue
 
@@ -244,3 +245,231 @@ def test_get_cuda_compute_capability():
         assert mge.device.get_cuda_compute_capability(dist.get_rank()) > 0
 
     worker()
+
+
+@pytest.mark.require_ngpu(2)
+@pytest.mark.isolated_distributed
+def test_sharded_checkpoint(tmpdir):
+    path = str(tmpdir.join("checkpoint"))
+
+    def make_state():
+        rng = np.random.RandomState(0)
+        weights = {
+            "layer{}.weight".format(i): mge.Parameter(rng.rand(i + 1, 8))
+            for i in range(5)
+        }
+        return {
+            "model": weights,
+            "optimizer": {"state": {0: {"momentum_buffer": weights["layer2.weight"]}}},
+            "step": 10,
+        }
+
+    @dist.launcher(n_gpus=2)
+    def worker():
+        dist.save_checkpoint(make_state(), path)
+
+    worker()
+    assert sorted(os.listdir(path)) == [
+        "manifest.pkl",
+        "shard-00000-of-00002.v0.mge",
+        "shard-00001-of-00002.v0.mge",
+    ]
+
+    # loaded by a different number of ranks
+    expected = make_state()
+    state = dist.load_checkpoint(path)
+    assert state["step"] == 10
+    for key, value in expected["model"].items():
+        np.testing.assert_equal(state["model"][key].numpy(), value.numpy())
+    momentum = state["optimizer"]["state"][0]["momentum_buffer"]
+    assert momentum is state["model"]["layer2.weight"]
+
+    state = dist.load_checkpoint(path, select=lambda key: "layer0" in key)
+    assert state["model"]["layer0.weight"] is not None
+    assert state["model"]["layer1.weight"] is None
+
+    # objects differing between ranks are not merged
+    @dist.launcher(n_gpus=2)
+    def worker():
+        with pytest.raises(ValueError):
+            dist.save_checkpoint({"rank": dist.get_rank()}, path)
+
+    worker()
+    assert dist.load_checkpoint(path)["step"] == 10
+
+
+@pytest.mark.parametrize(
+    "state",
+    [{0: np.zeros(2), "0": np.ones(2)}, {"a/b": np.zeros(2), "a": {"b": np.ones(2)}},],
+)
+def test_checkpoint_duplicate_key(tmpdir, state):
+    with pytest.raises(ValueError):
+        dist.save_checkpoint(state, str(tmpdir.join("checkpoint")))
+
+
+def test_checkpoint_overwrite(tmpdir, monkeypatch):
+    from megengine.distributed import checkpoint
+
+    path = str(tmpdir.join("checkpoint"))
+    dist.save_checkpoint({"w": np.zeros(3), "step": 1}, path)
+    dist.save_checkpoint({"w": np.ones(3), "step": 2}, path)
+    assert sorted(os.listdir(path)) == ["manifest.pkl", "shard-00000-of-00001.v1.mge"]
+
+    # an interrupted save keeps the previous checkpoint
+    def save(obj, f, **kwargs):
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(checkpoint, "save", save)
+    with pytest.raises(RuntimeError):
+        dist.save_checkpoint({"w": np.full(3, 2.0), "step": 3}, path)
+    monkeypatch.undo()
+    state = dist.load_checkpoint(path)
+    assert state["step"] == 2
+    np.testing.assert_equal(state["w"], np.ones(3))
+
+
+def _sharded_optimizer_params():
+    rng = np.random.RandomState(0)
+    return [
+        mge.Parameter(rng.randn(7, 3).astype("float32")),
+        mge.Parameter(rng.randn(3).astype("float32")),
+        mge.Parameter(np.float32(0.5)),
+    ]
+
+
+def _sharded_optimizer_train(params, opt, xs, scale=1.0, callbacks=None):
+    import megengine.functional as F
+    from megengine.autodiff import GradManager
+
+    gm = GradManager().attach(params, callbacks=callbacks)
+    w, b, s = params
+    for x in xs:
+        with gm:
+            loss = ((F.matmul(mge.tensor(x), w) + b) * s).sum() * scale
+            gm.backward(loss)
+        opt.step().clear_grad()
+    return [param.numpy() for param in params]
+
+
+def _sharded_optimizer_data():
+    return np.random.RandomState(1).randn(3, 8, 7).astype("float32")
+
+
+def test_sharded_optimizer_single_process():
+    import megengine.optimizer as optim
+
+    xs = _sharded_optimizer_data()
+    params = _sharded_optimizer_params()
+    opt = optim.Adam(params, lr=0.1, weight_decay=0.01)
+    expected = _sharded_optimizer_train(params, opt, xs)
+
+    params = _sharded_optimizer_params()
+    opt = dist.ShardedOptimizer(params, optim.Adam, lr=0.1, weight_decay=0.01)
+    assert opt.param_groups[0]["lr"] == 0.1
+    results = _sharded_optimizer_train(params, opt, xs)
+    for result, value in zip(results, expected):
+        np.testing.assert_allclose(result, value, rtol=1e-5)
+    assert results[2].shape == ()
+
+    state = opt.state_dict()
+    opt = dist.ShardedOptimizer(params, optim.Adam, lr=0.5)
+    opt.load_state_dict(state)
+    assert opt.param_groups[0]["lr"] == 0.1
+
+    with pytest.raises(ValueError):
+        dist.ShardedOptimizer(params, optim.SGD, reduce_method="max", lr=0.1)
+
+
+def test_sharded_optimizer_save_load(tmpdir):
+    import megengine.optimizer as optim
+
+    xs = _sharded_optimizer_data()
+    params = _sharded_optimizer_params()
+    opt = dist.ShardedOptimizer(params, optim.Adam, lr=0.1)
+    expected = _sharded_optimizer_train(params, opt, xs)
+
+    params = _sharded_optimizer_params()
+    opt = dist.ShardedOptimizer(params, optim.Adam, lr=0.1)
+    _sharded_optimizer_train(params, opt, xs[:2])
+    path = str(tmpdir.join("checkpoint"))
+    dist.save_checkpoint([param.numpy() for param in params], path)
+    mge.save(opt.state_dict(), str(tmpdir.join("optimizer-0.pkl")))
+
+    params = [mge.Parameter(value) for value in dist.load_checkpoint(path)]
+    opt = dist.ShardedOptimizer(params, optim.Adam, lr=0.5)
+    opt.load_state_dict(mge.load(str(tmpdir.join("optimizer-0.pkl"))))
+    results = _sharded_optimizer_train(params, opt, xs[2:])
+    for result, value in zip(results, expected):
+        np.testing.assert_allclose(result, value, rtol=1e-5)
+
+
+@pytest.mark.parametrize("optimizer", ["SGD", "Adam"])
+def test_sharded_optimizer_partial_grads(optimizer):
+    import megengine.functional as F
+    import megengine.optimizer as optim
+    from megengine.autodiff import GradManager
+
+    def train(make_optimizer):
+        params = _sharded_optimizer_params()
+        w, b, s = params
+        opt = make_optimizer(params)
+        # s is not attached, so it never has a grad
+        gm = GradManager().attach([w, b])
+        for i, x in enumerate(_sharded_optimizer_data()):
+            with gm:
+                y = F.matmul(mge.tensor(x), w)
+                # b only has a grad in the first step
+                loss = (y + b).sum() if i == 0 else y.sum()
+                gm.backward(loss)
+            opt.step().clear_grad()
+        return [param.numpy() for param in params]
+
+    optimizer_cls = getattr(optim, optimizer)
+    options = dict(lr=0.1, weight_decay=0.01)
+    if optimizer == "SGD":
+        options["momentum"] = 0.9
+    expected = train(lambda params: optimizer_cls(params, **options))
+    results = train(
+        lambda params: dist.ShardedOptimizer(params, optimizer_cls, **options)
+    )
+    np.testing.assert_equal(results[2], _sharded_optimizer_params()[2].numpy())
+    for result, value in zip(results, expected):
+        np.testing.assert_allclose(result, value, rtol=1e-5)
+
+
+@pytest.mark.require_ngpu(2)
+@pytest.mark.isolated_distributed
+@pytest.mark.parametrize("reduce_method", ["mean", None])
+def test_sharded_optimizer(reduce_method):
+    import megengine.optimizer as optim
+
+    xs = _sharded_optimizer_data()
+    params = _sharded_optimizer_params()
+    opt = optim.SGD(params, lr=0.1, momentum=0.9, weight_decay=0.01)
+    # the gradients of ranks are averaged
+    expected = _sharded_optimizer_train(params, opt, xs, scale=0.5)
+
+    @dist.launcher(n_gpus=2)
+    def worker():
+        rank = dist.get_rank()
+        params = _sharded_optimizer_params()
+        opt = dist.ShardedOptimizer(
+            params,
+            optim.SGD,
+            reduce_method=reduce_method,
+            lr=0.1,
+            momentum=0.9,
+            weight_decay=0.01,
+        )
+        # each rank only updates 13 of the 25 elements of params
+        (shard,) = opt._optimizer.param_groups[0]["params"]
+        assert shard.shape == (13,)
+        callbacks = None
+        if reduce_method is None:
+            callbacks = [dist.make_allreduce_cb("mean")]
+        xs_ = xs[:, rank * 4 : rank * 4 + 4]
+        return _sharded_optimizer_train(params, opt, xs_, callbacks=callbacks)
+
+    for results in worker():
+        for result, value in zip(results, expected):
+            np.testing.assert_allclose(result, value, rtol=1e-5)
@@ -200,6 +200,31 @@ def test_non_finite():
     np.testing.assert_equal(rst.numpy(), [1])
 
 
+@pytest.mark.parametrize("ord", [2.0, 1.0, float("inf")])
+def test_multi_tensor(ord):
+    datas = [
+        np.random.randn(3, 4).astype(np.float32),
+        np.array(-5.0, dtype=np.float32),
+        np.random.randn(6).astype(np.float16),
+        np.random.randn(2, 2, 2).astype(np.float32),
+    ]
+    inps = [tensor(data) for data in datas]
+    flat = np.concatenate([data.astype(np.float32).ravel() for data in datas])
+    ref = np.linalg.norm(flat, ord)
+    out = F.math._multi_tensor_norm(inps, ord)
+    np.testing.assert_allclose(out.numpy(), ref, rtol=1e-5)
+
+    outs = F.math._multi_tensor_mul(inps, tensor(0.5))
+    for data, out in zip(datas, outs):
+        assert out.shape == data.shape
+        np.testing.assert_allclose(out.numpy(), data * 0.5, rtol=1e-3)
+
+    np.testing.assert_equal(F.math._check_non_finite(inps).numpy(), 0)
+    datas[2][1] = float("inf")
+    inps = [tensor(data) for data in datas]
+    np.testing.assert_equal(F.math._check_non_finite(inps).numpy(), 1)
+
+
 @pytest.mark.parametrize("descending", [True, False])
 @pytest.mark.parametrize("sorted", [True, False])
 @pytest.mark.parametrize("inp1d", [True, False])
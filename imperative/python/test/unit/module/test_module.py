@@ -402,6 +402,24 @@ def test_state_dict():
             mlp1.load_state_dict(state_dict)
 
 
+def test_load_state_dict_from_checkpoint_reader(tmpdir):
+    data = tensor(np.random.random((2, 28)))
+    mlp = MLP()
+    pred0 = mlp(data)
+    path = str(tmpdir.join("mlp.mge"))
+    mge.save(mlp.state_dict(), path, mmap=True)
+
+    mlp1 = MLP()
+    mlp1.load_state_dict(mge.serialization.CheckpointReader(path))
+    np.testing.assert_allclose(pred0.numpy(), mlp1(data).numpy(), atol=5e-6)
+
+    state_dict = mlp.state_dict()
+    state_dict["extra"] = np.zeros(1)
+    mge.save(state_dict, path, mmap=True)
+    with pytest.raises(KeyError):
+        mlp1.load_state_dict(mge.serialization.CheckpointReader(path))
+
+
 class AssertModule(Module):
     def __init__(self):
         super().__init__()